@@ -0,0 +1,163 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scipy import interpolate
+from scipy.optimize import minimize
+import compliance
+import interpolation
+
+VIOLATION_WEIGHT = 1.0
+ATTRACTION_WEIGHT = 0.01  # keeps the curve close to the mask instead of drifting away from it
+TIGHTENING = 10  # factor of the violation weight each time the margin is not held yet
+MAX_TIGHTENINGS = 8
+MARGIN_TOLERANCE = 1e-3  # how much closer to the mask than the margin the curve may come
+LINEAR_KINDS = ('quadratic', 'cubic', 'linear')  # interpolations whose curve is a linear function of the points
+
+
+def fit_measurements(frequencies, specifications, passband, measurements_x, seed_y, margin, smoothness,
+                     fit_x=False, grid_size=2000, kind='quadratic'):
+    """
+    Optimizes measurement points so that their curve follows the specification mask at the given margin
+    The objective is evaluated on a dense grid with the curve interpolated between the points as on the canvas:
+        - quadratic penalty on the grid points closer to the mask than the margin, or outside of it
+        - small quadratic attraction of the other grid points towards the margin line
+        - smoothness penalty on the second differences of the points
+    The margin is a constraint: as long as grid points are still closer to the mask than the margin, the fit starts
+    again from its result with a violation penalty TIGHTENING times heavier. pchip and akima curves are not linear
+    in the points, they are fitted as quadratic ones.
+    :param frequencies: the specification frequencies
+    :param specifications: the specification values
+    :param passband: (start, stop) where the specifications are lower limits, or None
+    :param measurements_x: the frequencies of the measurement points
+    :param seed_y: the starting measurement values
+    :param margin: the distance to keep outside of the mask
+    :param smoothness: weight of the smoothness penalty
+    :param fit_x: moves the inner measurement frequencies as well, within half the distance to their neighbours
+    :param grid_size: number of grid points the mask is checked on
+    :param kind: the interpolation drawing the curve through the points
+    :return: the optimized (measurements_x, measurements_y)
+    """
+    frequencies = np.asarray(frequencies, dtype=float)
+    specifications = np.asarray(specifications, dtype=float)
+    measurements_x = np.asarray(measurements_x, dtype=float)
+    seed_y = np.asarray(seed_y, dtype=float)
+    count = len(measurements_x)
+
+    grid = np.linspace(max(frequencies[0], measurements_x[0]), min(frequencies[-1], measurements_x[-1]), grid_size)
+    limits, kinds = compliance.mask_segments(frequencies, specifications, passband)
+    segments = compliance.locate_segments(frequencies, grid)
+    grid_limits = limits[segments]
+    sign = np.where(kinds[segments] == compliance.UPPER, 1.0, -1.0)
+    smoothness = smoothness / count
+
+    def residuals(values):
+        return sign * (values - grid_limits) + margin  # positive when closer than margin or outside
+
+    def penalties(values, y, weight=VIOLATION_WEIGHT):
+        violation = np.maximum(residuals(values), 0)
+        attraction = np.minimum(residuals(values), 0)
+        curvature = y[:-2] - 2 * y[1:-1] + y[2:]
+        cost = (weight * np.dot(violation, violation) +
+                ATTRACTION_WEIGHT * np.dot(attraction, attraction)) / grid_size + \
+            smoothness * np.dot(curvature, curvature)
+        grid_gradient = 2 * sign * (weight * violation + ATTRACTION_WEIGHT * attraction) / grid_size
+        curvature_gradient = np.zeros(count)
+        curvature_gradient[:-2] += 2 * smoothness * curvature
+        curvature_gradient[1:-1] -= 4 * smoothness * curvature
+        curvature_gradient[2:] += 2 * smoothness * curvature
+        return cost, grid_gradient, curvature_gradient
+
+    def objective_curve(y, basis, weight):
+        # the curve drawn by the canvas is linear in y once the frequencies are fixed: values = basis @ y
+        cost, grid_gradient, curvature_gradient = penalties(basis @ y, y, weight)
+        return cost, basis.T @ grid_gradient + curvature_gradient
+
+    def objective_xy(variables):
+        # moving the frequencies uses the linear interpolation between the points, whose gradient is cheap
+        y = variables[:count]
+        x = np.concatenate(([measurements_x[0]], variables[count:], [measurements_x[-1]]))
+        index = np.clip(np.searchsorted(x, grid, side='right') - 1, 0, count - 2)
+        width = x[index + 1] - x[index]
+        t = (grid - x[index]) / width
+        rise = y[index + 1] - y[index]
+        cost, grid_gradient, curvature_gradient = penalties(y[index] + t * rise, y)
+        gradient_y = np.bincount(index, weights=(1 - t) * grid_gradient, minlength=count) + \
+            np.bincount(index + 1, weights=t * grid_gradient, minlength=count) + curvature_gradient
+        slope_gradient = grid_gradient * rise / width
+        gradient_x = np.bincount(index, weights=(t - 1) * slope_gradient, minlength=count) - \
+            np.bincount(index + 1, weights=t * slope_gradient, minlength=count)
+        return cost, np.concatenate((gradient_y, gradient_x[1:-1]))
+
+    span = specifications.max() - specifications.min() + 2 * abs(margin)
+    bounds = [(specifications.min() - span, specifications.max() + span)] * count
+    fitted_x = measurements_x.copy()
+    fitted_y = seed_y
+    if fit_x and count > 2:
+        spacing = np.diff(measurements_x)
+        x_bounds = [(x - spacing[i] * 0.45, x + spacing[i + 1] * 0.45) for i, x in enumerate(measurements_x[1:-1])]
+        result = minimize(objective_xy, np.concatenate((seed_y, measurements_x[1:-1])), jac=True,
+                          method='L-BFGS-B', bounds=bounds + x_bounds)
+        fitted_y = result.x[:count]
+        fitted_x[1:-1] = result.x[count:]
+
+    basis = interpolate.interp1d(fitted_x, np.eye(count), kind=kind if kind in LINEAR_KINDS else 'quadratic',
+                                 axis=0)(grid)
+    weight = VIOLATION_WEIGHT
+    fitted_y = minimize(objective_curve, fitted_y, args=(basis, weight), jac=True, method='L-BFGS-B',
+                        bounds=bounds).x
+    for _ in range(MAX_TIGHTENINGS):
+        if residuals(basis @ fitted_y).max() <= MARGIN_TOLERANCE:
+            break
+        weight *= TIGHTENING
+        fitted_y = minimize(objective_curve, fitted_y, args=(basis, weight), jac=True, method='L-BFGS-B',
+                            bounds=bounds).x
+    return fitted_x, fitted_y
+
+
+def fit_graph(graph_data, margin, smoothness, fit_x=False, grid_size=2000):
+    """
+    Fits the measurements of a GraphData, starting from the Bezier curve generated from its specifications
+    The fit is kept only if its worst margin is better than the ones of the Bezier curve and of the current
+    measurements, otherwise the best of these is returned, so auto-fit never makes a graph worse.
+    :return: the optimized (measurements_x, measurements_y), the graph itself is not modified
+    """
+    kind = getattr(graph_data.interpolation_function, 'kind', 'quadratic')
+    bezier_x, bezier_y = graph_data.generate_measurements()
+    seed_y = np.interp(graph_data.measurements_x, bezier_x, bezier_y)
+    candidates = [fit_measurements(graph_data.frequencies, graph_data.specifications, graph_data.passband,
+                                   graph_data.measurements_x, seed_y, margin, smoothness, fit_x, grid_size, kind),
+                  (graph_data.measurements_x.copy(), seed_y),
+                  (graph_data.measurements_x.copy(), graph_data.measurements_y.copy())]
+    margins = [worst_margin(graph_data, x, y, kind, grid_size) for x, y in candidates]
+    return candidates[int(np.argmax(margins))]
+
+
+def worst_margin(graph_data, measurements_x, measurements_y, kind='quadratic', grid_size=2000):
+    """
+    :return: the worst margin of measurements against the specifications of a graph, as the compliance check of
+             the canvas computes it
+    """
+    frequencies = graph_data.frequencies
+    grid = np.linspace(max(frequencies[0], measurements_x[0]), min(frequencies[-1], measurements_x[-1]), grid_size)
+    limits, kinds = compliance.mask_segments(frequencies, graph_data.specifications, graph_data.passband)
+    segments = compliance.locate_segments(frequencies, grid)
+    values = interpolation.Interpolator(measurements_x, measurements_y, kind)(grid)
+    return np.min(np.where(kinds[segments] == compliance.UPPER, limits[segments] - values, values - limits[segments]))
+
+
+def fit_graphs(graph_datas, settings, executor=None):
+    """
+    Fits several graphs in parallel
+    :param graph_datas: the GraphData objects to fit
+    :param settings: one tuple (margin, smoothness, fit_x, grid_size) for each graph
+    :param executor: the concurrent.futures executor to use. Defaults to one thread per graph
+    :return: list of the optimized (measurements_x, measurements_y), in the order of the graphs
+    """
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=len(graph_datas))
+    futures = [executor.submit(fit_graph, graph_data, *graph_settings)
+               for graph_data, graph_settings in zip(graph_datas, settings)]
+    results = [future.result() for future in futures]
+    if own_executor:
+        executor.shutdown()
+    return results
@@ -0,0 +1,131 @@
+import numpy as np
+import interpolation
+
+UPPER = 0  # the measurement must stay below the limit
+LOWER = 1  # the measurement must stay above the limit
+
+
+class ComplianceChecker:
+    """
+    Checks the interpolated measurements of a GraphData against its specifications, seen as a step-function mask
+        - segment k spans frequencies[k] to frequencies[k + 1], its limit is the looser of its two end values
+        - segments inside the passband of the graph are lower limits, all other segments upper limits
+    The measurement is evaluated on a dense grid in one pass, each grid point finding its segment with searchsorted.
+    After an edit only the grid points and segments around the moved point are evaluated again, when the
+    interpolation of the measurements is local, see interpolation.REACH.
+    """
+
+    def __init__(self, graph_data, grid_size):
+        self.graph_data = graph_data
+        self.grid_size = grid_size
+        self.grid = None
+        self.segments = None
+        self.values = None
+        self.limits = None
+        self.margins = None
+        self.segment_limits = None
+        self.segment_kinds = None
+        self.segment_margins = None
+        self.evaluate()
+
+    def evaluate(self):
+        """
+        Evaluates the whole graph
+        """
+        frequencies = self.graph_data.frequencies
+        measurements_x = self.graph_data.measurements_x
+        self.make_segments()
+        # measurements moved beyond the specifications are checked at their end, where they can be evaluated
+        start = min(max(frequencies[0], measurements_x[0]), measurements_x[-1])
+        stop = max(min(frequencies[-1], measurements_x[-1]), measurements_x[0])
+        self.grid = np.linspace(start, stop, self.grid_size)
+        self.segments = np.empty(self.grid_size, dtype=int)
+        self.values = np.empty(self.grid_size)
+        self.limits = np.empty(self.grid_size)
+        self.margins = np.empty(self.grid_size)
+        self.evaluate_grid(0, self.grid_size)
+        self.segment_margins = np.full(len(self.segment_limits), np.inf)
+        np.minimum.at(self.segment_margins, self.segments, self.margins)
+
+    def update(self, artist, index):
+        """
+        Evaluates again the part of the graph affected by moving one point
+        :param artist: '_line0' for a specification point, '_line1' for a measurement point
+        :param index: index of the moved point
+        """
+        if artist == '_line0':
+            x = self.graph_data.frequencies
+            first, last = index - 1, index + 1
+        else:
+            x = self.graph_data.measurements_x
+            reach = interpolation.REACH.get(getattr(self.graph_data.interpolation_function, 'kind', None))
+            if reach is None:
+                self.evaluate()
+                return
+            first, last = index - reach, index + reach
+        if first < 0 or last >= len(x) - 1 or np.any(np.diff(self.graph_data.frequencies) < 0):
+            self.evaluate()
+            return
+        if artist == '_line0':
+            self.make_segments()
+        lo, hi = np.searchsorted(self.grid, [x[first], x[last]])
+        self.evaluate_grid(lo, hi)
+        # every segment present in the evaluated part gets its margin computed again, over all its grid points
+        touched = np.arange(self.segments[max(lo - 1, 0)], self.segments[min(hi, self.grid_size - 1)] + 1)
+        if artist == '_line0':
+            touched = np.union1d(touched, np.arange(index - 1, index + 1))
+        starts = np.searchsorted(self.segments, touched, side='left')
+        stops = np.searchsorted(self.segments, touched, side='right')
+        for segment, segment_start, segment_stop in zip(touched, starts, stops):
+            if segment_stop > segment_start:
+                self.segment_margins[segment] = self.margins[segment_start:segment_stop].min()
+            else:
+                self.segment_margins[segment] = np.inf
+
+    def make_segments(self):
+        self.segment_limits, self.segment_kinds = mask_segments(self.graph_data.frequencies,
+                                                                self.graph_data.specifications,
+                                                                self.graph_data.passband)
+
+    def evaluate_grid(self, lo, hi):
+        grid = self.grid[lo:hi]
+        if len(grid) == 0:
+            return
+        segments = locate_segments(self.graph_data.frequencies, grid)
+        values = self.graph_data.interpolation_function(grid)
+        limits = self.segment_limits[segments]
+        self.segments[lo:hi] = segments
+        self.values[lo:hi] = values
+        self.limits[lo:hi] = limits
+        self.margins[lo:hi] = np.where(self.segment_kinds[segments] == UPPER, limits - values, values - limits)
+
+    def worst_margin(self):
+        return self.margins.min()
+
+    def violations(self):
+        """
+        :return: boolean array telling which grid points are outside the mask
+        """
+        return self.margins < 0
+
+
+def mask_segments(frequencies, specifications, passband=None):
+    """
+    Builds the step-function mask of a specification plot
+    :return: the limit and the kind (UPPER or LOWER) of each segment between two consecutive specification points
+    """
+    middles = (frequencies[:-1] + frequencies[1:]) / 2
+    kinds = np.full(len(middles), UPPER)
+    if passband is not None:
+        kinds[(middles >= passband[0]) & (middles <= passband[1])] = LOWER
+    limits = np.where(kinds == UPPER, np.maximum(specifications[:-1], specifications[1:]),
+                      np.minimum(specifications[:-1], specifications[1:]))
+    return limits, kinds
+
+
+def locate_segments(frequencies, grid):
+    """
+    :return: the index of the mask segment containing each grid frequency
+    """
+    segments = np.searchsorted(frequencies, grid, side='right') - 1
+    return np.clip(segments, 0, len(frequencies) - 2, out=segments)
@@ -0,0 +1,363 @@
+import configparser
+import os
+import numpy as np
+from PyQt5 import QtCore
+
+CONFIGURATION_FILE = 'configurations.ini'
+
+
+def parse_values(text):
+    """
+    Parses a list of numbers: comma separated values, or start:stop:count for evenly spaced values
+    :raises ValueError: if the text is not formatted this way
+    """
+    if ':' in text:
+        start, stop, count = text.split(':')
+        return np.linspace(float(start), float(stop), int(count))
+    return np.array([float(value) for value in text.split(',')])
+
+
+def parse_distribution(text):
+    """
+    Parses a random distribution: "normal mean deviation", "uniform low high" or a single fixed value
+    :return: tuple (name, a, b)
+    :raises ValueError: if the text is not formatted this way
+    """
+    words = text.split()
+    if len(words) == 1:
+        return 'fixed', float(words[0]), 0.0
+    if len(words) != 3 or words[0] not in ('normal', 'uniform'):
+        raise ValueError("Invalid distribution " + text)
+    return words[0], float(words[1]), float(words[2])
+
+
+def parse_impedances(text):
+    """
+    Parses reference impedances: one value for both ports or one per port separated by a comma, each a real or
+    complex number (e.g. 75+10j)
+    :return: tuple of the impedance of each port
+    :raises ValueError: if the text is not formatted this way or an impedance has no positive real part
+    """
+    impedances = tuple(complex(value.replace(' ', '')) for value in text.split(','))
+    if len(impedances) == 1:
+        impedances = impedances * 2
+    if len(impedances) != 2 or any(impedance.real <= 0 for impedance in impedances):
+        raise ValueError("Invalid reference impedances " + text)
+    return impedances
+
+
+def parse_zeros(text):
+    """
+    Parses transmission zeros: comma separated normalized frequencies, none if the text is empty
+    :return: tuple of the zeros
+    :raises ValueError: if a zero is not a number or lies in the band [-1, 1]
+    """
+    zeros = tuple(float(value) for value in text.split(',') if value.strip())
+    if any(abs(zero) <= 1 for zero in zeros):
+        raise ValueError("Transmission zeros must lie outside the band [-1, 1]: " + text)
+    return zeros
+
+
+def choice(*options):
+    """
+    Makes a parser accepting only the given words
+    """
+    def parse_choice(text):
+        if text not in options:
+            raise ValueError(text + " is not one of " + ", ".join(options))
+        return text
+    return parse_choice
+
+
+def choices(*options):
+    """
+    Makes a parser of comma separated words, accepting only the given ones
+    """
+    def parse_choices(text):
+        words = tuple(word.strip() for word in text.split(','))
+        for word in words:
+            if word not in options:
+                raise ValueError(word + " is not one of " + ", ".join(options))
+        return words
+    return parse_choices
+
+
+class Section:
+    """
+    Typed settings of one section of configurations.ini
+    Values are converted and validated once, when the file is read, and handlers read them as plain attributes.
+    Each field is a tuple (key, type, default, minimum); a default of None makes the key mandatory.
+    """
+
+    __slots__ = ('section',)
+    fields = ()
+
+    def __init__(self, parser, section):
+        self.section = section
+        self.update(self.parse(parser, section))
+
+    @classmethod
+    def parse(cls, parser, section):
+        """
+        Reads the fields of the section from a ConfigParser
+        :return: dictionary of the converted values
+        :raises ValueError: for missing keys, badly formatted values or values below their minimum
+        """
+        values = {}
+        for key, value_type, default, minimum in cls.fields:
+            if not parser.has_option(section, key):
+                if default is None:
+                    raise ValueError("Missing " + key + " in section [" + section + "]")
+                values[key] = default
+                continue
+            try:
+                if value_type is bool:
+                    value = parser.getboolean(section, key)
+                else:
+                    value = value_type(parser.get(section, key))
+            except ValueError:
+                raise ValueError("Invalid " + key + " in section [" + section + "]: " + parser.get(section, key))
+            if minimum is not None and value < minimum:
+                raise ValueError(key + " in section [" + section + "] must be at least " + str(minimum))
+            values[key] = value
+        return values
+
+    def update(self, values):
+        for key, value in values.items():
+            setattr(self, key, value)
+
+
+class ResponseConfiguration(Section):
+    """
+    Settings of one response canvas
+    """
+
+    __slots__ = ('specifications_adjust_x', 'specifications_adjust_y', 'measurements_adjust_x',
+                 'measurements_adjust_y', 'picker_precision', 'interpolation', 'zoom_sensitivity',
+                 'compliance_grid_size', 'autofit_margin', 'autofit_smoothness', 'autofit_frequencies',
+                 'selection_scale_step')
+    fields = (('specifications_adjust_x', float, None, 0),
+              ('specifications_adjust_y', float, None, 0),
+              ('measurements_adjust_x', float, None, 0),
+              ('measurements_adjust_y', float, None, 0),
+              ('picker_precision', int, None, 0),
+              ('interpolation', choice('quadratic', 'pchip', 'akima', 'cubic', 'linear'), 'quadratic', None),
+              ('zoom_sensitivity', float, None, 0),
+              ('compliance_grid_size', int, 2000, 2),
+              ('autofit_margin', float, 1.0, 0),
+              ('autofit_smoothness', float, 0.01, 0),
+              ('autofit_frequencies', bool, False, None),
+              ('selection_scale_step', float, 0.05, 0))
+
+
+class TouchstoneConfiguration(Section):
+    """
+    Settings of the generated touchstone file
+    """
+
+    __slots__ = ('group_delay_scaling', 'number_of_lines', 'passivity', 'data_format', 'frequency_unit', 'version',
+                 'reference_impedance', 'compress', 'chunk_size')
+    fields = (('group_delay_scaling', float, None, None),
+              ('number_of_lines', int, None, 2),
+              ('passivity', choice('off', 'check', 'enforce'), 'check', None),
+              ('data_format', choice('DB', 'MA', 'RI'), 'DB', None),
+              ('frequency_unit', choice('HZ', 'KHZ', 'MHZ', 'GHZ'), 'MHZ', None),
+              ('version', int, 1, 1),
+              ('reference_impedance', parse_impedances, (50.0, 50.0), None),
+              ('compress', bool, False, None),
+              ('chunk_size', int, 10000, 1))
+
+
+class EditorConfiguration(Section):
+    """
+    Settings of the GenerateScreen editor
+    """
+
+    __slots__ = ('undo_levels', 'backend', 'layout')
+    fields = (('undo_levels', int, 10000, 1),
+              ('backend', choice('matplotlib', 'pyqtgraph'), 'matplotlib', None),
+              ('layout', choice('separate', 'shared'), 'separate', None))
+
+
+class AutosaveConfiguration(Section):
+    """
+    Settings of the crash recovery journal
+    """
+
+    __slots__ = ('directory', 'compaction_interval')
+    fields = (('directory', str, 'autosave', None),
+              ('compaction_interval', int, 500, 1))
+
+
+class SweepConfiguration(Section):
+    """
+    Parameter values of the variants written by Save sweep, see sweep.make_variants
+    """
+
+    __slots__ = ('center_shift', 'loss_offset', 's11_phase', 's22_phase', 'stretch', 'container')
+    fields = (('center_shift', parse_values, (0.0,), None),
+              ('loss_offset', parse_values, (0.0,), None),
+              ('s11_phase', parse_values, (0.0,), None),
+              ('s22_phase', parse_values, (0.0,), None),
+              ('stretch', parse_values, (1.0,), None),
+              ('container', bool, False, None))
+
+
+class MonteCarloConfiguration(Section):
+    """
+    Perturbations of the samples written by Save Monte-Carlo, see montecarlo.draw_samples
+    """
+
+    __slots__ = ('samples', 'seed', 'frequency_shift', 'loss_variation', 'ripple_amplitude', 'delay_ripple_amplitude',
+                 'ripple_period', 'batch_size', 'percentiles')
+    fields = (('samples', int, 1000, 1),
+              ('seed', int, 0, 0),
+              ('frequency_shift', parse_distribution, ('fixed', 0.0, 0.0), None),
+              ('loss_variation', parse_distribution, ('fixed', 0.0, 0.0), None),
+              ('ripple_amplitude', parse_distribution, ('fixed', 0.0, 0.0), None),
+              ('delay_ripple_amplitude', parse_distribution, ('fixed', 0.0, 0.0), None),
+              ('ripple_period', float, 10.0, 0),
+              ('batch_size', int, 64, 1),
+              ('percentiles', parse_values, (5.0, 50.0, 95.0), None))
+
+
+class TimeDomainConfiguration(Section):
+    """
+    Settings of the time-domain preview and export, see timedomain.time_response
+    """
+
+    __slots__ = ('window_beta', 'oversampling', 'time_span', 'export')
+    fields = (('window_beta', float, 6.0, 0),
+              ('oversampling', int, 4, 1),
+              ('time_span', float, 200.0, 0),
+              ('export', bool, False, None))
+
+
+class ServiceConfiguration(Section):
+    """
+    Settings of the local generation service, see service.GenerationService
+    """
+
+    __slots__ = ('host', 'port', 'workers', 'max_request_size', 'max_number_of_lines')
+    fields = (('host', str, '127.0.0.1', None),
+              ('port', int, 8750, 0),
+              ('workers', int, 0, 0),
+              ('max_request_size', int, 10000000, 1),
+              ('max_number_of_lines', int, 100000, 2))
+
+
+class WatcherConfiguration(Section):
+    """
+    Settings of the watch folder mode, see watcher.FolderWatcher
+    """
+
+    __slots__ = ('directory', 'output_directory', 'poll_interval', 'debounce', 'workers')
+    fields = (('directory', str, 'specifications', None),
+              ('output_directory', str, '', None),
+              ('poll_interval', float, 1.0, 0.01),
+              ('debounce', float, 2.0, 0),
+              ('workers', int, 0, 0))
+
+
+class ExportConfiguration(Section):
+    """
+    Settings of the export of the response plots, see export.export_directory
+    """
+
+    __slots__ = ('directory', 'output_directory', 'formats', 'dpi', 'width', 'height', 'workers')
+    fields = (('directory', str, 'specifications', None),
+              ('output_directory', str, '', None),
+              ('formats', choices('png', 'svg', 'pdf'), ('png',), None),
+              ('dpi', int, 150, 1),
+              ('width', float, 8.0, 1),
+              ('height', float, 5.0, 1),
+              ('workers', int, 0, 0))
+
+
+class SynthesisConfiguration(Section):
+    """
+    Settings of the measurements generated from a synthesized filter, see synthesis.seed_measurements
+    """
+
+    __slots__ = ('measurements', 'order', 'return_loss', 'transmission_zeros', 'grid_size')
+    fields = (('measurements', choice('bezier', 'synthesis'), 'bezier', None),
+              ('order', int, 6, 1),
+              ('return_loss', float, 20.0, 0.01),
+              ('transmission_zeros', parse_zeros, (), None),
+              ('grid_size', int, 20000, 2))
+
+
+class Configuration:
+    """
+    Typed and validated content of configurations.ini, one attribute per section
+    """
+
+    responses = ['insertion_loss', 'group_delay', 'input_return_loss', 'output_return_loss']
+    sections = {'touchstone': TouchstoneConfiguration, 'editor': EditorConfiguration,
+                'autosave': AutosaveConfiguration, 'sweep': SweepConfiguration,
+                'montecarlo': MonteCarloConfiguration, 'timedomain': TimeDomainConfiguration,
+                'service': ServiceConfiguration, 'watcher': WatcherConfiguration,
+                'export': ExportConfiguration, 'synthesis': SynthesisConfiguration}
+
+    def __init__(self, parser):
+        for section in self.responses:
+            setattr(self, section, ResponseConfiguration(parser, section))
+        for section, section_class in self.sections.items():
+            setattr(self, section, section_class(parser, section))
+
+    def all_sections(self):
+        return [getattr(self, section) for section in self.responses + list(self.sections)]
+
+    def reload(self, location=CONFIGURATION_FILE):
+        """
+        Reads the file again and updates the sections in place, so everyone holding a section sees the new values.
+        Nothing is changed if the file is not valid.
+        """
+        updated = Configuration(read_parser(location))
+        for section, new_section in zip(self.all_sections(), updated.all_sections()):
+            section.update({key: getattr(new_section, key) for key in section.__slots__})
+
+
+def read_parser(location):
+    parser = configparser.ConfigParser()
+    if not parser.read(location):
+        raise ValueError("Cannot read " + location)
+    return parser
+
+
+def read_configuration(location=CONFIGURATION_FILE):
+    return Configuration(read_parser(location))
+
+
+class ConfigurationWatcher(QtCore.QObject):
+    """
+    Reloads the configuration whenever the file changes and notifies through the changed signal
+    """
+
+    changed = QtCore.pyqtSignal()
+
+    def __init__(self, configuration, location=CONFIGURATION_FILE, delay=200):
+        super(ConfigurationWatcher, self).__init__()
+        self.configuration = configuration
+        self.location = os.path.abspath(location)
+        self.watcher = QtCore.QFileSystemWatcher([self.location])
+        self.watcher.fileChanged.connect(self.schedule_reload)
+        # editors often write the file in several steps, wait for them to finish
+        self.timer = QtCore.QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.reload)
+
+    def schedule_reload(self):
+        self.timer.start()
+
+    def reload(self):
+        # files replaced on save are no longer watched
+        if self.location not in self.watcher.files() and os.path.exists(self.location):
+            self.watcher.addPath(self.location)
+        try:
+            self.configuration.reload(self.location)
+        except (ValueError, configparser.Error) as error:
+            print("Configuration not reloaded: " + str(error))
+            return
+        self.changed.emit()
@@ -1,10 +1,10 @@
-import io
+from functools import lru_cache
+import numpy as np
 import models
+import spec_mask
+import synthesis
 
 
-def take_closest(num, collection):
-    return min(collection, key=lambda x: abs(x - num))
-
 #################################### InputData to NumericalData #############################################
 
 def get_numerical_data_from_text(text, negative=-1):
@@ -14,21 +14,93 @@ def get_numerical_data_from_text(text, negative=-1):
     :param text: The text to be parsed
     :param negative: Adds the '-' back to negative numbers. -1 by default. Must be set to 1 if parsing Group Delay text.
     :return: list of tuples (one for each line) containing the numeric values
+    :raises ValueError: if a line is not formatted as percent or range data
     """
-    values = []
-    text = io.StringIO(text)
-    for line in text.readlines():
-        line = line.replace('-', ' ')
-        splits = line.split()
-        if len(splits) == 2:  # Parsing percent data
-            values.append((int(splits[0][:-1]), negative * float(splits[1])))
-        elif len(splits) == 3:  # Parsing range data
-            values.append(((float(splits[0]), float(splits[1])), negative * float(splits[2])))
-        else:  # Incorrect format, it can occur on any line of the file
-            print("Incorrect format: " + line)
-            exit()
+    return [parse_line(line, negative) for line in text.splitlines() if line.strip()]
 
-    return values
+
+@lru_cache(maxsize=8192)
+def parse_line(line, negative=-1):
+    """
+    Parses one line of percent or range data, see get_numerical_data_from_text
+    Lines are cached by their text, so texts parsed again after an edit only parse the lines that changed.
+    :return: (percent, value) or ((start, stop), value)
+    :raises ValueError: if the line is not formatted as percent or range data
+    """
+    splits = line.replace('-', ' ').split()
+    if len(splits) == 2:  # Parsing percent data
+        return int(splits[0][:-1]), negative * float(splits[1])
+    elif len(splits) == 3:  # Parsing range data
+        return (float(splits[0]), float(splits[1])), negative * float(splits[2])
+    # Incorrect format, it can occur on any line of the file
+    raise ValueError("Incorrect format: " + line.strip())
+
+
+def check_text(text, negative=-1, kind=None):
+    """
+    Parses a text like get_numerical_data_from_text, without stopping at the first incorrect line
+    :param kind: 'percent' or 'range' to also report the lines of the other kind, None to accept both
+    :return: (values of the correct lines, list of (line number, message) of the incorrect ones)
+    """
+    values = []
+    errors = []
+    for number, line in enumerate(text.splitlines()):
+        if not line.strip():
+            continue
+        try:
+            value = parse_line(line, negative)
+        except ValueError as error:
+            errors.append((number, str(error)))
+            continue
+        if kind is not None and isinstance(value[0], tuple) != (kind == 'range'):
+            errors.append((number, "Expected " + kind + " data: " + line.strip()))
+            continue
+        values.append(value)
+    return values, errors
+
+
+def parse_specification_file(lines):
+    """
+    Parses a specifications file, formatted as texts/input_format_example.txt or as a saved -ideal.txt file, into the
+    texts of the input screen
+    Each response starts at a line holding its name; lines with a percent are in band data, other lines with
+    numbers are out of band ranges, and the labels in between are ignored.
+    :param lines: list of strings
+    :return: dictionary with the texts of pipeline.SPECIFICATION_FIELDS
+    :raises ValueError: if a value or a response is missing
+    """
+    fields = {'center frequency': 'center_frequency', 'bandwidth': 'bandwidth',
+              'loss at center frequency': 'loss_at_center'}
+    responses = {'INSERTION LOSS': ('insertion_loss_inband', 'insertion_loss_outofband'),
+                 'GROUP DELAY': ('group_delay_inband', 'group_delay_outofband'),
+                 'INPUT RETURN LOSS': (None, 'input_return_loss'),
+                 'OUTPUT RETURN LOSS': (None, 'output_return_loss')}
+    specification = {}
+    data = {}
+    response = None
+    for line in lines:
+        line = line.strip()
+        title = line.strip('%').strip().upper()
+        if title in responses:
+            response = responses[title]
+        elif ':' in line:
+            name, _, value = line.partition(':')
+            if name.strip().lower() in fields and value.split():
+                specification[fields[name.strip().lower()]] = value.split()[0]
+        elif line and response is not None:
+            field = response[0] if '%' in line else response[1]
+            if field is None:
+                raise ValueError("Incorrect format: " + line)
+            data.setdefault(field, []).append(line)
+    for field_list in responses.values():
+        for field in field_list:
+            if field is not None:
+                specification[field] = "\n".join(data.get(field, []))
+    missing = [field for field in ['center_frequency', 'bandwidth', 'loss_at_center'] if field not in specification]
+    missing += [field for field in specification if specification[field] == ""]
+    if missing:
+        raise ValueError("Missing " + ", ".join(missing))
+    return specification
 
 
 def get_numerical_data_from_input_data(input_data):
@@ -58,159 +130,80 @@ def parse_loaded_measurements(measurement_text):
     :param measurement_text: list of strings
     :return: one array of type [measurements_x, measurements y] for each graph
     """
-    il_mes = [list(map(float, measurement_text[0][:-1].split(" "))), list(map(float, measurement_text[1][:-1].split(" ")))]
-    gd_mes = [list(map(float, measurement_text[2][:-1].split(" "))), list(map(float, measurement_text[3][:-1].split(" ")))]
-    irl_mes = [list(map(float, measurement_text[4][:-1].split(" "))), list(map(float, measurement_text[5][:-1].split(" ")))]
-    orl_mes = [list(map(float, measurement_text[6][:-1].split(" "))), list(map(float, measurement_text[7][:-1].split(" ")))]
+    vectors = [np.array(line.split(), dtype=np.float64) for line in measurement_text[:8]]
+    il_mes = vectors[0:2]
+    gd_mes = vectors[2:4]
+    irl_mes = vectors[4:6]
+    orl_mes = vectors[6:8]
 
     return il_mes, gd_mes, irl_mes, orl_mes
 
 
-def make_plot_data(input_data, measurement_text):
+def make_plot_data(input_data, measurement_text, synthesis_conf=None):
     """
     Transforms given InputData object into GraphData objects for each of the 4 graphs
     :param input_data: InputData object containing the text input
+    :param synthesis_conf: the SynthesisConfiguration; without measurement text, the measurements are taken from a
+                           synthesized filter if it is configured so, otherwise they are generated inside the masks
     :return: 4 GraphData objects for Insertion Loss, Group Delay and Return Loss as well as the
              3 response features (center frequency, bandwidth, loss at center frequency)
     """
     cf, bw, loss_cf, il_percent, il_range, gd_percent, gd_range, irl_range, orl_range = \
         get_numerical_data_from_input_data(input_data)
 
-    il_plot = get_plot_insertionloss_groupdelay(cf, bw, il_percent, il_range, loss_center=loss_cf)
-    gd_plot = get_plot_insertionloss_groupdelay(cf, bw, gd_percent, gd_range)
-    irl_plot = get_plot_returnloss(cf, irl_range)
-    orl_plot = get_plot_returnloss(cf, orl_range)
+    masks = [get_mask_insertionloss_groupdelay(cf, bw, il_percent, il_range, loss_center=loss_cf),
+             get_mask_insertionloss_groupdelay(cf, bw, gd_percent, gd_range),
+             get_mask_returnloss(cf, bw, irl_range),
+             get_mask_returnloss(cf, bw, orl_range)]
+    il_plot, gd_plot, irl_plot, orl_plot = [mask.plot() for mask in masks]
 
-    if not measurement_text:
-        return models.NumericalData(cf, bw, loss_cf, il_plot, gd_plot, irl_plot, orl_plot)
-    else:
+    if measurement_text:
         il_mes, gd_mes, irl_mes, orl_mes = parse_loaded_measurements(measurement_text)
-        return models.NumericalData(cf, bw, loss_cf, il_plot, gd_plot, irl_plot, orl_plot, il_mes, gd_mes, irl_mes,
-                                    orl_mes)
+    elif synthesis_conf is not None and synthesis_conf.measurements == 'synthesis':
+        il_mes, gd_mes, irl_mes, orl_mes = synthesis.seed_measurements(
+            cf, bw, loss_cf, [plot[0] for plot in (il_plot, gd_plot, irl_plot, orl_plot)], synthesis_conf)
+    else:
+        return models.NumericalData(cf, bw, loss_cf, il_plot, gd_plot, irl_plot, orl_plot, masks=masks)
+    return models.NumericalData(cf, bw, loss_cf, il_plot, gd_plot, irl_plot, orl_plot, il_mes, gd_mes, irl_mes, orl_mes,
+                                masks=masks)
 
 
-def get_plot_insertionloss_groupdelay(center_frequency, bandwidth, percent_contents, range_contents, loss_center=None):
+def get_mask_insertionloss_groupdelay(center_frequency, bandwidth, percent_contents, range_contents, loss_center=None):
     """
-    Creates data for plotting Insertion Loss or Group delay
+    Creates the specification mask of Insertion Loss or Group delay
     :param center_frequency: The central frequency
     :param bandwidth:  The bandwidth
     :param percent_contents: The numerical percent information for in band behaviour
     :param range_contents: The numerical range information for out of band behaviour
     :param loss_center: The loss at central frequency. Default is None for Group Delay. Must be set for Insertion Loss
-    :return: The 2D array with the frequency vector on first position and the value vector on the second position
+    :return: the SpecMask
     """
-    before_central_plot, after_central_plot = make_plot_from_range(center_frequency, range_contents)
-    in_range_plot = make_plot_from_percent(center_frequency, bandwidth, percent_contents, loss_center)
-    result = connect_percent_range_plot(before_central_plot, in_range_plot, after_central_plot)
-
-    return result
+    ranges, range_limits = range_arrays(range_contents)
+    percents = np.array([point[0] for point in percent_contents], dtype=np.float64)
+    percent_limits = np.array([point[1] for point in percent_contents], dtype=np.float64)
+    return spec_mask.make_mask(center_frequency, bandwidth, ranges, range_limits, percents, percent_limits,
+                               loss_center)
 
 
-def get_plot_returnloss(center_frequency, range_contents):
+def get_mask_returnloss(center_frequency, bandwidth, range_contents):
     """
-    Creates data for plotting Input and Output Return Loss
+    Creates the specification mask of Input and Output Return Loss
     :param center_frequency: The central frequency
+    :param bandwidth: The bandwidth
     :param range_contents: The numerical range information for out of band behaviour
-    :return: The 2D array with the frequency vector on first position and the value vector on the second position
+    :return: the SpecMask
     """
-    range_data_before, range_data_after = make_plot_from_range(center_frequency, range_contents)
-    result = connect_range_plot(center_frequency, range_data_before, range_data_after)
-
-    return result
-
-
-def make_plot_from_range(center_frequency, range_data):
-    before_central_frequency = []
-    after_central_frequency = []
-    before_central_response = []
-    after_central_response = []
-    for index in range(0, len(range_data) - 1):
-        point = range_data[index]
-        next_point = range_data[index + 1]
-
-        start_frequency = point[0][0] * 1000
-        end_frequency = point[0][1] * 1000
-        if start_frequency < center_frequency:
-            before_central_frequency.append(start_frequency)
-            before_central_response.append(point[1])
-            start_frequency_next_point = next_point[0][0] * 1000
-            if start_frequency_next_point < center_frequency:
-                before_central_frequency.append(start_frequency_next_point - 0.001)
-                before_central_response.append(point[1])
-        else:
-            after_central_frequency.append(end_frequency)
-            after_central_response.append(point[1])
-            after_central_frequency.append(end_frequency + 0.001)
-            after_central_response.append(next_point[1])
-    last_point = range_data[-1]
-    after_central_frequency.append(last_point[0][1] * 1000)
-    after_central_response.append(last_point[1])
-    return (before_central_frequency, before_central_response), (after_central_frequency, after_central_response)
-
-
-def make_plot_from_percent(center_frequency, bandwidth, percent_data, loss_center=None):
-    inrange_frequency = [center_frequency]
-    if loss_center is not None:
-        inrange_response = [loss_center + percent_data[0][1]]
-    else:
-        inrange_response = [0]
-    for index in range(0, len(percent_data)):
-        point = percent_data[index]
-        # Frequency list
-        current_frequency = point[0]
-        plus_frequency = center_frequency + current_frequency / 200 * bandwidth
-        minus_frequency = center_frequency - current_frequency / 200 * bandwidth
-        if index != 0:
-            inrange_frequency.append(inrange_frequency[-1] + 0.001)
-            inrange_frequency.insert(0, inrange_frequency[0] - 0.001)
-        inrange_frequency.append(plus_frequency)
-        inrange_frequency.insert(0, minus_frequency)
-        # Rejection list
-        current_rejection = point[1]
-        if current_frequency <= 100 and loss_center is not None:
-            current_rejection += loss_center
-        if index != 0:
-            inrange_response.append(current_rejection)
-            inrange_response.insert(0, current_rejection)
-        inrange_response.append(current_rejection)
-        inrange_response.insert(0, current_rejection)
-    return inrange_frequency, inrange_response
-
-
-def connect_percent_range_plot(before_range_plot, in_range_plot, after_range_plot):
-    final_plot_frequency = []
-    final_plot_response = []
-
-    final_plot_frequency.extend(before_range_plot[0])
-    final_plot_frequency.append(in_range_plot[0][0] - 0.001)
-    final_plot_frequency.extend(in_range_plot[0])
-    final_plot_frequency.append(in_range_plot[0][-1] + 0.001)
-    final_plot_frequency.extend(after_range_plot[0])
-
-    final_plot_response.extend(before_range_plot[1])
-    final_plot_response.append(before_range_plot[1][-1])
-    final_plot_response.extend(in_range_plot[1])
-    final_plot_response.append(after_range_plot[1][0])
-    final_plot_response.extend(after_range_plot[1])
-
-    return final_plot_frequency, final_plot_response
-
-
-def connect_range_plot(central_frequency, before_range_plot, after_range_plot):
-    final_plot_frequency = []
-    final_plot_response = []
-
-    final_plot_frequency.extend(before_range_plot[0])
-    final_plot_frequency.append(central_frequency - 0.001)
-    final_plot_frequency.append(central_frequency)
-    final_plot_frequency.extend(after_range_plot[0])
-
-    final_plot_response.extend(before_range_plot[1])
-    final_plot_response.append(before_range_plot[1][-1])
-    final_plot_response.append(after_range_plot[1][0])
-    final_plot_response.extend(after_range_plot[1])
-
-    return final_plot_frequency, final_plot_response
+    ranges, range_limits = range_arrays(range_contents)
+    return spec_mask.make_mask(center_frequency, bandwidth, ranges, range_limits)
+
+
+def range_arrays(range_contents):
+    """
+    :return: ranges (Mhz) and limits of the parsed range contents, as arrays
+    """
+    ranges = np.array([point[0] for point in range_contents], dtype=np.float64).reshape(-1, 2) * 1000
+    limits = np.array([point[1] for point in range_contents], dtype=np.float64)
+    return ranges, limits
 
 
 ######################################## NumericalData to text ##########################################
@@ -225,99 +218,21 @@ def make_text_data(numerical_data):
     cf = numerical_data.center_frequency
     bw = numerical_data.bandwidth
     lac = numerical_data.loss_at_center
-    il = numerical_data.insertion_loss
-    gd = numerical_data.group_delay
-    irl = numerical_data.input_return_loss
-    orl = numerical_data.output_return_loss
-
-    il_percent_contents, il_range_contents = get_percent_and_range(cf, bw, [il.frequencies, il.specifications], lac)
-    gd_percent_contents, gd_range_contents = get_percent_and_range(cf, bw, [gd.frequencies, gd.specifications])
-    irl_plot = remove_redundant_plot_points(cf, [irl.frequencies, irl.specifications])
-    irl_range_contents = make_range_from_plot_data(cf, bw, irl_plot)
-    orl_plot = remove_redundant_plot_points(cf, [orl.frequencies, orl.specifications])
-    orl_range_contents = make_range_from_plot_data(cf, bw, orl_plot)
-
-    il_text = write_contents_to_string(il.name, il_range_contents, cf, bw, il_percent_contents, lac)
-    gd_text = write_contents_to_string(gd.name, gd_range_contents, cf, bw, gd_percent_contents)
-    irl_text = write_contents_to_string(irl.name, irl_range_contents, cf, bw)
-    orl_text = write_contents_to_string(orl.name, orl_range_contents, cf, bw)
+    il = numerical_data.insertion_loss.read_mask()
+    gd = numerical_data.group_delay.read_mask()
+    irl = numerical_data.input_return_loss.read_mask()
+    orl = numerical_data.output_return_loss.read_mask()
+
+    il_text = write_contents_to_string(numerical_data.insertion_loss.name, il.range_contents(), cf, bw,
+                                       il.percent_contents(), lac)
+    gd_text = write_contents_to_string(numerical_data.group_delay.name, gd.range_contents(), cf, bw,
+                                       gd.percent_contents())
+    irl_text = write_contents_to_string(numerical_data.input_return_loss.name, irl.range_contents(), cf, bw)
+    orl_text = write_contents_to_string(numerical_data.output_return_loss.name, orl.range_contents(), cf, bw)
 
     return [il_text, gd_text, irl_text, orl_text]
 
 
-def get_percent_and_range(center_frequency, bandwidth, plot, loss_center=None):
-    """
-    For given plot data generate text output compatible with the InputData format
-    :param center_frequency: the central frequency
-    :param bandwidth: the response bandwidth
-    :param plot: the plot data containing frequencies and specifications
-    :param loss_center: the loss at central frequency. Default is none. Makes sense only for Insertion Loss graph
-    :return 2 blocks of text corresponding to the percentage, respectively range inputs
-    """
-    plot = remove_redundant_plot_points(center_frequency, plot)
-    frequencies = plot[0]
-    response = plot[1]
-
-    min_percent_ind = frequencies.index(take_closest(center_frequency - bandwidth, frequencies))
-    max_percent_ind = frequencies.index(take_closest(center_frequency + bandwidth, frequencies))
-    percent_plot = (frequencies[min_percent_ind:max_percent_ind + 1], response[min_percent_ind:max_percent_ind + 1])
-    range_plot = (frequencies[:min_percent_ind] + frequencies[max_percent_ind + 1:],
-                  response[:min_percent_ind] + response[max_percent_ind + 1:])
-
-    percent_contents = make_percent_from_plot_data(center_frequency, bandwidth, percent_plot, loss_center=loss_center)
-    range_contents = make_range_from_plot_data(center_frequency, bandwidth, range_plot)
-
-    return percent_contents, range_contents
-
-
-def remove_redundant_plot_points(center_frequency, plot):
-    center_index = plot[0].index(center_frequency)
-    x = remove_redundant_list_elements(center_index, plot[0])
-    y = remove_redundant_list_elements(center_index, plot[1])
-    return x, y
-
-
-def remove_redundant_list_elements(center_index, list_to_clean):
-    clean_list = []
-    clean_list.extend(list_to_clean[:center_index][::2])
-    clean_list.extend(list_to_clean[center_index + 1:][::2])
-    return clean_list
-
-
-# TODO: update loss at center if value for 50% is greater than 1
-def make_percent_from_plot_data(center_frequency, bandwidth, plot, loss_center=None):
-    contents = []
-    for index in range(0, int(len(plot[0]) / 2)):
-        current_percentage = (center_frequency - plot[0][index]) * 200 / bandwidth
-        current_rejection = plot[1][index]
-        if loss_center is not None and current_percentage <= 100:
-            current_rejection -= loss_center
-        contents.append((int(current_percentage), round(current_rejection, 2)))
-    contents.reverse()
-    return contents
-
-
-def make_range_from_plot_data(center_frequency, bandwidth, plot):
-    contents = []
-    frequencies = plot[0]
-    for index in range(0, len(frequencies)):
-        if frequencies[index] < center_frequency:
-            if index + 1 == len(frequencies):
-                return contents
-            if frequencies[index + 1] < center_frequency:
-                contents.append(((frequencies[index] / 1000, frequencies[index + 1] / 1000), plot[1][index]))
-            else:
-                contents.append(((frequencies[index] / 1000, (center_frequency - bandwidth) / 1000), plot[1][index]))
-        else:
-            if index == 0:
-                continue
-            if frequencies[index - 1] > center_frequency:
-                contents.append(((frequencies[index - 1] / 1000, frequencies[index] / 1000), plot[1][index]))
-            else:
-                contents.append((((center_frequency + bandwidth) / 1000, frequencies[index] / 1000), plot[1][index]))
-    return contents
-
-
 def write_contents_to_string(title, range_contents, center_frequency, bandwidth, percent_contents=None,
                              loss_at_center=None):
     """
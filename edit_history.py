@@ -0,0 +1,135 @@
+from collections import deque
+import numpy as np
+
+
+class EditHistory:
+    """
+    Append-only log of the point edits made on the response canvases, used for undo and redo
+    Each delta is a tuple (graph, artist, index, old_x, old_y, new_x, new_y) where artist is '_line0' for
+    specifications and '_line1' for measurements. Edits of several points at once use arrays for index and the
+    values. Undo and redo assign the stored values, so any chain of them restores the points exactly.
+    Consecutive nudges of the same point are merged into one delta and only the last `capacity` deltas are kept,
+    so memory stays flat during long sessions.
+    """
+
+    def __init__(self, capacity=10000):
+        self.deltas = deque(maxlen=capacity)
+        self.undone = []
+        self.dropped = 0  # revisions forgotten because of the capacity
+        self.listeners = []
+
+    @property
+    def revision(self):
+        """
+        Number of edits applied since the start of the session
+        """
+        return self.dropped + len(self.deltas)
+
+    def add_listener(self, listener):
+        """
+        Registers a callable invoked with (graph, artist, index, x, y), the new values of the points, for every
+        change of the graphs, including the ones made by undo and redo
+        """
+        self.listeners.append(listener)
+
+    def notify(self, graph, artist, index, x, y):
+        for listener in self.listeners:
+            listener(graph, artist, index, x, y)
+
+    def record(self, graph, artist, index, old_x, old_y, new_x, new_y):
+        """
+        Records an edit that was already applied to the graph, nothing if the points did not move
+        """
+        if np.array_equal(old_x, new_x) and np.array_equal(old_y, new_y):
+            return
+        self.notify(graph, artist, index, new_x, new_y)
+        if self.undone:
+            self.undone.clear()
+        elif self.deltas:
+            last_graph, last_artist, last_index, last_old_x, last_old_y = self.deltas[-1][:5]
+            single_points = np.ndim(index) == 0 and np.ndim(last_index) == 0
+            if single_points and last_graph is graph and last_artist == artist and last_index == index:
+                self.deltas[-1] = (graph, artist, index, last_old_x, last_old_y, new_x, new_y)
+                return
+        if len(self.deltas) == self.deltas.maxlen:
+            self.dropped += 1
+        self.deltas.append((graph, artist, index, old_x, old_y, new_x, new_y))
+
+    def can_undo(self):
+        return len(self.deltas) > 0
+
+    def can_redo(self):
+        return len(self.undone) > 0
+
+    def undo(self):
+        """
+        Reverts the last edit
+        :return: the reverted delta, None if there is nothing to undo
+        """
+        if not self.deltas:
+            return None
+        delta = self.deltas.pop()
+        graph, artist, index, old_x, old_y = delta[:5]
+        self.apply(graph, artist, index, old_x, old_y)
+        self.undone.append(delta)
+        return delta
+
+    def redo(self):
+        """
+        Applies again the last reverted edit
+        :return: the applied delta, None if there is nothing to redo
+        """
+        if not self.undone:
+            return None
+        delta = self.undone.pop()
+        graph, artist, index = delta[:3]
+        self.apply(graph, artist, index, *delta[5:])
+        self.deltas.append(delta)
+        return delta
+
+    def jump_to(self, revision):
+        """
+        Undoes or redoes edits until the given revision is reached
+        :param revision: a revision between the oldest one still kept and the latest one
+        :return: list of the deltas that were undone or redone
+        """
+        if revision < self.dropped or revision > self.revision + len(self.undone):
+            raise ValueError("Revision " + str(revision) + " is not available")
+        changed = []
+        while self.revision > revision:
+            changed.append(self.undo())
+        while self.revision < revision:
+            changed.append(self.redo())
+        return changed
+
+    def apply(self, graph, artist, index, x, y):
+        move_points(graph, artist, index, x, y)
+        self.notify(graph, artist, index, x, y)
+
+
+def point_values(graph, artist, index):
+    """
+    :return: (x, y) copies of the values of points of the specifications ('_line0') or measurements ('_line1')
+    """
+    if artist == '_line0':
+        return np.copy(graph.frequencies[index]), np.copy(graph.specifications[index])
+    return np.copy(graph.measurements_x[index]), np.copy(graph.measurements_y[index])
+
+
+def move_points(graph, artist, index, x, y):
+    """
+    Assigns new values to points of the specifications ('_line0') or measurements ('_line1') of a graph
+    The version of the graph is increased only if a value changed, see GraphData.changed
+    :param index: index of a point or array of indices
+    :return: True if a value changed
+    """
+    if artist == '_line0':
+        frequencies, responses = graph.frequencies, graph.specifications
+    else:
+        frequencies, responses = graph.measurements_x, graph.measurements_y
+    if np.array_equal(frequencies[index], x) and np.array_equal(responses[index], y):
+        return False
+    frequencies[index] = x
+    responses[index] = y
+    graph.changed(artist)
+    return True
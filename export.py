@@ -0,0 +1,142 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import compliance
+import data_parser
+import interpolation
+import pipeline
+import watcher
+
+RESPONSES = ('insertion_loss', 'group_delay', 'input_return_loss', 'output_return_loss')
+
+
+def draw_response(axes, graph_data, conf, title_prefix=''):
+    """
+    Draws a response into matplotlib axes as the response canvases show it: the specifications, the measurements
+    with their interpolated curve and the regions outside the specifications
+    :param graph_data: GraphData whose measurements are interpolated, see pipeline.prepare
+    :param conf: the ResponseConfiguration of the response
+    """
+    axes.set_xlabel('Frequency(Mhz)')
+    axes.set_ylabel('Response(' + graph_data.unit + ')')
+    axes.plot(graph_data.frequencies, graph_data.specifications, 'ob-')
+    axes.plot(graph_data.measurements_x, graph_data.measurements_y, 'ro')
+    x = graph_data.measurements_x
+    axes.plot(*interpolation.sample(graph_data.interpolation_function, x, (x[0], x[-1]), axes.bbox.width), 'r-')
+    checker = compliance.ComplianceChecker(graph_data, conf.compliance_grid_size)
+    axes.fill_between(checker.grid, checker.values, checker.limits, where=checker.violations(), interpolate=True,
+                      color='orange', alpha=0.5)
+    worst = checker.worst_margin()
+    axes.set_title(title_prefix + 'Worst margin: ' + str(round(worst, 2)) + ' ' + graph_data.unit,
+                   color='red' if worst < 0 else 'green')
+
+
+def render_response(graph_data, conf, export_conf, location, title_prefix=''):
+    """
+    Renders one response to image files on the Agg backend, without any Qt widget; runs in a worker process
+    :param export_conf: the ExportConfiguration
+    :param location: location of the files without extension, one file is written per configured format
+    :return: locations of the written files
+    """
+    figure = Figure(figsize=(export_conf.width, export_conf.height), dpi=export_conf.dpi)
+    FigureCanvasAgg(figure)
+    draw_response(figure.add_subplot(111), graph_data, conf, title_prefix)
+    figure.tight_layout()
+    locations = []
+    for image_format in export_conf.formats:
+        locations.append(location + '.' + image_format)
+        figure.savefig(locations[-1], dpi=export_conf.dpi)
+    return locations
+
+
+def submit_design(executor, numerical_data, name, output_directory, conf):
+    """
+    Submits the rendering of the four responses of a design, one task per response
+    :param conf: the Configuration
+    :return: list of futures giving the locations of the written files
+    """
+    futures = []
+    for response in RESPONSES:
+        graph_data = getattr(numerical_data, response)
+        location = os.path.join(output_directory, name + '-' + response)
+        futures.append(executor.submit(render_response, graph_data, getattr(conf, response), conf.export, location,
+                                       name + ' - ' + graph_data.name + ' - '))
+    return futures
+
+
+def export_design(numerical_data, name, output_directory, conf):
+    """
+    Renders the four responses of a design to <output_directory>/<name>-<response>.<format>, in parallel
+    The worker processes are spawned rather than forked, so this is safe from the application, whose Qt and
+    background threads a fork would copy in whatever state they are.
+    :param numerical_data: NumericalData of the design, e.g. from pipeline.make_numerical_data
+    :param conf: the Configuration
+    :return: locations of the written files
+    """
+    with ProcessPoolExecutor(min(conf.export.workers or os.cpu_count(), len(RESPONSES)),
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        futures = submit_design(executor, pipeline.prepare(numerical_data, pipeline.interpolation_kinds(conf)), name,
+                                output_directory, conf)
+        return [location for future in futures for location in future.result()]
+
+
+def find_designs(directory):
+    """
+    :return: dictionary of the designs of a directory, name: (specifications location, measurements location or
+             None), named as in the watch folder mode, see watcher.design_of
+    """
+    files = {}
+    for file_name in sorted(os.listdir(directory)):
+        design = watcher.design_of(file_name)
+        if design is not None and os.path.isfile(os.path.join(directory, file_name)):
+            files.setdefault(design[0], {})[design[1]] = os.path.join(directory, file_name)
+    for name in files:
+        # <name>.txt is preferred to <name>-ideal.txt
+        plain = os.path.join(directory, name + '.txt')
+        if os.path.isfile(plain):
+            files[name]['specifications'] = plain
+    return {name: (inputs['specifications'], inputs.get('measurements')) for name, inputs in files.items()
+            if 'specifications' in inputs}
+
+
+def export_directory(conf, directory=None, output_directory=None):
+    """
+    Renders the responses of every design of a directory of specifications, see find_designs
+    All responses of all designs are rendered in parallel by a pool of processes, while the next designs are read.
+    :param conf: the Configuration
+    :param directory: directory of the specifications, defaults to the configured one
+    :param output_directory: directory of the images, defaults to the configured one or to directory
+    :return: number of written files
+    """
+    directory = directory or conf.export.directory
+    output_directory = output_directory or conf.export.output_directory or directory
+    if not os.path.isdir(directory):
+        print("No directory " + directory + " to export")
+        return 0
+    os.makedirs(output_directory, exist_ok=True)
+    written = 0
+    with ProcessPoolExecutor(conf.export.workers or os.cpu_count(),
+                             mp_context=multiprocessing.get_context('spawn')) as executor:
+        jobs = []
+        for name, (specifications, measurements) in find_designs(directory).items():
+            try:
+                specification = data_parser.parse_specification_file(watcher.read_lines(specifications))
+                measurement_text = [] if measurements is None else watcher.read_lines(measurements)
+                numerical_data = pipeline.make_numerical_data(specification, measurement_text, conf.synthesis,
+                                                             pipeline.interpolation_kinds(conf))
+            except watcher.GENERATION_ERRORS as error:
+                print(name + ": cannot read " + specifications + ": " + str(error))
+                continue
+            jobs.append((name, submit_design(executor, numerical_data, name, output_directory, conf)))
+        for name, futures in jobs:
+            try:
+                locations = [location for future in futures for location in future.result()]
+            except watcher.GENERATION_ERRORS as error:
+                print(name + ": cannot render: " + str(error))
+                continue
+            written += len(locations)
+        print("Wrote " + str(written) + " files of " + str(len(jobs)) + " designs to " +
+              os.path.abspath(output_directory))
+    return written
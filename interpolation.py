@@ -0,0 +1,84 @@
+import numpy as np
+from scipy import interpolate
+
+KINDS = ('quadratic', 'pchip', 'akima', 'cubic', 'linear')
+# number of neighbours on each side of a moved point beyond which the curve stays the same; the quadratic and
+# cubic splines are global, moving one point changes them everywhere
+REACH = {'pchip': 2, 'akima': 3, 'linear': 1}
+
+
+class Interpolator:
+    """
+    Curve through the measurements of a response, fitted once and evaluated as often as needed
+    Frequencies outside the measured range take the value at the nearest end, so any frequency grid can be evaluated
+    without checking it first. Evaluation is vectorized over arrays of any shape.
+        - quadratic: quadratic spline, smooth but it may overshoot between distant points
+        - pchip: piecewise cubic keeping the monotony of the points, never overshoots
+        - akima: piecewise cubic following the local slopes, little overshoot
+        - cubic: cubic spline, the smoothest
+        - linear: straight lines between the points
+    The interpolator keeps a copy of the points, the editor modifying them in place fits a new one.
+    """
+
+    __slots__ = ('kind', 'start', 'stop', 'function')
+
+    def __init__(self, x, y, kind='quadratic'):
+        """
+        :param x: increasing frequencies of the measurements
+        :param y: responses of the measurements
+        :param kind: one of KINDS
+        :raises ValueError: for an unknown kind or too few points for it
+        """
+        x = np.array(x, dtype=np.float64)
+        y = np.array(y, dtype=np.float64)
+        self.kind = kind
+        self.start = x[0]
+        self.stop = x[-1]
+        if kind == 'quadratic':
+            self.function = interpolate.interp1d(x, y, kind='quadratic')
+        elif kind == 'pchip':
+            self.function = interpolate.PchipInterpolator(x, y)
+        elif kind == 'akima':
+            self.function = interpolate.Akima1DInterpolator(x, y)
+        elif kind == 'cubic':
+            self.function = interpolate.CubicSpline(x, y)
+        elif kind == 'linear':
+            self.function = LinearFunction(x, y)
+        else:
+            raise ValueError(kind + " is not one of " + ", ".join(KINDS))
+
+    def __call__(self, frequencies):
+        return self.function(np.clip(frequencies, self.start, self.stop))
+
+
+class LinearFunction:
+    """
+    Linear interpolation of numpy, which is faster than the scipy ones; a class so that it can be pickled
+    """
+
+    __slots__ = ('x', 'y')
+
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+    def __call__(self, frequencies):
+        return np.interp(frequencies, self.x, self.y)
+
+
+def sample(function, x, x_range, width):
+    """
+    Samples an interpolated curve for drawing: about one point per pixel over the visible part of the measured range,
+    along with the measurement points inside it so the curve goes exactly through them
+    :param function: the Interpolator of the measurements
+    :param x: frequencies of the measurements
+    :param x_range: (start, stop) visible frequencies
+    :param width: width of the visible range in pixels
+    :return: (x, y) of the curve, empty if the measured range is not visible
+    """
+    start = max(x[0], min(x_range))
+    stop = min(x[-1], max(x_range))
+    if start >= stop:
+        return np.empty(0), np.empty(0)
+    xf = np.union1d(np.linspace(start, stop, max(int(width), 2)), x[(x > start) & (x < stop)])
+    return xf, function(xf)
@@ -0,0 +1,146 @@
+import json
+import os
+import queue
+import threading
+import numpy as np
+import edit_history
+import models
+import spec_mask
+
+SNAPSHOT_FILE = 'session.json'
+LOG_FILE = 'session.log'
+
+
+class Journal:
+    """
+    Autosaves a GenerateScreen session for crash recovery
+        - every edit is appended to a log file by a background thread, the editor only enqueues it
+        - every `compaction_interval` edits the whole session is written as a snapshot and the log restarts
+    Edits are numbered so that the ones already contained in the snapshot are skipped on recovery
+    """
+
+    def __init__(self, directory, numerical_data, compaction_interval=500):
+        self.directory = directory
+        self.numerical_data = numerical_data
+        self.compaction_interval = compaction_interval
+        self.sequence = 0
+        self.pending = queue.Queue()
+        os.makedirs(directory, exist_ok=True)
+        self.writer = threading.Thread(target=self.write_entries, daemon=True)
+        self.writer.start()
+        self.snapshot()
+
+    def record(self, graph, artist, index, x, y):
+        """
+        Queues one edit, the new values of the points, for writing. Meant to be registered as an EditHistory listener
+        """
+        self.sequence += 1
+        graph_index = graph_list(self.numerical_data).index(graph)
+        self.pending.put((self.sequence, graph_index, artist, np.asarray(index).tolist(),
+                          np.asarray(x, dtype=float).tolist(), np.asarray(y, dtype=float).tolist()))
+        if self.sequence % self.compaction_interval == 0:
+            self.snapshot()
+
+    def snapshot(self):
+        """
+        Queues a snapshot of the whole session, after which the log starts over
+        """
+        snapshot = {'sequence': self.sequence,
+                    'center_frequency': self.numerical_data.center_frequency,
+                    'bandwidth': self.numerical_data.bandwidth,
+                    'loss_at_center': self.numerical_data.loss_at_center,
+                    'graphs': [[graph.frequencies.tolist(), graph.specifications.tolist(),
+                                graph.measurements_x.tolist(), graph.measurements_y.tolist()]
+                               for graph in graph_list(self.numerical_data)],
+                    'masks': [None if graph.mask is None else graph.mask.layout()
+                              for graph in graph_list(self.numerical_data)]}
+        self.pending.put(snapshot)
+
+    def close(self, discard=False):
+        """
+        Waits for the queued entries to be written
+        :param discard: removes the journal files as well, once the session was saved
+        """
+        self.pending.put(None)
+        self.writer.join()
+        if discard:
+            discard_session(self.directory)
+
+    def write_entries(self):
+        log_file = None
+        while True:
+            entry = self.pending.get()
+            if entry is None:
+                break
+            if isinstance(entry, dict):
+                if log_file is not None:
+                    log_file.close()
+                write_snapshot(self.directory, entry)
+                log_file = open(os.path.join(self.directory, LOG_FILE), "w")
+            else:
+                log_file.write(json.dumps(entry) + "\n")
+                if self.pending.empty():
+                    log_file.flush()
+        if log_file is not None:
+            log_file.close()
+
+
+def graph_list(numerical_data):
+    return [numerical_data.insertion_loss, numerical_data.group_delay, numerical_data.input_return_loss,
+            numerical_data.output_return_loss]
+
+
+def write_snapshot(directory, snapshot):
+    """
+    Replaces the snapshot atomically, so a crash while writing keeps the previous one
+    """
+    location = os.path.join(directory, SNAPSHOT_FILE)
+    snapshot_file = open(location + ".tmp", "w")
+    json.dump(snapshot, snapshot_file)
+    snapshot_file.flush()
+    os.fsync(snapshot_file.fileno())
+    snapshot_file.close()
+    os.replace(location + ".tmp", location)
+
+
+def has_session(directory):
+    return os.path.exists(os.path.join(directory, SNAPSHOT_FILE))
+
+
+def load_session(directory):
+    """
+    Rebuilds an unsaved session from its snapshot and the edits logged after it
+    :param directory: the autosave directory
+    :return: the recovered NumericalData
+    """
+    snapshot_file = open(os.path.join(directory, SNAPSHOT_FILE), "r")
+    snapshot = json.load(snapshot_file)
+    snapshot_file.close()
+
+    graphs = snapshot['graphs']
+    cf, bw, lac = snapshot['center_frequency'], snapshot['bandwidth'], snapshot['loss_at_center']
+    masks = [None if layout is None else spec_mask.from_layout(graph[0], graph[1], layout, cf, bw, loss_at_center)
+             for graph, layout, loss_at_center in zip(graphs, snapshot['masks'], [lac, None, None, None])]
+    numerical_data = models.NumericalData(cf, bw, lac,
+                                          graphs[0][0:2], graphs[1][0:2], graphs[2][0:2], graphs[3][0:2],
+                                          graphs[0][2:4], graphs[1][2:4], graphs[2][2:4], graphs[3][2:4], masks)
+    log_location = os.path.join(directory, LOG_FILE)
+    if os.path.exists(log_location):
+        graph_datas = graph_list(numerical_data)
+        log_file = open(log_location, "r")
+        for line in log_file:
+            try:
+                sequence, graph_index, artist, index, x, y = json.loads(line)
+            except ValueError:  # last line cut short by the crash
+                break
+            if sequence > snapshot['sequence']:
+                edit_history.move_points(graph_datas[graph_index], artist, index, x, y)
+        log_file.close()
+    return numerical_data
+
+
+def discard_session(directory):
+    for name in [SNAPSHOT_FILE, LOG_FILE]:
+        location = os.path.join(directory, name)
+        if os.path.exists(location):
+            os.remove(location)
@@ -1,11 +1,9 @@
 from PyQt5 import QtCore
 import numpy as np
 from scipy.special import binom
-from scipy.integrate import cumtrapz
-
-
-def take_closest(num, collection):
-    return min(collection, key=lambda x: abs(x - num))
+from scipy.integrate import cumulative_trapezoid
+import network
+import touchstone
 
 
 class InputData:
@@ -32,15 +30,19 @@ class NumericalData:
     and 3 numbers associated with the central frequency, bandwidth and loss at central frequency
     """
 
+    __slots__ = ('center_frequency', 'bandwidth', 'loss_at_center', 'insertion_loss', 'group_delay',
+                 'input_return_loss', 'output_return_loss')
+
     def __init__(self, cf, bw, lac, il_plot, gd_plot, irl_plot, orl_plot, il_mes=None, gd_mes=None, irl_mes=None,
-                 orl_mes=None):
+                 orl_mes=None, masks=(None, None, None, None)):
         self.center_frequency = cf
         self.bandwidth = bw
         self.loss_at_center = lac
-        self.insertion_loss = GraphData('Insertion Loss', 'dB', il_plot, il_mes)
-        self.group_delay = GraphData('Group Delay', 'ns', gd_plot, gd_mes)
-        self.input_return_loss = GraphData('Input Return Loss', 'dB', irl_plot, irl_mes)
-        self.output_return_loss = GraphData("Output Return Loss", 'dB', orl_plot, orl_mes)
+        self.insertion_loss = GraphData('Insertion Loss', 'dB', il_plot, il_mes, mask=masks[0])
+        self.insertion_loss.passband = (cf - bw / 2, cf + bw / 2)
+        self.group_delay = GraphData('Group Delay', 'ns', gd_plot, gd_mes, mask=masks[1])
+        self.input_return_loss = GraphData('Input Return Loss', 'dB', irl_plot, irl_mes, mask=masks[2])
+        self.output_return_loss = GraphData("Output Return Loss", 'dB', orl_plot, orl_mes, mask=masks[3])
 
     def set_graph_datas(self, il, gd, irl, orl):
         self.insertion_loss = il
@@ -52,32 +54,59 @@ class NumericalData:
 class GraphData:
     """
     Wraps plotting data used in the graphs and tabs of GenerateScreen
+    The four vectors are contiguous float64 arrays which the editor modifies in place
+    The specifications are the plot vectors of a spec_mask.SpecMask, if the graph was made from input text
+    Every modification of the vectors increases the version of the specifications or of the measurements, so
+    results computed from them can tell when they are out of date
     """
 
-    def __init__(self, name, unit, specs, mes):
+    __slots__ = ('name', 'unit', 'frequencies', 'specifications', 'measurements_x', 'measurements_y',
+                 'interpolation_function', 'passband', 'mask', 'specifications_version', 'measurements_version')
+
+    def __init__(self, name, unit, specs, mes, passband=None, mask=None):
         self.name = name
         self.unit = unit
-        self.frequencies = specs[0]
-        self.specifications = specs[1]
+        self.passband = passband  # (start, stop) frequencies where the specifications are a lower limit
+        self.mask = mask
+        self.specifications_version = 0
+        self.measurements_version = 0
+        self.frequencies = as_vector(specs[0])
+        self.specifications = as_vector(specs[1])
         if mes is None:
             self.measurements_x, self.measurements_y = self.generate_measurements()
         else:
-            self.measurements_x = mes[0]
-            self.measurements_y = mes[1]
+            self.measurements_x = as_vector(mes[0])
+            self.measurements_y = as_vector(mes[1])
         self.interpolation_function = None
 
     def set_interpolation_function(self, f):
         self.interpolation_function = f
 
+    def changed(self, artist):
+        """
+        Counts a modification of the specifications ('_line0') or of the measurements ('_line1')
+        """
+        if artist == '_line0':
+            self.specifications_version += 1
+        else:
+            self.measurements_version += 1
+
+    def read_mask(self):
+        """
+        :return: the SpecMask of the specifications as edited
+        """
+        return self.mask.read_plot(self.frequencies, self.specifications)
+
     def generate_measurements(self):
         """
         Automatically generates desired measurements graph based on specifications
         """
-        x_bez, y_bez = self.build_bezier(list(zip(self.frequencies, self.specifications))).T
+        x_bez, y_bez = self.build_bezier(np.column_stack((self.frequencies, self.specifications))).T
         y_bez = self.shift_bezier_outside_specs(y_bez)
 
-        x_round = [round(num) for num in self.frequencies]
-        x_unique = list(dict.fromkeys(x_round))
+        x_round = np.round(self.frequencies)
+        _, first_indices = np.unique(x_round, return_index=True)
+        x_unique = x_round[np.sort(first_indices)]
 
         xi, yi = self.map_curve_to_frequencies([x_bez, y_bez], x_unique, offset_fraction=20, sampling_threshold=3000)
         return xi, yi
@@ -108,8 +137,7 @@ class GraphData:
         """
         Bezier will be generated inside the specification graph so it needs to be shifted higher/lower
         """
-        elevated = []
-        specifications = np.array(self.specifications)
+        specifications = self.specifications
 
         threshold = 300  # safety threshold in case the interpolation introduces curves too pointy
         spec_start = specifications[0]
@@ -122,32 +150,43 @@ class GraphData:
         if abs(distance) < 1:
             distance = default_shift if peak else -default_shift
         if distance < threshold:
-            for number in measurements:
-                number += distance + distance / 10
-                elevated.append(number)
-        return elevated
+            return measurements + (distance + distance / 10)
+        return measurements[:0]
 
     def map_curve_to_frequencies(self, plot, frequencies, offset_fraction=1000, sampling_threshold=1000000):
+        """
+        Samples the curve at most sampling_threshold apart between consecutive frequencies. The sample closing each
+        interval lands on the frequency itself, nudged outwards from the center by a fraction of the interval
+        """
         x = plot[0]
         y = plot[1]
-        xi = [x[0]]
-        yi = [y[1]]
-        for i in range(1, len(frequencies)):
-            difference = frequencies[i] - frequencies[i - 1]
-            samples = -(-difference // sampling_threshold)
-            for s in range(1, samples + 1):
-                freq = frequencies[i - 1] + s * sampling_threshold if frequencies[i - 1] + s * sampling_threshold < \
-                                                                      frequencies[i] else frequencies[i]
-                offset = 0 if frequencies[i - 1] + s * sampling_threshold < frequencies[i] \
-                    else difference / offset_fraction
-                if i < len(frequencies) / 2 - 1:
-                    offset = -offset
-                xi.append(freq + offset)
-                index = np.where(x == take_closest(freq, x))
-                yi.append(y[index[0][0]])
+        differences = np.diff(frequencies)
+        samples = np.maximum(np.ceil(differences / sampling_threshold), 0).astype(int)
+        interval = np.repeat(np.arange(1, len(frequencies)), samples)
+        step = np.arange(len(interval)) - np.repeat(np.cumsum(samples) - samples, samples) + 1
+
+        freq = frequencies[interval - 1] + step * sampling_threshold
+        closing = freq >= frequencies[interval]
+        freq[closing] = frequencies[interval[closing]]
+        offset = np.where(closing, differences[interval - 1] / offset_fraction, 0)
+        offset[interval < len(frequencies) / 2 - 1] *= -1
+
+        xi = np.empty(len(interval) + 1)
+        yi = np.empty(len(interval) + 1)
+        xi[0] = x[0]
+        yi[0] = y[1]
+        xi[1:] = freq + offset
+        yi[1:] = y[np.abs(x[np.newaxis, :] - freq[:, np.newaxis]).argmin(axis=1)]
         return xi, yi
 
 
+def as_vector(values):
+    """
+    Returns the values as a contiguous float64 array, without copying if they already are one
+    """
+    return np.ascontiguousarray(values, dtype=np.float64)
+
+
 class SparamsData:
 
     def __init__(self, numerical_data, absolute_losses, ang_s11, ang_s22, mag_s12, ang_s12, conf):
@@ -162,91 +201,111 @@ class SparamsData:
             self.mag_s12 = mag_s12
             self.ang_s12 = ang_s12
 
+    def frequency_grid(self):
+        """
+        :return: the frequencies of the touchstone file, evenly spread over all specifications
+        """
+        graphs = [self.numerical_data.insertion_loss, self.numerical_data.group_delay,
+                  self.numerical_data.input_return_loss, self.numerical_data.output_return_loss]
+        frequencies = np.unique(np.concatenate([graph.frequencies for graph in graphs]))
+        return np.linspace(frequencies[0], frequencies[-1], self.conf.number_of_lines)
+
+    def compute_columns(self):
+        """
+        Computes the touchstone columns for all frequencies at once
+        :return: array with one row per frequency: frequency, dB(S11), ang(S11), dB(S21), ang(S21), dB(S12), ang(S12),
+                 dB(S22), ang(S22)
+        """
+        frequencies = self.frequency_grid()
+        return self.evaluate_columns(frequencies, frequencies)
+
+    def evaluate_columns(self, frequencies, response_frequencies, delay_scale=1, loss_offset=0, s11_phase=0,
+                         s22_phase=0):
+        """
+        Computes the touchstone columns of one or several variants of the design in one pass
+        The responses are read from the interpolations fitted by the response canvases, see interpolation.Interpolator,
+        which hold their end values outside the measured range
+        Variant parameters are arrays of shape (..., 1), broadcast against the frequencies
+        :param frequencies: the frequencies of the touchstone file
+        :param response_frequencies: the frequencies the responses are read at, of shape (..., len(frequencies))
+        :param delay_scale: factor applied to the group delay
+        :param loss_offset: losses (dB) added to the absolute losses
+        :param s11_phase: offset (°) added to the S11 phase
+        :param s22_phase: offset (°) added to the S22 phase
+        :return: array of shape (..., len(frequencies), 9), columns as in compute_columns
+        """
+        data = self.numerical_data
+        return assemble_columns(frequencies, data.insertion_loss.interpolation_function(response_frequencies),
+                                data.group_delay.interpolation_function(response_frequencies) * delay_scale,
+                                data.input_return_loss.interpolation_function(response_frequencies),
+                                data.output_return_loss.interpolation_function(response_frequencies),
+                                self.conf.group_delay_scaling, abs(self.absolute_losses) + loss_offset,
+                                float(self.ang_s11) + s11_phase, float(self.ang_s22) + s22_phase,
+                                self.mag_s12, self.ang_s12)
+
+    def compute_network(self):
+        """
+        Computes the generated S-parameters as a network.Network that can be cascaded or de-embedded
+        """
+        return network.Network.from_columns(self.compute_columns())
+
     def compute_parameters(self):
-        frequencies = self.numerical_data.insertion_loss.frequencies + \
-                      self.numerical_data.group_delay.frequencies + \
-                      self.numerical_data.input_return_loss.frequencies + \
-                      self.numerical_data.output_return_loss.frequencies
-        frequencies.sort()
-        frequencies = list(dict.fromkeys(frequencies))
-        frequencies = list(np.linspace(frequencies[0], frequencies[-1], self.conf.getint('number_of_lines')))
-
-        irl_start_freq = self.numerical_data.input_return_loss.measurements_x[0]
-        irl_end_freq = self.numerical_data.input_return_loss.measurements_x[-1]
-        mag_s11_function = self.numerical_data.input_return_loss.interpolation_function
-
-        il_start_freq = self.numerical_data.insertion_loss.measurements_x[0]
-        il_end_freq = self.numerical_data.insertion_loss.measurements_x[-1]
-        mag_s21_function = self.numerical_data.insertion_loss.interpolation_function
-
-        gd_start_freq = self.numerical_data.group_delay.measurements_x[0]
-        gd_start_index = frequencies.index(take_closest(gd_start_freq, frequencies))
-        gd_end_freq = self.numerical_data.group_delay.measurements_x[-1]
-        gd_end_index = frequencies.index(take_closest(gd_end_freq, frequencies))
-        gd_function = self.numerical_data.group_delay.interpolation_function
-        gd_y = gd_function(frequencies[gd_start_index:gd_end_index + 1])
-        for i in range(gd_start_index):
-            np.insert(gd_y, 0, gd_function(gd_start_freq))
-        for i in range(gd_end_index + 1, len(frequencies)):
-            np.append(gd_y, gd_function(gd_end_freq))
-        phase = cumtrapz(gd_y, frequencies, initial=0)
-        phase = [elem / self.conf.getfloat('group_delay_scaling') for elem in phase]
-
-        orl_start_freq = self.numerical_data.output_return_loss.measurements_x[0]
-        orl_end_freq = self.numerical_data.output_return_loss.measurements_x[-1]
-        mag_s22_function = self.numerical_data.output_return_loss.interpolation_function
-
-        lines = []
-        for freq in frequencies:
-            index = frequencies.index(freq)
-            if freq < irl_start_freq:
-                mag_s11 = mag_s11_function(irl_start_freq)
-            elif freq > irl_end_freq:
-                mag_s11 = mag_s11_function(irl_end_freq)
-            else:
-                mag_s11 = mag_s11_function(freq)
-            if freq < il_start_freq:
-                mag_s21 = mag_s21_function(il_start_freq)
-            elif freq > il_end_freq:
-                mag_s21 = mag_s21_function(il_end_freq)
-            else:
-                mag_s21 = mag_s21_function(freq)
-            if freq < orl_start_freq:
-                mag_s22 = mag_s22_function(orl_start_freq)
-            elif freq > orl_end_freq:
-                mag_s22 = mag_s22_function(orl_end_freq)
-            else:
-                mag_s22 = mag_s22_function(freq)
-
-            line = []
-            line.append(str(np.round(freq, 2)))
-            line.append(str(np.round(mag_s11, 2)))
-            line.append(self.ang_s11)
-            line.append(str(np.round(mag_s21) - abs(self.absolute_losses)))
-            line.append(str(np.round(-phase[index], 2)))
-            if self.mag_s12 is None and self.ang_s12 is None:
-                line.append(str(np.round(mag_s21) - abs(self.absolute_losses)))
-                line.append(str(np.round(-phase[index], 2)))
-            else:
-                line.append(self.mag_s12)
-                line.append(self.ang_s12)
-            line.append(str(np.round(mag_s22, 2)))
-            line.append(self.ang_s22)
-            lines.append("\t".join(line))
-
-        return lines
+        return touchstone.format_lines(self.compute_columns())
+
+
+def assemble_columns(frequencies, insertion_loss, group_delay, input_return_loss, output_return_loss,
+                     group_delay_scaling, absolute_losses, ang_s11, ang_s22, mag_s12=None, ang_s12=None):
+    """
+    Builds the touchstone columns from the responses evaluated over the frequencies
+    Responses are arrays of shape (..., len(frequencies)), numbers are broadcast against them
+    :param absolute_losses: losses (dB) subtracted from the insertion loss
+    :param mag_s12: S12 magnitude (dB), None when S12 is the same as S21
+    :param ang_s12: S12 phase (°), None when S12 is the same as S21
+    :return: array of shape (..., len(frequencies), 9), columns as in SparamsData.compute_columns
+    """
+    phase = transmission_phase(frequencies, group_delay, group_delay_scaling)
+    return place_columns(frequencies, insertion_loss, phase, input_return_loss, output_return_loss, absolute_losses,
+                         ang_s11, ang_s22, mag_s12, ang_s12)
+
+
+def transmission_phase(frequencies, group_delay, group_delay_scaling):
+    """
+    Integrates the group delay over the frequencies into the S21 phase (°), with the opposite sign
+    """
+    return cumulative_trapezoid(group_delay, frequencies, axis=-1, initial=0) / group_delay_scaling
+
+
+def place_columns(frequencies, insertion_loss, phase, input_return_loss, output_return_loss, absolute_losses,
+                  ang_s11, ang_s22, mag_s12=None, ang_s12=None):
+    """
+    Builds the touchstone columns from the responses and the phase given by transmission_phase, see assemble_columns
+    """
+    columns = np.empty(np.shape(insertion_loss) + (9,))
+    columns[..., 0] = frequencies
+    columns[..., 1] = input_return_loss
+    columns[..., 2] = ang_s11
+    columns[..., 3] = insertion_loss - absolute_losses
+    columns[..., 4] = -phase
+    if mag_s12 is None and ang_s12 is None:
+        columns[..., 5:7] = columns[..., 3:5]
+    else:
+        columns[..., 5] = float(mag_s12)
+        columns[..., 6] = float(ang_s12)
+    columns[..., 7] = output_return_loss
+    columns[..., 8] = ang_s22
+    return columns
 
 
 class GraphDataQModel(QtCore.QAbstractTableModel):
     """
     Wraps the response graph data into a QAbstractTableModel for populating QTableView
+    The arrays are referenced, not copied; responses are rounded only when displayed
     """
 
     def __init__(self, frequencies, response, header):
         super(GraphDataQModel, self).__init__()
         # data[0] = frequencies, data[1] = response
-        response_round = [round(num, 2) for num in response]
-        self.table_data = [frequencies, response_round]
+        self.table_data = [frequencies, response]
         self.header = header  # header = ['Frequency', 'Response']
 
     def rowCount(self, parent=None, *args, **kwargs):
@@ -259,7 +318,10 @@ class GraphDataQModel(QtCore.QAbstractTableModel):
         if not index.isValid() or role != QtCore.Qt.DisplayRole:
             return QtCore.QVariant()
         else:
-            return QtCore.QVariant(str(self.table_data[index.column()][index.row()]))
+            value = float(self.table_data[index.column()][index.row()])
+            if index.column() == 1:
+                value = round(value, 2)
+            return QtCore.QVariant(str(value))
 
     def headerData(self, index, orientation, role=QtCore.Qt.DisplayRole):
         if orientation == QtCore.Qt.Horizontal and role == QtCore.Qt.DisplayRole:
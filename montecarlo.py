@@ -0,0 +1,251 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+import os
+import numpy as np
+import models
+import pipeline
+import touchstone
+
+PERTURBATIONS = ('frequency_shift', 'loss_variation', 'ripple_amplitude', 'delay_ripple_amplitude')
+# random phases of the ripple of insertion loss, group delay, input and output return loss
+RIPPLE_PHASES = ('il_ripple_phase', 'gd_ripple_phase', 'irl_ripple_phase', 'orl_ripple_phase')
+SAMPLE_FIELDS = PERTURBATIONS + RIPPLE_PHASES
+INDEX_SUFFIX = '-montecarlo-index.txt'
+STATISTICS_SUFFIX = '-montecarlo.txt'
+
+
+def draw_samples(seed, first, count, distributions):
+    """
+    Draws the perturbations of consecutive samples
+    Every sample has its own generator, spawned from the seed with the sample number, so sample i is the same
+    whatever the batch size, the number of processes or the order in which batches run.
+    :param seed: the seed of the whole run
+    :param first: number of the first sample
+    :param count: number of samples
+    :param distributions: dictionary of (name, a, b) tuples for each of PERTURBATIONS
+        - ('fixed', value, 0)
+        - ('normal', mean, standard deviation)
+        - ('uniform', low, high)
+    :return: record array with one sample per element and one field per SAMPLE_FIELDS
+    """
+    values = np.empty((count, len(SAMPLE_FIELDS)))
+    for row, number in enumerate(range(first, first + count)):
+        generator = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(number,)))
+        for column, perturbation in enumerate(PERTURBATIONS):
+            name, a, b = distributions[perturbation]
+            if name == 'normal':
+                values[row, column] = generator.normal(a, b)
+            elif name == 'uniform':
+                values[row, column] = generator.uniform(a, b)
+            else:
+                values[row, column] = a
+        values[row, len(PERTURBATIONS):] = generator.uniform(0, 2 * np.pi, len(RIPPLE_PHASES))
+    return np.rec.fromarrays(values.T, names=SAMPLE_FIELDS)
+
+
+def compute_batch(design, samples):
+    """
+    Computes the touchstone columns of a batch of samples, interpolating and integrating all of them at once
+    Sample s reads the measurement traces at f - frequency_shift[s], adds a sinusoidal ripple of period
+    design['ripple_period'] to each trace and loss_variation[s] to the absolute losses.
+    :param design: dictionary describing the tuned design with plain arrays, numbers and the interpolations of its
+                   measurements, see make_design
+    :param samples: record array from draw_samples
+    :return: array of shape (samples, frequencies, 9)
+    """
+    frequencies = design['frequencies']
+    response_frequencies = frequencies - samples.frequency_shift[:, np.newaxis]
+    ripple_angle = 2 * np.pi * frequencies / design['ripple_period']
+    responses = []
+    for function, amplitude, phase in zip(design['interpolations'],
+                                          [samples.ripple_amplitude, samples.delay_ripple_amplitude,
+                                           samples.ripple_amplitude, samples.ripple_amplitude],
+                                          [samples[name] for name in RIPPLE_PHASES]):
+        ripple = amplitude[:, np.newaxis] * np.sin(ripple_angle + phase[:, np.newaxis])
+        responses.append(function(response_frequencies) + ripple)
+    return models.assemble_columns(frequencies, *responses, design['group_delay_scaling'],
+                                   design['absolute_losses'] + samples.loss_variation[:, np.newaxis],
+                                   design['ang_s11'], design['ang_s22'], design['mag_s12'], design['ang_s12'])
+
+
+def make_design(sparams_data, ripple_period):
+    """
+    Extracts what compute_batch needs from a SparamsData, so it can be sent to other processes
+    The interpolations fitted by the response canvases are sent along, so the workers never fit them again.
+    """
+    numerical_data = sparams_data.numerical_data
+    graphs = [numerical_data.insertion_loss, numerical_data.group_delay, numerical_data.input_return_loss,
+              numerical_data.output_return_loss]
+    return {'frequencies': sparams_data.frequency_grid(),
+            'interpolations': [graph.interpolation_function for graph in graphs],
+            'ripple_period': ripple_period,
+            'group_delay_scaling': sparams_data.conf.group_delay_scaling,
+            'absolute_losses': abs(sparams_data.absolute_losses),
+            'ang_s11': float(sparams_data.ang_s11),
+            'ang_s22': float(sparams_data.ang_s22),
+            'mag_s12': sparams_data.mag_s12,
+            'ang_s12': sparams_data.ang_s12,
+            'passivity': sparams_data.conf.passivity}
+
+
+def run_batch(design, distributions, seed, first, count, output, bounds):
+    """
+    Computes a batch of samples, writes them to disk and summarizes their |S21|
+    Meant to run in a worker process: only the summary is sent back, the samples never leave the process.
+    The passivity of the samples is checked or enforced as for the design, before they are written and summarized.
+    :param output: (path, filter_name, writer) the samples are written to with a TouchstoneWriter, or None
+    :param bounds: (low, high, bins) of the |S21| histogram, None to send back the |S21| values instead
+    :return: (samples, summary) where summary is a BatchSummary
+    """
+    samples = draw_samples(seed, first, count, distributions)
+    columns, reports = pipeline.check_variants(compute_batch(design, samples), design['passivity'])
+    if output is not None:
+        path, filter_name, writer = output
+        for number, sample, sample_columns, report in zip(range(first, first + count), samples, columns, reports):
+            comments = ["Monte-Carlo sample " + str(number) + ": " + describe_sample(sample)]
+            if report is not None:
+                comments.append(report.describe())
+            writer.write(sample_location(path, filter_name, number), filter_name, sample_columns, comments)
+    s21 = columns[:, :, 3]
+    if bounds is None:
+        return samples, s21
+    return samples, BatchSummary(s21, *bounds)
+
+
+def sample_location(path, filter_name, number):
+    return os.path.join(path, filter_name + "-montecarlo-" + str(number).zfill(6) + ".s2p")
+
+
+def describe_sample(sample):
+    return ", ".join(name + " = " + str(round(float(sample[name]), 6)) for name in PERTURBATIONS)
+
+
+class BatchSummary:
+    """
+    Statistics of |S21| (dB) over a group of samples, for every frequency, that can be merged without the samples
+        - count, mean and sum of squared deviations (merged with the parallel variance formula)
+        - minimum and maximum
+        - histogram with `bins` bins between low and high of each frequency, plus one bin below and one above
+    """
+
+    def __init__(self, s21, low, high, bins):
+        self.count = len(s21)
+        self.mean = s21.mean(axis=0)
+        self.squares = ((s21 - self.mean) ** 2).sum(axis=0)
+        self.minimum = s21.min(axis=0)
+        self.maximum = s21.max(axis=0)
+        self.low = low
+        self.high = high
+        self.bins = bins
+        positions = np.floor((s21 - low) / (high - low) * bins)
+        indices = np.clip(positions, -1, bins).astype(int) + 1
+        indices += np.arange(s21.shape[1]) * (bins + 2)
+        self.histogram = np.bincount(indices.ravel(), minlength=s21.shape[1] * (bins + 2)).reshape(-1, bins + 2)
+
+    def merge(self, other):
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / count
+        self.squares = self.squares + other.squares + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.minimum = np.minimum(self.minimum, other.minimum)
+        self.maximum = np.maximum(self.maximum, other.maximum)
+        self.histogram += other.histogram
+
+    def deviation(self):
+        return np.sqrt(self.squares / max(self.count - 1, 1))
+
+    def percentile(self, q):
+        """
+        Estimates a percentile of every frequency from the histogram, interpolating linearly inside the bins
+        :param q: percentile between 0 and 100
+        """
+        cumulative = np.cumsum(self.histogram, axis=1)
+        target = q / 100 * self.count
+        bin_index = np.argmax(cumulative >= max(target, 1e-9), axis=1)
+        rows = np.arange(len(cumulative))
+        before = np.where(bin_index > 0, cumulative[rows, np.maximum(bin_index - 1, 0)], 0)
+        fraction = (target - before) / np.maximum(self.histogram[rows, bin_index], 1)
+        width = (self.high - self.low) / self.bins
+        value = self.low + (bin_index - 1 + fraction) * width
+        # samples outside the histogram are only known by their extremes
+        value = np.where(bin_index == 0, self.minimum, value)
+        value = np.where(bin_index == self.bins + 1, self.maximum, value)
+        return np.clip(value, self.minimum, self.maximum)
+
+
+def run(sparams_data, samples, seed, distributions, ripple_period, output=None, batch_size=64, bins=200,
+        executor=None):
+    """
+    Generates Monte-Carlo samples of a tuned design and summarizes their |S21|
+    The first batch runs in this process and sets the histogram bounds of each frequency, the other batches run
+    on the executor and are merged as they complete, so only one summary is ever kept in memory.
+    :param sparams_data: the tuned SparamsData
+    :param samples: number of samples
+    :param seed: seed making the run reproducible
+    :param distributions: distribution of each perturbation, see draw_samples
+    :param ripple_period: period (Mhz) of the ripple added to the traces
+    :param output: (path, filter_name, writer) the samples are written to with a TouchstoneWriter, None to only
+                   summarize
+    :param batch_size: number of samples computed at once
+    :param bins: number of histogram bins of each frequency
+    :param executor: the concurrent.futures executor to use. Defaults to a pool of spawned processes
+    :return: (frequencies, summary, samples) with the BatchSummary and the record array of all drawn samples
+    """
+    if samples < 1:
+        raise ValueError("The number of Monte-Carlo samples must be at least 1")
+    if ripple_period <= 0:
+        raise ValueError("The ripple period must be positive")
+    design = make_design(sparams_data, ripple_period)
+    first_count = min(batch_size, samples)
+    first_samples, s21 = run_batch(design, distributions, seed, 0, first_count, output, None)
+    span = np.maximum(s21.max(axis=0) - s21.min(axis=0), 0.1)
+    bounds = (s21.min(axis=0) - span, s21.max(axis=0) + span, bins)
+    summary = BatchSummary(s21, *bounds)
+    drawn = {0: first_samples}
+
+    own_executor = executor is None and samples > first_count
+    if own_executor:
+        # started fresh rather than forked: the GUI process runs Qt and background threads which a fork would copy
+        # in whatever state they are, possibly holding locks
+        executor = ProcessPoolExecutor(mp_context=multiprocessing.get_context('spawn'))
+    futures = {executor.submit(run_batch, design, distributions, seed, first, min(batch_size, samples - first),
+                               output, bounds): first
+               for first in range(first_count, samples, batch_size)}
+    for future in as_completed(futures):
+        batch_samples, batch_summary = future.result()
+        summary.merge(batch_summary)
+        drawn[futures[future]] = batch_samples
+    if own_executor:
+        executor.shutdown()
+
+    return design['frequencies'], summary, np.concatenate([drawn[first] for first in sorted(drawn)]).view(np.recarray)
+
+
+def save_montecarlo(sparams_data, path, filter_name, samples, seed, distributions, ripple_period,
+                    percentiles=(5, 50, 95), batch_size=64, executor=None, writer=None):
+    """
+    Writes Monte-Carlo samples of a tuned design as touchstone files, with an index of the drawn perturbations
+    and a <filter_name>-montecarlo.txt file with the mean, deviation and percentiles of |S21| (dB) per frequency
+    :param writer: the TouchstoneWriter of the samples. Defaults to the original format
+    :return: the BatchSummary
+    """
+    if writer is None:
+        writer = touchstone.TouchstoneWriter()
+    frequencies, summary, drawn = run(sparams_data, samples, seed, distributions, ripple_period,
+                                      (path, filter_name, writer), batch_size, executor=executor)
+
+    index_file = open(os.path.join(path, filter_name + INDEX_SUFFIX), "w")
+    index_file.write("! Seed: " + str(seed) + "\n")
+    index_file.write("Sample " + " ".join(SAMPLE_FIELDS) + "\n")
+    for number, sample in enumerate(drawn):
+        index_file.write(str(number) + " " + " ".join(str(value) for value in sample.tolist()) + "\n")
+    index_file.close()
+
+    statistics = [frequencies, summary.mean, summary.deviation()] + [summary.percentile(q) for q in percentiles]
+    statistics_file = open(os.path.join(path, filter_name + STATISTICS_SUFFIX), "w")
+    statistics_file.write("! " + str(summary.count) + " samples, |S21| in dB\n")
+    statistics_file.write("! Frequency mean deviation " + " ".join("P" + str(q) for q in percentiles) + "\n")
+    statistics_file.write("\n".join(touchstone.format_lines(np.column_stack(statistics))))
+    statistics_file.close()
+    return summary
@@ -0,0 +1,220 @@
+import numpy as np
+
+MODEL_IMPEDANCE = 50.0  # Ohm, reference impedance of both ports of the generated S-parameters
+
+
+class Network:
+    """
+    Wraps the S-parameters of a two-port over a frequency grid
+        - frequencies in Mhz, shape (N,)
+        - s as complex matrices, shape (N, 2, 2), s[:, 1, 0] being S21
+    """
+
+    def __init__(self, frequencies, s, name=""):
+        self.frequencies = np.asarray(frequencies, dtype=float)
+        self.s = np.asarray(s, dtype=complex)
+        self.name = name
+        if self.s.shape != (len(self.frequencies), 2, 2):
+            raise ValueError("Expected S-parameters of shape (" + str(len(self.frequencies)) + ", 2, 2), got "
+                             + str(self.s.shape))
+
+    @classmethod
+    def from_columns(cls, columns, name=""):
+        """
+        Builds a network from touchstone columns (frequency, then dB and degrees for S11, S21, S12, S22)
+        """
+        columns = np.asarray(columns, dtype=float)
+        s = np.empty((len(columns), 2, 2), dtype=complex)
+        s[:, 0, 0] = db_deg_to_complex(columns[:, 1], columns[:, 2])
+        s[:, 1, 0] = db_deg_to_complex(columns[:, 3], columns[:, 4])
+        s[:, 0, 1] = db_deg_to_complex(columns[:, 5], columns[:, 6])
+        s[:, 1, 1] = db_deg_to_complex(columns[:, 7], columns[:, 8])
+        return cls(columns[:, 0], s, name)
+
+    def to_columns(self):
+        """
+        Returns the touchstone columns (frequency, then dB and degrees for S11, S21, S12, S22) of the network
+        """
+        columns = np.empty((len(self.frequencies), 9))
+        columns[:, 0] = self.frequencies
+        for position, (row, column) in enumerate([(0, 0), (1, 0), (0, 1), (1, 1)]):
+            columns[:, 2 * position + 1], columns[:, 2 * position + 2] = complex_to_db_deg(self.s[:, row, column])
+        return columns
+
+    def interpolate(self, frequencies):
+        """
+        Resamples the network on another frequency grid, interpolating magnitude and unwrapped phase
+        :param frequencies: the new frequency grid, which must lie inside the grid of the network
+        :return: a new Network
+        """
+        frequencies = np.asarray(frequencies, dtype=float)
+        if np.array_equal(frequencies, self.frequencies):
+            return self
+        if frequencies[0] < self.frequencies[0] or frequencies[-1] > self.frequencies[-1]:
+            raise ValueError("Network " + self.name + " covers " + str(self.frequencies[0]) + " - "
+                             + str(self.frequencies[-1]) + " Mhz, cannot interpolate to " + str(frequencies[0])
+                             + " - " + str(frequencies[-1]) + " Mhz")
+        flat = self.s.reshape(len(self.frequencies), 4)
+        magnitude = np.abs(flat)
+        phase = np.unwrap(np.angle(flat), axis=0)
+        s = np.empty((len(frequencies), 4), dtype=complex)
+        for parameter in range(4):
+            s[:, parameter] = np.interp(frequencies, self.frequencies, magnitude[:, parameter]) * \
+                              np.exp(1j * np.interp(frequencies, self.frequencies, phase[:, parameter]))
+        return Network(frequencies, s.reshape(-1, 2, 2), self.name)
+
+
+def db_deg_to_complex(db, deg):
+    return 10 ** (np.asarray(db) / 20) * np.exp(1j * np.deg2rad(deg))
+
+
+def complex_to_db_deg(values):
+    with np.errstate(divide='ignore'):
+        return 20 * np.log10(np.abs(values)), np.rad2deg(np.angle(values))
+
+
+def s_to_t(s):
+    """
+    Converts S-parameters of shape (N, 2, 2) to transfer parameters, defined by [b1, a1] = T [a2, b2]
+    """
+    s11, s12, s21, s22 = s[:, 0, 0], s[:, 0, 1], s[:, 1, 0], s[:, 1, 1]
+    t = np.empty_like(s)
+    t[:, 0, 0] = -(s11 * s22 - s12 * s21) / s21
+    t[:, 0, 1] = s11 / s21
+    t[:, 1, 0] = -s22 / s21
+    t[:, 1, 1] = 1 / s21
+    return t
+
+
+def t_to_s(t):
+    """
+    Converts transfer parameters of shape (N, 2, 2) back to S-parameters
+    """
+    t11, t12, t21, t22 = t[:, 0, 0], t[:, 0, 1], t[:, 1, 0], t[:, 1, 1]
+    s = np.empty_like(t)
+    s[:, 0, 0] = t12 / t22
+    s[:, 0, 1] = (t11 * t22 - t12 * t21) / t22
+    s[:, 1, 0] = 1 / t22
+    s[:, 1, 1] = -t21 / t22
+    return s
+
+
+def inverse_2x2(matrices):
+    """
+    Inverts a stack of 2x2 matrices in closed form
+    """
+    a, b, c, d = matrices[:, 0, 0], matrices[:, 0, 1], matrices[:, 1, 0], matrices[:, 1, 1]
+    determinant = a * d - b * c
+    inverse = np.empty_like(matrices)
+    inverse[:, 0, 0] = d / determinant
+    inverse[:, 0, 1] = -b / determinant
+    inverse[:, 1, 0] = -c / determinant
+    inverse[:, 1, 1] = a / determinant
+    return inverse
+
+
+def port_impedances(impedances):
+    """
+    :param impedances: reference impedance (Ohm) of both ports, or one per port (in the last dimension, so they can
+                       also be given per frequency), possibly complex
+    :return: complex array of shape (..., 2)
+    :raises ValueError: for impedances without a positive real part
+    """
+    impedances = np.asarray(impedances, dtype=complex)
+    if impedances.ndim == 0:
+        impedances = np.full(2, impedances)
+    if impedances.shape[-1] != 2:
+        raise ValueError("Expected one reference impedance per port, got " + str(impedances.shape[-1]))
+    if np.any(impedances.real <= 0):
+        raise ValueError("Reference impedances need a positive real part")
+    return impedances
+
+
+def renormalize(s, impedances, new_impedances):
+    """
+    Converts S-parameters of shape (N, 2, 2) to other reference impedances, all frequencies at once
+    Writing the voltages and currents of the ports (Z = F^-1 (I - S)^-1 (S G + G*) F for the power waves of the
+    references z, with G = diag(z) and F = diag(1 / (2 sqrt(Re z)))) with the new references z' gives
+        S' = P* (S - R*) (I - R S)^-1 P^-1
+    with R = diag((z' - z) / (z' + z*)) and P = diag(sqrt(Re z / Re z') (z' + z*) / (2 Re z)). Unlike the impedance
+    or admittance matrix, I - R S can always be inverted for passive S-parameters, also for open or shorted ports.
+    With complex references the S-parameters are defined by power waves.
+    :param impedances: reference impedances of s, see port_impedances
+    :param new_impedances: the target reference impedances
+    :return: the renormalized S-parameters
+    """
+    impedances = port_impedances(impedances)
+    new_impedances = port_impedances(new_impedances)
+    if np.array_equal(impedances, new_impedances):
+        return s
+    reflection = (new_impedances - impedances) / (new_impedances + np.conj(impedances))
+    scale = np.sqrt(impedances.real / new_impedances.real) * (new_impedances + np.conj(impedances)) / \
+        (2 * impedances.real)
+    factor = np.conj(scale)[..., :, None] / scale[..., None, :]
+    r1, r2 = reflection[..., 0], reflection[..., 1]
+    s11, s12, s21, s22 = s[:, 0, 0], s[:, 0, 1], s[:, 1, 0], s[:, 1, 1]
+    # (S - R*) times the closed form inverse of I - R S, element by element: numpy multiplies stacks of 2x2
+    # matrices much slower than it multiplies vectors
+    d11, d22 = 1 - r1 * s11, 1 - r2 * s22
+    r1s12, r2s21 = r1 * s12, r2 * s21
+    inverse = 1 / (d11 * d22 - r1s12 * r2s21)
+    m11, m22 = s11 - np.conj(r1), s22 - np.conj(r2)
+    renormalized = np.empty(s.shape, dtype=complex)
+    renormalized[:, 0, 0] = (m11 * d22 + s12 * r2s21) * (inverse * factor[..., 0, 0])
+    renormalized[:, 0, 1] = (s12 * d11 + m11 * r1s12) * (inverse * factor[..., 0, 1])
+    renormalized[:, 1, 0] = (s21 * d22 + m22 * r2s21) * (inverse * factor[..., 1, 0])
+    renormalized[:, 1, 1] = (m22 * d11 + s21 * r1s12) * (inverse * factor[..., 1, 1])
+    return renormalized
+
+
+def common_frequencies(networks, frequencies=None):
+    """
+    Picks the grid the networks are combined on: the given one, or else the first network's grid
+    restricted to the band covered by every network
+    """
+    if frequencies is not None:
+        return np.asarray(frequencies, dtype=float)
+    start = max(net.frequencies[0] for net in networks)
+    stop = min(net.frequencies[-1] for net in networks)
+    if start > stop:
+        raise ValueError("Networks do not share a common frequency band")
+    grid = networks[0].frequencies
+    return grid[(grid >= start) & (grid <= stop)]
+
+
+def cascade(*networks, frequencies=None):
+    """
+    Connects any number of two-ports in series (port 2 of each one to port 1 of the next)
+    :param networks: Network objects, from input to output
+    :param frequencies: the frequency grid of the result. Defaults to the grid of the first network, limited to the
+                        band covered by all of them
+    :return: the cascaded Network
+    """
+    if not networks:
+        raise ValueError("Nothing to cascade")
+    grid = common_frequencies(networks, frequencies)
+    t = s_to_t(networks[0].interpolate(grid).s)
+    for net in networks[1:]:
+        t = t @ s_to_t(net.interpolate(grid).s)
+    return Network(grid, t_to_s(t), " + ".join(net.name for net in networks))
+
+
+def deembed(total, left=(), right=(), frequencies=None):
+    """
+    Removes fixtures from both sides of a measured or generated cascade
+    :param total: the Network containing the fixtures
+    :param left: Networks connected before the device, from input to device
+    :param right: Networks connected after the device, from device to output
+    :param frequencies: the frequency grid of the result. Defaults to the grid of total, limited to the band covered
+                        by all networks
+    :return: the de-embedded Network
+    """
+    left = list(left)
+    right = list(right)
+    grid = common_frequencies([total] + left + right, frequencies)
+    t = s_to_t(total.interpolate(grid).s)
+    for net in left:
+        t = inverse_2x2(s_to_t(net.interpolate(grid).s)) @ t
+    for net in reversed(right):
+        t = t @ inverse_2x2(s_to_t(net.interpolate(grid).s))
+    return Network(grid, t_to_s(t), total.name)
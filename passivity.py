@@ -0,0 +1,91 @@
+import numpy as np
+import network
+
+DB_COLUMNS = [1, 3, 5, 7]  # dB(S11), dB(S21), dB(S12), dB(S22) in touchstone columns
+
+
+class PassivityReport:
+    """
+    Result of a passivity and reciprocity check over all frequencies
+        - singular values: largest singular value of the S-matrix at every frequency, above 1 means not passive
+        - violations: boolean array telling which frequencies are not passive
+        - reciprocity errors: |S21 - S12| at every frequency
+    """
+
+    def __init__(self, frequencies, singular_values, reciprocity_errors, tolerance):
+        self.frequencies = frequencies
+        self.singular_values = singular_values
+        self.reciprocity_errors = reciprocity_errors
+        self.violations = singular_values > 1 + tolerance
+        self.tolerance = tolerance
+
+    def is_passive(self):
+        return not np.any(self.violations)
+
+    def is_reciprocal(self):
+        return np.all(self.reciprocity_errors <= self.tolerance)
+
+    def describe(self):
+        """
+        :return: one line summary of the check
+        """
+        worst = int(np.argmax(self.singular_values))
+        if self.is_passive():
+            text = "Passive"
+        else:
+            text = "Not passive at " + str(np.count_nonzero(self.violations)) + " frequencies, worst |S| = " + \
+                   str(round(float(self.singular_values[worst]), 4)) + " at " + \
+                   str(round(float(self.frequencies[worst]), 2)) + " Mhz"
+        if self.is_reciprocal():
+            return text + ", reciprocal"
+        return text + ", not reciprocal (max |S21 - S12| = " + str(round(float(self.reciprocity_errors.max()), 4)) + ")"
+
+
+def singular_values(s):
+    """
+    Largest singular values of a stack of 2x2 matrices, from the closed form eigenvalues of S^H S
+    Gives the same result as numpy.linalg.svd(s, compute_uv=False)[:, 0] many times faster, as it only uses
+    elementwise operations over all frequencies.
+    :param s: complex array of shape (N, 2, 2)
+    :return: array of shape (N,)
+    """
+    first = np.abs(s[:, 0, 0]) ** 2 + np.abs(s[:, 1, 0]) ** 2
+    second = np.abs(s[:, 0, 1]) ** 2 + np.abs(s[:, 1, 1]) ** 2
+    cross = np.conj(s[:, 0, 0]) * s[:, 0, 1] + np.conj(s[:, 1, 0]) * s[:, 1, 1]
+    eigenvalue = (first + second) / 2 + np.sqrt(((first - second) / 2) ** 2 + np.abs(cross) ** 2)
+    return np.sqrt(eigenvalue)
+
+
+def check(frequencies, s, tolerance=1e-6):
+    """
+    Checks the passivity and reciprocity of a two-port at all frequencies at once
+    :param frequencies: frequencies (Mhz), shape (N,)
+    :param s: complex S-parameters, shape (N, 2, 2)
+    :param tolerance: allowed excess of the singular values over 1, and allowed |S21 - S12|
+    :return: PassivityReport
+    """
+    return PassivityReport(frequencies, singular_values(s), np.abs(s[:, 1, 0] - s[:, 0, 1]), tolerance)
+
+
+def check_columns(columns, tolerance=1e-6):
+    """
+    Checks touchstone columns (frequency, then dB and degrees for S11, S21, S12, S22)
+    """
+    return check(columns[:, 0], network.Network.from_columns(columns).s, tolerance)
+
+
+def enforce_columns(columns, report, margin=1e-4):
+    """
+    Makes touchstone columns passive by scaling the whole S-matrix of every violating frequency down to a largest
+    singular value of 1 - margin. This is the smallest scaling that keeps the ratios between the parameters, so
+    phases and reciprocity are unchanged and passive frequencies are left untouched.
+    :param columns: touchstone columns, see check_columns
+    :param report: the PassivityReport of the columns
+    :param margin: distance kept below the passivity limit
+    :return: new columns
+    """
+    columns = columns.copy()
+    violations = report.violations
+    scaling = 20 * np.log10((1 - margin) / report.singular_values[violations])
+    columns[np.ix_(violations, DB_COLUMNS)] += scaling[:, np.newaxis]
+    return columns
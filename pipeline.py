@@ -0,0 +1,108 @@
+import numpy as np
+import data_parser
+import interpolation
+import models
+import passivity
+import touchstone
+
+SPECIFICATION_FIELDS = ('center_frequency', 'bandwidth', 'loss_at_center', 'insertion_loss_inband',
+                        'insertion_loss_outofband', 'group_delay_inband', 'group_delay_outofband', 'input_return_loss',
+                        'output_return_loss')
+OUTPUT_FIELDS = (('absolute_losses', 0), ('ang_s11', 0), ('ang_s22', 0), ('mag_s12', ""), ('ang_s12', ""))
+
+
+def interpolate_graph(graph_data, kind='quadratic'):
+    """
+    Gives a graph the interpolation function of its measurements, as the response canvases do when they draw them
+    :param kind: one of interpolation.KINDS
+    """
+    graph_data.set_interpolation_function(interpolation.Interpolator(graph_data.measurements_x,
+                                                                     graph_data.measurements_y, kind))
+
+
+def prepare(numerical_data, kinds=None):
+    """
+    Interpolates the measurements of the four responses, so the S-parameters can be computed without any canvas
+    :param kinds: interpolation of each response, quadratic for all by default
+    :return: the numerical data
+    """
+    kinds = ['quadratic'] * 4 if kinds is None else kinds
+    for graph_data, kind in zip([numerical_data.insertion_loss, numerical_data.group_delay,
+                                 numerical_data.input_return_loss, numerical_data.output_return_loss], kinds):
+        interpolate_graph(graph_data, kind)
+    return numerical_data
+
+
+def interpolation_kinds(conf):
+    """
+    :param conf: the Configuration
+    :return: the interpolation of each response, as the response canvases draw them
+    """
+    return [getattr(conf, response).interpolation for response in conf.responses]
+
+
+def make_numerical_data(specification, measurement_text=(), synthesis_conf=None, kinds=None):
+    """
+    Parses the texts of the input screen into NumericalData ready for generation
+    :param specification: dictionary with the SPECIFICATION_FIELDS, formatted as in the input screen
+    :param measurement_text: lines of a measurements (-real.txt) file, empty to generate the measurements
+    :param synthesis_conf: the SynthesisConfiguration, see data_parser.make_plot_data
+    :param kinds: interpolation of each response, see prepare
+    :raises ValueError: if a field is missing or badly formatted
+    """
+    missing = [field for field in SPECIFICATION_FIELDS if field not in specification]
+    if missing:
+        raise ValueError("Missing " + ", ".join(missing))
+    input_data = models.InputData(*[str(specification[field]) for field in SPECIFICATION_FIELDS])
+    return prepare(data_parser.make_plot_data(input_data, list(measurement_text), synthesis_conf), kinds)
+
+
+def make_sparams_data(numerical_data, conf, outputs=None):
+    """
+    :param conf: the TouchstoneConfiguration
+    :param outputs: dictionary with the OUTPUT_FIELDS of the save screen, missing ones take their default
+    """
+    outputs = {} if outputs is None else outputs
+    values = [str(outputs.get(field, default)) for field, default in OUTPUT_FIELDS]
+    return models.SparamsData(numerical_data, *values, conf)
+
+
+def compute_columns(sparams_data, passivity_mode='check'):
+    """
+    Computes the touchstone columns of a design, checking or enforcing their passivity as the save screen does
+    :param passivity_mode: 'off', 'check' or 'enforce'
+    :return: (columns, PassivityReport or None)
+    """
+    return check_columns(sparams_data.compute_columns(), passivity_mode)
+
+
+def check_columns(columns, passivity_mode='check'):
+    """
+    Checks or enforces the passivity of touchstone columns, see compute_columns
+    :return: (columns, PassivityReport or None)
+    """
+    if passivity_mode == 'off':
+        return columns, None
+    report = passivity.check_columns(columns)
+    if passivity_mode == 'enforce' and not report.is_passive():
+        columns = passivity.enforce_columns(columns, report)
+    return columns, report
+
+
+def check_variants(columns, passivity_mode='check'):
+    """
+    Checks or enforces the passivity of every variant of a design, see check_columns
+    :param columns: array of shape (variants, frequencies, 9)
+    :return: (columns, list of the PassivityReport or None of each variant)
+    """
+    checked = [check_columns(variant_columns, passivity_mode) for variant_columns in columns]
+    return np.array([variant_columns for variant_columns, _ in checked]), [report for _, report in checked]
+
+
+def make_writer(conf):
+    """
+    :param conf: the TouchstoneConfiguration
+    :return: the TouchstoneWriter of the configured format
+    """
+    return touchstone.TouchstoneWriter(conf.data_format, conf.frequency_unit, conf.version, conf.reference_impedance,
+                                       conf.compress, conf.chunk_size)
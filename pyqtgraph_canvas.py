@@ -0,0 +1,169 @@
+from PyQt5 import QtCore, QtWidgets
+from PyQt5.QtCore import pyqtSignal
+import numpy as np
+import pyqtgraph
+from response_editor import ResponseEditor
+
+MARKER_SIZE = 8  # pixels
+DRAG_DISTANCE = 5  # pixels the mouse moves before a press becomes a rectangle selection
+KEYS = {QtCore.Qt.Key_Up: 'up', QtCore.Qt.Key_Down: 'down', QtCore.Qt.Key_Left: 'left',
+        QtCore.Qt.Key_Right: 'right', QtCore.Qt.Key_A: 'a', QtCore.Qt.Key_D: 'd', QtCore.Qt.Key_W: 'w', QtCore.Qt.Key_S: 's',
+        QtCore.Qt.Key_Space: ' '}
+
+
+class PyqtgraphResponseCanvas(pyqtgraph.PlotWidget, ResponseEditor):
+    """
+    Class responsible for rendering GraphData on a pyqtgraph scene and handling interaction, see ResponseEditor
+    The items of the scene are created once and only get new data on every change, so an edit repaints the
+    changed items instead of rasterizing the whole figure again.
+    """
+
+    graph_changed = pyqtSignal(object)
+    active_tab = pyqtSignal(str)
+
+    def __init__(self, graph_data, conf, history=None):
+        super(PyqtgraphResponseCanvas, self).__init__(background='w')
+        plot_item = self.getPlotItem()
+        plot_item.setLabel('bottom', 'Frequency(Mhz)')
+        plot_item.setLabel('left', 'Response(' + graph_data.unit + ')')
+        plot_item.setMenuEnabled(False)
+        plot_item.hideButtons()
+        plot_item.setMouseEnabled(x=False, y=False)
+        plot_item.disableAutoRange()
+
+        self.specs = plot_item.plot(pen=pyqtgraph.mkPen('b'), symbol='o', symbolSize=MARKER_SIZE, symbolPen='b',
+                                    symbolBrush='b')
+        self.mes_curve = plot_item.plot(pen=pyqtgraph.mkPen('r'))
+        self.mes_data = plot_item.plot(pen=None, symbol='o', symbolSize=MARKER_SIZE, symbolPen='r', symbolBrush='r')
+        self.selected = plot_item.plot(pen=None, symbol='o', symbolSize=MARKER_SIZE + 6,
+                                       symbolPen=pyqtgraph.mkPen('g', width=2), symbolBrush=None)
+        self.violation_values = pyqtgraph.PlotCurveItem(pen=None)
+        self.violation_limits = pyqtgraph.PlotCurveItem(pen=None)
+        self.violations = pyqtgraph.FillBetweenItem(self.violation_values, self.violation_limits,
+                                                    brush=pyqtgraph.mkBrush(255, 165, 0, 128))
+        self.violations.setZValue(-1)
+        plot_item.addItem(self.violations)
+        self.picked_label = pyqtgraph.TextItem(color='w', fill=pyqtgraph.mkBrush('gray'), anchor=(0, 1))
+        self.picked_label.hide()
+        plot_item.addItem(self.picked_label)
+        self.rubber_band = QtWidgets.QRubberBand(QtWidgets.QRubberBand.Rectangle, self.viewport())
+        self.drag_origin = None
+        self.drag_modifiers = QtCore.Qt.NoModifier
+
+        self.setup_editor(graph_data, conf, history)
+        self.set_view(self.axis_limits[0:2], self.axis_limits[2:4])
+        plot_item.getViewBox().sigXRangeChanged.connect(lambda view_box, x_range: self.draw_curve())
+        plot_item.getViewBox().sigResized.connect(lambda view_box: self.draw_curve())
+
+    def draw_specifications(self):
+        self.specs.setData(self.graph_data.frequencies, self.graph_data.specifications)
+
+    def draw_measurements(self):
+        self.interpolate_measurements()
+        self.mes_data.setData(self.graph_data.measurements_x, self.graph_data.measurements_y)
+        self.draw_curve()
+
+    def draw_curve(self):
+        view_box = self.getPlotItem().getViewBox()
+        self.mes_curve.setData(*self.sample_curve(view_box.width() * self.devicePixelRatioF()))
+
+    def draw_violations(self):
+        checker = self.compliance
+        # outside the violations both curves are the same, so nothing is filled
+        self.violation_values.setData(checker.grid, checker.values)
+        self.violation_limits.setData(checker.grid, np.where(checker.violations(), checker.limits, checker.values))
+        worst = checker.worst_margin()
+        self.getPlotItem().setTitle('Worst margin: ' + str(round(worst, 2)) + ' ' + self.graph_data.unit,
+                                    color='r' if worst < 0 else 'g')
+
+    def draw_selection(self):
+        self.selected.setData(*self.selected_points())
+
+    def draw_label(self, frequency, response):
+        label_posx, label_posy = self.label_position(frequency, response)
+        self.picked_label.setText(self.label_text(frequency, response))
+        self.picked_label.setPos(label_posx, label_posy)
+        self.picked_label.show()
+
+    def remove_label(self):
+        self.picked_label.hide()
+
+    def get_view(self):
+        xlim, ylim = self.getPlotItem().getViewBox().viewRange()
+        return tuple(xlim), tuple(ylim)
+
+    def set_view(self, xlim, ylim):
+        self.getPlotItem().getViewBox().setRange(xRange=xlim, yRange=ylim, padding=0)
+
+    def redraw(self):
+        # the scene repaints the items whose data changed by itself
+        pass
+
+    def pick(self, position):
+        """
+        Finds the point under the mouse, measurements first as they are drawn on top
+        :param position: position of the mouse in the scene
+        :return: (artist, index) of the closest point within the picking tolerance, or None
+        """
+        view_box = self.getPlotItem().getViewBox()
+        (x_start, x_stop), (y_start, y_stop) = view_box.viewRange()
+        rectangle = view_box.sceneBoundingRect()
+        mouse = view_box.mapSceneToView(position)
+        x_scale = rectangle.width() / (x_stop - x_start)
+        y_scale = rectangle.height() / (y_stop - y_start)
+        candidates = [('_line1', self.graph_data.measurements_x, self.graph_data.measurements_y, 2),
+                      ('_line0', self.graph_data.frequencies, self.graph_data.specifications,
+                       self.conf.picker_precision)]
+        for artist, x, y, tolerance in candidates:
+            distances = np.hypot((x - mouse.x()) * x_scale, (y - mouse.y()) * y_scale)
+            index = int(np.argmin(distances))
+            if distances[index] <= tolerance + MARKER_SIZE / 2:
+                return artist, index
+        return None
+
+    def mousePressEvent(self, event):
+        if event.button() == QtCore.Qt.LeftButton:
+            add = bool(event.modifiers() & QtCore.Qt.ShiftModifier)
+            picked = self.pick(self.mapToScene(event.pos()))
+            if picked is None:
+                # a drag from here selects a rectangle
+                self.drag_origin = event.pos()
+                self.drag_modifiers = event.modifiers()
+                if not add:
+                    self.deselect()
+            else:
+                self.select(*picked, add)
+        self.active_tab.emit(self.graph_data.name)
+        self.setFocus()
+        event.accept()
+
+    def mouseMoveEvent(self, event):
+        if self.drag_origin is not None and (event.pos() - self.drag_origin).manhattanLength() >= DRAG_DISTANCE:
+            self.rubber_band.setGeometry(QtCore.QRect(self.drag_origin, event.pos()).normalized())
+            self.rubber_band.show()
+        event.accept()
+
+    def mouseReleaseEvent(self, event):
+        if self.drag_origin is not None and self.rubber_band.isVisible():
+            self.rubber_band.hide()
+            view_box = self.getPlotItem().getViewBox()
+            start = view_box.mapSceneToView(self.mapToScene(self.drag_origin))
+            stop = view_box.mapSceneToView(self.mapToScene(event.pos()))
+            y_range = None if self.drag_modifiers & QtCore.Qt.ControlModifier else (start.y(), stop.y())
+            self.select_rectangle((start.x(), stop.x()), y_range,
+                                  bool(self.drag_modifiers & QtCore.Qt.ShiftModifier))
+        self.drag_origin = None
+        event.accept()
+
+    def wheelEvent(self, event):
+        button = 'up' if event.angleDelta().y() > 0 else 'down'
+        mouse = self.getPlotItem().getViewBox().mapSceneToView(self.mapToScene(event.pos()))
+        self.on_scroll(button, mouse.x(), mouse.y())
+        event.accept()
+
+    def keyPressEvent(self, event):
+        if event.key() in KEYS:
+            self.on_key(KEYS[event.key()])
+            event.accept()
+        else:
+            event.ignore()
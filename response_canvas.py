@@ -1,245 +1,264 @@
 import matplotlib
+from PyQt5 import QtCore
 from PyQt5.QtCore import pyqtSignal
 from matplotlib.backend_bases import MouseButton
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
 from matplotlib.figure import Figure
-from scipy import interpolate
-import numpy as np
+from matplotlib.widgets import RectangleSelector
+from response_editor import ResponseEditor
 
 matplotlib.use('Qt5Agg')
 
+DRAG_DISTANCE = 5  # pixels the mouse moves before a press becomes a rectangle selection
 
-class ResponseCanvas(FigureCanvasQTAgg):
+
+class AxesResponse(ResponseEditor):
     """
-    Class responsible for rendering GraphData on a canvas and handling interaction
-        - left mouse button for picking and clicking
-        - scrolling wheel for zooming and point adjusting after picking
-        - spacebar for default view
-        - arrow keys for point adjusting after picking
-        - A/D keys for navigation between points
+    Draws GraphData into matplotlib axes and translates the matplotlib events of these axes, see ResponseEditor
+    Used by ResponseCanvas, one figure per response, and by SharedResponseAxes, one subplot of a shared figure
     """
 
-    graph_changed = pyqtSignal(object)
-    active_tab = pyqtSignal(str)
+    title_prefix = ''
 
-    def __init__(self, graph_data, conf):
-        figure = Figure()
-        super(ResponseCanvas, self).__init__(figure)
-        self.conf = conf
+    def setup_axes(self, axes, graph_data, conf, history):
         self.specs = None
         self.mes_data = None
         self.mes_curve = None
-
+        self.violations = None
+        self.selected = None
         self.picked_label = None
-        self.picked_index = -1
-        self.picked_artist = ""
 
-        self.graph_data = graph_data
-        self.axis_limits = self.make_axis_limits()
-        self.axes = figure.add_subplot(111)
+        self.axes = axes
         self.axes.set_xlabel('Frequency(Mhz)')
         self.axes.set_ylabel('Response(' + graph_data.unit + ')')
-
-        self.draw_specifications()
-        self.draw_measurements()
-
-        self.connect_events_to_artists()
+        self.setup_editor(graph_data, conf, history)
 
         self.pickEvent = False
+        # shift and ctrl are read when the selection ends instead of shaping the rectangle
+        self.selector = RectangleSelector(axes, self.onselect, button=[MouseButton.LEFT], spancoords='pixels',
+                                          props=dict(facecolor='gray', edgecolor='black', alpha=0.2, fill=True),
+                                          state_modifier_keys=dict(square='not-applicable',
+                                                                   center='not-applicable'))
 
     def draw_specifications(self):
-        if self.specs is not None:
-            self.specs.remove()
-        self.specs, = self.axes.plot(self.graph_data.frequencies, self.graph_data.specifications, 'ob-', picker=self.conf.getint('picker_precision'))
-        self.specs.set_label('_line0')
+        if self.specs is None:
+            self.specs, = self.axes.plot(self.graph_data.frequencies, self.graph_data.specifications, 'ob-',
+                                         picker=self.conf.picker_precision)
+            self.specs.set_label('_line0')
+            return
+        self.specs.set_data(self.graph_data.frequencies, self.graph_data.specifications)
+        self.specs.set_picker(self.conf.picker_precision)
+        self.update_data_limits()
 
     def draw_measurements(self):
-        if self.mes_data is not None and self.mes_curve is not None:
-            self.mes_data.remove()
-            self.mes_curve.remove()
-        f = interpolate.interp1d(self.graph_data.measurements_x, self.graph_data.measurements_y, kind='quadratic')
-        xf = np.linspace(self.graph_data.measurements_x[0], self.graph_data.measurements_x[-1], self.conf.getint('interpolation_domain_size'))
-        self.mes_data, = self.axes.plot(self.graph_data.measurements_x, self.graph_data.measurements_y, 'ro', picker=2)
-        self.mes_curve, = self.axes.plot(xf, f(xf), 'r-')
-        self.graph_data.set_interpolation_function(f)
+        self.interpolate_measurements()
+        if self.mes_data is None:
+            self.mes_data, = self.axes.plot(self.graph_data.measurements_x, self.graph_data.measurements_y, 'ro',
+                                            picker=2)
+            self.mes_data.set_label('_line1')
+            self.mes_curve, = self.axes.plot([], [], 'r-')
+            # also called for the axes sharing the frequencies of these
+            self.axes.callbacks.connect('xlim_changed', self.draw_curve)
+            self.axes.figure.canvas.mpl_connect('resize_event', self.draw_curve)
+            self.draw_curve()
+            return
+        self.mes_data.set_data(self.graph_data.measurements_x, self.graph_data.measurements_y)
+        self.draw_curve()
+        self.update_data_limits()
+
+    def draw_curve(self, event=None):
+        self.mes_curve.set_data(*self.sample_curve(self.axes.bbox.width))
+
+    def update_data_limits(self):
+        # lines given new data are not taken into account by autoscaling until the limits are computed again
+        self.axes.relim()
+        self.axes.autoscale_view()
+
+    def draw_violations(self):
+        if self.violations is not None:
+            self.violations.remove()
+        checker = self.compliance
+        self.violations = self.axes.fill_between(checker.grid, checker.values, checker.limits,
+                                                 where=checker.violations(), interpolate=True, color='orange',
+                                                 alpha=0.5)
+        worst = checker.worst_margin()
+        self.axes.set_title(self.title_prefix + 'Worst margin: ' + str(round(worst, 2)) + ' ' + self.graph_data.unit,
+                            color='red' if worst < 0 else 'green')
+
+    def draw_selection(self):
+        x, y = self.selected_points()
+        if self.selected is None:
+            self.selected, = self.axes.plot(x, y, 'o', color='lime', markersize=10, fillstyle='none',
+                                            markeredgewidth=2)
+            return
+        self.selected.set_data(x, y)
 
     def draw_label(self, frequency, response):
-        middle_frequency = self.graph_data.frequencies[int(len(self.graph_data.frequencies)/2)]
-        cur_xlim = self.axes.get_xlim()
-        cur_ylim = self.axes.get_ylim()
-        cur_xrange = (cur_xlim[1] - cur_xlim[0]) * .5
-        cur_yrange = (cur_ylim[1] - cur_ylim[0]) * .5
+        self.remove_label()
+        label_posx, label_posy = self.label_position(frequency, response)
+        self.picked_label = self.axes.text(label_posx, label_posy, self.label_text(frequency, response))
+        self.picked_label.set_backgroundcolor('gray')
+        self.picked_label.set_color('white')
+
+    def remove_label(self):
         if self.picked_label is not None:
             self.picked_label.remove()
             self.picked_label = None
-        if frequency > middle_frequency:
-            label_posx = frequency + cur_xrange/15
-        else:
-            label_posx = frequency - cur_xrange/2
-        self.picked_label = self.axes.text(label_posx, response - cur_yrange/15,
-                                           str(round(frequency, 2)) + ', ' + str(round(response, 2)))
-        self.picked_label.set_backgroundcolor('gray')
-        self.picked_label.set_color('white')
 
-    def connect_events_to_artists(self):
-        self.specs.figure.canvas.mpl_connect('pick_event', self.onpick)
-        self.specs.figure.canvas.mpl_connect('button_press_event', self.onclick)
-        self.specs.figure.canvas.mpl_connect('scroll_event', self.onscroll)
-        self.specs.figure.canvas.mpl_connect('key_press_event', self.onkey)
+    def get_view(self):
+        return self.axes.get_xlim(), self.axes.get_ylim()
+
+    def reset_view(self):
+        # zooming turns autoscaling off, the first view of a graph is autoscaled
+        self.axes.autoscale(True)
+        self.update_data_limits()
 
-    def make_axis_limits(self):
-        axis_limits = []
-        x = self.graph_data.frequencies
-        y = self.graph_data.specifications
-        axis_limits.append(x[0] - 1000)
-        axis_limits.append(x[-1] + 1000)
-        axis_limits.append(min(y) - 10)
-        axis_limits.append(max(y) + 10)
-        return axis_limits
+    def set_view(self, xlim, ylim):
+        self.axes.set_xlim(xlim)
+        self.axes.set_ylim(ylim)
 
     def onclick(self, event):
-        if event.button == MouseButton.LEFT and self.pickEvent is False:
-            self.picked_index = -1
-            if self.picked_label is not None:
-                self.picked_label.remove()
-                self.picked_label = None
-            self.draw()
+        if event.button == MouseButton.LEFT and self.pickEvent is False and not is_pressed(event, 'shift'):
+            self.deselect()
         self.pickEvent = False
         self.active_tab.emit(self.graph_data.name)
 
     def onpick(self, event):
-        if event.mouseevent.button == MouseButton.LEFT:
-            thisline = event.artist
-            xdata = thisline.get_xdata()
-            ydata = thisline.get_ydata()
-            ind = event.ind
-            self.picked_index = ind[0]
-            self.picked_artist = thisline.get_label()
-            self.draw_label(xdata[ind[0]], ydata[ind[0]])
-            self.draw()
+        if event.mouseevent.button == MouseButton.LEFT and event.artist.get_label() in ('_line0', '_line1'):
+            self.select(event.artist.get_label(), event.ind[0], is_pressed(event.mouseevent, 'shift'))
         self.pickEvent = True
 
+    def onselect(self, press, release):
+        # clicks are handled by onclick and onpick, only a drag selects
+        if max(abs(release.x - press.x), abs(release.y - press.y)) < DRAG_DISTANCE:
+            return
+        y_range = None if is_pressed(press, 'control') else (press.ydata, release.ydata)
+        self.select_rectangle((press.xdata, release.xdata), y_range, is_pressed(press, 'shift'))
+
     def onscroll(self, event):
-        if self.picked_index == -1:
-            self.zoom(event)
-        else:
-            self.adjust(event.button)
-
-    def zoom(self, event):
-        # get the current x and y limits
-        cur_xlim = self.axes.get_xlim()
-        cur_ylim = self.axes.get_ylim()
-        cur_xrange = (cur_xlim[1] - cur_xlim[0]) * .5
-        cur_yrange = (cur_ylim[1] - cur_ylim[0]) * .5
-        xdata = event.xdata  # get event x location
-        ydata = event.ydata  # get event y location
-
-        base_scale = self.conf.getfloat('zoom_sensitivity')
-        if event.button == 'up':
-            # deal with zoom in
-            scale_factor = 1 / base_scale
-        elif event.button == 'down':
-            # deal with zoom out
-            scale_factor = base_scale
-        else:
-            # deal with something that should never happen
-            scale_factor = 1
-        # set new limits
-        self.axes.set_xlim([xdata - cur_xrange * scale_factor,
-                            xdata + cur_xrange * scale_factor])
-        self.axes.set_ylim([ydata - cur_yrange * scale_factor,
-                            ydata + cur_yrange * scale_factor])
-        self.draw()  # force re-draw
-
-    def adjust(self, key):
-        if self.picked_artist == "_line0":
-            if key == "up":
-                self.graph_data.specifications[self.picked_index] = self.graph_data.specifications[
-                                                                        self.picked_index] + self.conf.getfloat('specifications_adjust_y')
-            elif key == "down":
-                self.graph_data.specifications[self.picked_index] = self.graph_data.specifications[
-                                                                        self.picked_index] - self.conf.getfloat('specifications_adjust_y')
-            elif key == "right" and self.picked_index < len(self.graph_data.frequencies) - 1:
-                newvalue = self.graph_data.frequencies[self.picked_index] + self.conf.getfloat('specifications_adjust_x')
-                if newvalue >= self.graph_data.frequencies[self.picked_index + 1]:
-                    self.graph_data.frequencies[self.picked_index] = self.graph_data.frequencies[
-                                                                         self.picked_index + 1] - 0.1
-                else:
-                    self.graph_data.frequencies[self.picked_index] = newvalue
-            elif key == "left" and self.picked_index > 0:
-                newvalue = self.graph_data.frequencies[self.picked_index] - self.conf.getfloat('specifications_adjust_x')
-                if newvalue <= self.graph_data.frequencies[self.picked_index - 1]:
-                    self.graph_data.frequencies[self.picked_index] = self.graph_data.frequencies[
-                                                                         self.picked_index - 1] + 0.1
-                else:
-                    self.graph_data.frequencies[self.picked_index] = newvalue
-            freq = self.graph_data.frequencies[self.picked_index]
-            resp = self.graph_data.specifications[self.picked_index]
-            self.draw_specifications()
-        elif self.picked_artist == "_line1":
-            if key == "up":
-                self.graph_data.measurements_y[self.picked_index] = self.graph_data.measurements_y[
-                                                                        self.picked_index] + self.conf.getfloat('measurements_adjust_y')
-            elif key == "down":
-                self.graph_data.measurements_y[self.picked_index] = self.graph_data.measurements_y[
-                                                                        self.picked_index] - self.conf.getfloat('measurements_adjust_y')
-            elif key == "right" and self.picked_index < len(self.graph_data.measurements_x)-1:
-                newvalue = self.graph_data.measurements_x[self.picked_index] + self.conf.getfloat('measurements_adjust_x')
-                if newvalue >= self.graph_data.measurements_x[self.picked_index + 1]:
-                    self.graph_data.measurements_x[self.picked_index] = self.graph_data.measurements_x[
-                                                                            self.picked_index + 1] - 0.1
-                else:
-                    self.graph_data.measurements_x[self.picked_index] = newvalue
-            elif key == "left" and self.picked_index > 0:
-                newvalue = self.graph_data.measurements_x[self.picked_index] - self.conf.getfloat('measurements_adjust_x')
-                if newvalue <= self.graph_data.measurements_x[self.picked_index - 1]:
-                    self.graph_data.measurements_x[self.picked_index] = self.graph_data.measurements_x[
-                                                                            self.picked_index - 1] + 0.1
-                else:
-                    self.graph_data.measurements_x[self.picked_index] = newvalue
-            freq = self.graph_data.measurements_x[self.picked_index]
-            resp = self.graph_data.measurements_y[self.picked_index]
-            self.draw_measurements()
-        else:
-            freq = 0
-            resp = 0
-        self.draw_label(freq, resp)
-        self.set_axes_limits()
+        self.on_scroll(event.button, event.xdata, event.ydata)
+
+    def onkey(self, event):
+        self.on_key(event.key)
+
+
+class ResponseCanvas(FigureCanvasQTAgg, AxesResponse):
+    """
+    Class responsible for rendering GraphData on its own matplotlib canvas and handling interaction
+    """
+
+    graph_changed = pyqtSignal(object)
+    active_tab = pyqtSignal(str)
+
+    def __init__(self, graph_data, conf, history=None):
+        figure = Figure()
+        super(ResponseCanvas, self).__init__(figure)
+        self.setup_axes(figure.add_subplot(111), graph_data, conf, history)
+        self.connect_events_to_artists()
+
+    def redraw(self):
         self.draw()
-        self.graph_changed.emit(self.graph_data)
+
+    def connect_events_to_artists(self):
+        self.specs.figure.canvas.mpl_connect('pick_event', self.onpick)
+        self.specs.figure.canvas.mpl_connect('button_press_event', self.onclick)
+        self.specs.figure.canvas.mpl_connect('scroll_event', self.onscroll)
+        self.specs.figure.canvas.mpl_connect('key_press_event', self.onkey)
+
+
+class SharedResponseAxes(QtCore.QObject, AxesResponse):
+    """
+    One response drawn as a subplot of a SharedResponseFigure, which dispatches the events to it
+    """
+
+    graph_changed = pyqtSignal(object)
+    active_tab = pyqtSignal(str)
+
+    def __init__(self, figure_canvas, axes, graph_data, conf, history=None):
+        super(SharedResponseAxes, self).__init__()
+        self.figure_canvas = figure_canvas
+        self.title_prefix = graph_data.name + ' - '
+        self.setup_axes(axes, graph_data, conf, history)
+
+    def redraw(self):
+        # several responses changed by one interaction are drawn together
+        self.figure_canvas.draw_idle()
+
+
+class SharedResponseFigure(FigureCanvasQTAgg):
+    """
+    Renders the four responses as subplots of a single figure with a shared frequency axis
+    Zooming, centering on a point or resetting the view of one response applies to the frequencies of all of them.
+    One render buffer and one event dispatcher serve all responses: mouse events go to the response under the mouse,
+    key events to the last response clicked.
+    """
+
+    def __init__(self, graph_datas, confs, history=None):
+        figure = Figure()
+        super(SharedResponseFigure, self).__init__(figure)
+        axes = figure.subplots(2, 2, sharex=True).ravel()
+        self.responses = [SharedResponseAxes(self, response_axes, graph_data, conf, history)
+                          for response_axes, graph_data, conf in zip(axes, graph_datas, confs)]
+        self.active_response = self.responses[0]
+        figure.tight_layout()
+
+        self.mpl_connect('pick_event', self.onpick)
+        self.mpl_connect('button_press_event', self.onclick)
+        self.mpl_connect('scroll_event', self.onscroll)
+        self.mpl_connect('key_press_event', self.onkey)
+
+    def response_at(self, axes):
+        for response in self.responses:
+            if response.axes is axes:
+                return response
+        return None
+
+    def onpick(self, event):
+        response = self.response_at(event.artist.axes)
+        if response is not None:
+            response.onpick(event)
+
+    def onclick(self, event):
+        response = self.response_at(event.inaxes)
+        if response is not None:
+            self.active_response = response
+            response.onclick(event)
+
+    def onscroll(self, event):
+        response = self.response_at(event.inaxes)
+        if response is not None:
+            response.onscroll(event)
 
     def onkey(self, event):
         if event.key == ' ':
-            self.axes.axis(self.axis_limits)
-            self.draw()
-        elif event.key == "up" or event.key == "down" or event.key == "left" or event.key == "right":
-            if self.picked_index != -1:
-                self.adjust(event.key)
+            for response in self.responses:
+                response.set_view(response.axis_limits[0:2], response.axis_limits[2:4])
+            self.draw_idle()
         else:
-            if self.picked_index != -1:
-                self.navigate(event.key)
-
-    def navigate(self, key):
-        y = self.graph_data.specifications if self.picked_artist == "_line0" else self.graph_data.measurements_y
-        x = self.graph_data.frequencies if self.picked_artist == "_line0" else self.graph_data.measurements_x
-        if key == "a":
-            if self.picked_index > 0:
-                self.picked_index -= 1
-        elif key == "d":
-            if self.picked_index < len(y) - 1:
-                self.picked_index += 1
-        self.draw_label(x[self.picked_index], y[self.picked_index])
-        self.set_axes_limits()
-        # Show
-        self.draw()
+            self.active_response.onkey(event)
+
+
+def is_pressed(event, modifier):
+    """
+    :param modifier: 'shift' or 'control'
+    :return: True if the modifier key was held during a mouse event
+    """
+    key = event.key or ''
+    return modifier in key or (modifier == 'control' and 'ctrl' in key)
+
 
-    def set_axes_limits(self):
-        y = self.graph_data.specifications if self.picked_artist == "_line0" else self.graph_data.measurements_y
-        x = self.graph_data.frequencies if self.picked_artist == "_line0" else self.graph_data.measurements_x
-        # Update view
-        cur_xlim = self.axes.get_xlim()
-        cur_ylim = self.axes.get_ylim()
-        cur_xrange = (cur_xlim[1] - cur_xlim[0]) * .5
-        cur_yrange = (cur_ylim[1] - cur_ylim[0]) * .5
-        self.axes.set_xlim([x[self.picked_index] - cur_xrange, x[self.picked_index] + cur_xrange])
-        self.axes.set_ylim([y[self.picked_index] - cur_yrange, y[self.picked_index] + cur_yrange])
+def warm_up():
+    """
+    Draws a figure like the response canvases off screen, see response_editor.draw_first_figure
+    """
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    axes = figure.add_subplot(111)
+    axes.set_xlabel('Frequency(Mhz)')
+    axes.set_ylabel('Response(dB)')
+    axes.plot([0, 1, 2], [0, 1, 0], 'ob-')
+    axes.fill_between([0, 1, 2], [0, 1, 0], [1, 1, 1], color='orange', alpha=0.5)
+    axes.set_title('Worst margin: 0.0 dB', color='green')
+    axes.text(1, 1, '1.0, 1.0').set_backgroundcolor('gray')
+    figure.canvas.draw()
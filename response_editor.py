@@ -0,0 +1,461 @@
+import numpy as np
+import compliance
+import edit_history
+import interpolation
+
+BACKENDS = ('matplotlib', 'pyqtgraph')
+
+
+class ResponseEditor:
+    """
+    Interaction with a response graph, independent of the library drawing it
+        - left mouse button for picking and clicking
+        - scrolling wheel for zooming and point adjusting after picking
+        - spacebar for default view
+        - arrow keys for point adjusting after picking
+        - A/D keys for navigation between points
+        - shift-click for adding points to the selection or removing them, dragging a rectangle for selecting the
+          points inside it, with ctrl for selecting all the points of its frequency range
+        - arrow keys and scrolling wheel move all the selected points together, W/S keys scale their responses
+          about the last picked point
+    Regions where the measurements violate the specifications are highlighted after every change
+    Edits are recorded in the EditHistory shared by the canvases, if one is given
+
+    A canvas backend subclasses a Qt widget and this class, declares the graph_changed and active_tab signals
+    (signals only work on QObject subclasses), translates its input events into select, select_rectangle, deselect,
+    on_scroll and on_key calls and implements the drawing methods:
+        draw_specifications, draw_measurements, draw_violations, draw_selection, draw_label, remove_label, get_view,
+        set_view, redraw
+    draw_measurements draws the curve of sample_curve, and draws it again whenever the visible frequencies change.
+    An edit of several selected points is applied to the arrays at once, recorded as one delta and drawn once.
+    The drawing methods update the items already drawn when there are some, so set_graph_data can show another
+    graph without creating the canvas again.
+    """
+
+    def setup_editor(self, graph_data, conf, history):
+        self.conf = conf
+        self.history = history
+        self.graph_data = graph_data
+        self.axis_limits = self.make_axis_limits()
+
+        self.picked_index = -1  # last picked point, the pivot of scaling
+        self.picked_artist = ""
+        self.selection = np.empty(0, dtype=np.int64)  # sorted indices of the selected points of the picked artist
+
+        # a canvas showing another graph draws its curve again as soon as the specifications change its view
+        self.interpolate_measurements()
+        self.draw_specifications()
+        self.draw_measurements()
+        self.compliance = compliance.ComplianceChecker(graph_data, self.conf.compliance_grid_size)
+        self.draw_violations()
+        self.draw_selection()
+
+    def set_graph_data(self, graph_data, history=None):
+        """
+        Shows another graph on the same canvas, reusing what was drawn for the previous one
+        :param history: the EditHistory of the new graph
+        """
+        self.remove_label()
+        self.setup_editor(graph_data, self.conf, history)
+        self.reset_view()
+        self.redraw()
+
+    def reset_view(self):
+        """
+        Shows the whole graph, as when it was first drawn
+        """
+        self.set_view(self.axis_limits[0:2], self.axis_limits[2:4])
+
+    def interpolate_measurements(self):
+        """
+        Fits the interpolation of the measurements again and gives it to the graph, which the compliance checks and
+        the saves evaluate as well
+        """
+        self.graph_data.set_interpolation_function(interpolation.Interpolator(
+            self.graph_data.measurements_x, self.graph_data.measurements_y, self.conf.interpolation))
+
+    def sample_curve(self, width):
+        """
+        Samples the interpolated measurements over the visible frequencies, see interpolation.sample
+        Drawn again whenever the view changes, so zooming in shows the curve at the same resolution.
+        :param width: width of the graph in pixels
+        :return: (x, y) of the curve to draw
+        """
+        return interpolation.sample(self.graph_data.interpolation_function, self.graph_data.measurements_x,
+                                    self.get_view()[0], width)
+
+    def make_axis_limits(self):
+        axis_limits = []
+        x = self.graph_data.frequencies
+        y = self.graph_data.specifications
+        axis_limits.append(x[0] - 1000)
+        axis_limits.append(x[-1] + 1000)
+        axis_limits.append(y.min() - 10)
+        axis_limits.append(y.max() + 10)
+        return axis_limits
+
+    def label_position(self, frequency, response):
+        middle_frequency = self.graph_data.frequencies[int(len(self.graph_data.frequencies)/2)]
+        cur_xlim, cur_ylim = self.get_view()
+        cur_xrange = (cur_xlim[1] - cur_xlim[0]) * .5
+        cur_yrange = (cur_ylim[1] - cur_ylim[0]) * .5
+        if frequency > middle_frequency:
+            label_posx = frequency + cur_xrange/15
+        else:
+            label_posx = frequency - cur_xrange/2
+        return label_posx, response - cur_yrange/15
+
+    def label_text(self, frequency, response):
+        return str(round(frequency, 2)) + ', ' + str(round(response, 2))
+
+    def select(self, artist, index, add=False):
+        """
+        Picks a point of the specifications ('_line0') or measurements ('_line1')
+        :param add: True to add the point to the selection, or to remove it if it is already selected
+        """
+        if add and artist == self.picked_artist and len(self.selection) > 0:
+            if index in self.selection:
+                self.selection = self.selection[self.selection != index]
+                if len(self.selection) == 0:
+                    self.deselect()
+                    return
+                index = self.selection[-1]
+            else:
+                self.selection = np.union1d(self.selection, [index])
+        else:
+            self.selection = np.array([index], dtype=np.int64)
+        self.show_selection(artist, index)
+
+    def select_rectangle(self, x_range, y_range, add=False):
+        """
+        Selects the points inside a rectangle: the measurements if there are some, the specifications otherwise
+        :param x_range: (start, stop) frequencies
+        :param y_range: (low, high) responses, None for all the points of the frequency range
+        :param add: True to add the points to the selection
+        """
+        candidates = [('_line1', self.graph_data.measurements_x, self.graph_data.measurements_y),
+                      ('_line0', self.graph_data.frequencies, self.graph_data.specifications)]
+        if add:
+            # points of the picked artist first, only them can be added to the selection
+            candidates.sort(key=lambda candidate: candidate[0] != self.picked_artist)
+        for artist, x, y in candidates:
+            inside = (x >= min(x_range)) & (x <= max(x_range))
+            if y_range is not None:
+                inside &= (y >= min(y_range)) & (y <= max(y_range))
+            index = np.flatnonzero(inside)
+            if len(index) > 0:
+                break
+        else:
+            if not add:
+                self.deselect()
+            return
+        if add and artist == self.picked_artist and len(self.selection) > 0:
+            index = np.union1d(self.selection, index)
+        self.selection = index
+        self.show_selection(artist, index[-1])
+
+    def show_selection(self, artist, index):
+        self.picked_index = int(index)
+        self.picked_artist = artist
+        x, y = self.picked_vectors()
+        self.draw_selection()
+        self.draw_label(x[index], y[index])
+        self.redraw()
+
+    def deselect(self):
+        self.picked_index = -1
+        self.selection = np.empty(0, dtype=np.int64)
+        self.draw_selection()
+        self.remove_label()
+        self.redraw()
+
+    def selected_points(self):
+        """
+        :return: (x, y) of the selected points, empty if there are none
+        """
+        if self.picked_index == -1:
+            return np.empty(0), np.empty(0)
+        x, y = self.picked_vectors()
+        return x[self.selection], y[self.selection]
+
+    def on_scroll(self, button, xdata, ydata):
+        if self.picked_index == -1:
+            self.zoom(button, xdata, ydata)
+        else:
+            self.adjust(button)
+
+    def zoom(self, button, xdata, ydata):
+        # get the current x and y limits
+        cur_xlim, cur_ylim = self.get_view()
+        cur_xrange = (cur_xlim[1] - cur_xlim[0]) * .5
+        cur_yrange = (cur_ylim[1] - cur_ylim[0]) * .5
+
+        base_scale = self.conf.zoom_sensitivity
+        if button == 'up':
+            # deal with zoom in
+            scale_factor = 1 / base_scale
+        elif button == 'down':
+            # deal with zoom out
+            scale_factor = base_scale
+        else:
+            # deal with something that should never happen
+            scale_factor = 1
+        # set new limits
+        self.set_view([xdata - cur_xrange * scale_factor, xdata + cur_xrange * scale_factor],
+                      [ydata - cur_yrange * scale_factor, ydata + cur_yrange * scale_factor])
+        self.redraw()
+
+    def adjust(self, key):
+        if len(self.selection) > 1:
+            self.adjust_selection(key)
+            return
+        x, y = self.picked_vectors()
+        index = self.picked_index
+        old_freq = x[index]
+        old_resp = y[index]
+        new_freq, new_resp = old_freq, old_resp
+        if self.picked_artist == "_line0":
+            adjust_x, adjust_y = self.conf.specifications_adjust_x, self.conf.specifications_adjust_y
+        else:
+            adjust_x, adjust_y = self.conf.measurements_adjust_x, self.conf.measurements_adjust_y
+        if key == "up":
+            new_resp = old_resp + adjust_y
+        elif key == "down":
+            new_resp = old_resp - adjust_y
+        elif key == "right" and index < len(x) - 1:
+            newvalue = old_freq + adjust_x
+            new_freq = x[index + 1] - 0.1 if newvalue >= x[index + 1] else newvalue
+        elif key == "left" and index > 0:
+            newvalue = old_freq - adjust_x
+            new_freq = x[index - 1] + 0.1 if newvalue <= x[index - 1] else newvalue
+        # a point already at its bound does not move: nothing is recorded and the graph keeps its version
+        if not edit_history.move_points(self.graph_data, self.picked_artist, index, new_freq, new_resp):
+            return
+        if self.history is not None:
+            self.history.record(self.graph_data, self.picked_artist, index, old_freq, old_resp, new_freq, new_resp)
+        self.show_edit(index)
+
+    def adjust_selection(self, key):
+        if self.picked_artist == "_line0":
+            adjust_x, adjust_y = self.conf.specifications_adjust_x, self.conf.specifications_adjust_y
+        else:
+            adjust_x, adjust_y = self.conf.measurements_adjust_x, self.conf.measurements_adjust_y
+        offsets = {'up': (0, adjust_y), 'down': (0, -adjust_y), 'right': (adjust_x, 0), 'left': (-adjust_x, 0)}
+        if key in offsets:
+            self.translate_selection(*offsets[key])
+
+    def translate_selection(self, dx, dy):
+        """
+        Moves the selected points together, as one edit
+        :param dx: frequency offset, reduced if needed so that the points keep their order
+        :param dy: response offset
+        """
+        x, y = self.picked_vectors()
+        self.edit_selection(limit_shift(x, self.selection, dx), dy)
+
+    def scale_selection(self, factor, pivot=None):
+        """
+        Scales the responses of the selected points about a pivot response, as one edit
+        :param pivot: response that stays in place, by default the one of the last picked point
+        """
+        x, y = self.picked_vectors()
+        pivot = y[self.picked_index] if pivot is None else pivot
+        self.edit_selection(0, (y[self.selection] - pivot) * (factor - 1))
+
+    def offset_range(self, artist, start, stop, dy):
+        """
+        Offsets the responses of all the points of a frequency range, as one edit; the points become the selection
+        :param artist: '_line0' for the specifications, '_line1' for the measurements
+        """
+        x = self.graph_data.frequencies if artist == '_line0' else self.graph_data.measurements_x
+        index = np.flatnonzero((x >= start) & (x <= stop))
+        if len(index) == 0:
+            return
+        self.selection = index
+        self.picked_artist = artist
+        self.picked_index = int(index[-1])
+        self.edit_selection(0, dy)
+
+    def edit_selection(self, dx, dy):
+        """
+        Offsets all the selected points in one step: one history delta, one redraw and one graph_changed
+        :param dx: frequency offset, a number or one value per selected point
+        :param dy: response offset, a number or one value per selected point
+        """
+        index = self.selection.copy()
+        old_x, old_y = edit_history.point_values(self.graph_data, self.picked_artist, index)
+        new_x = old_x + dx
+        new_y = old_y + dy
+        if not edit_history.move_points(self.graph_data, self.picked_artist, index, new_x, new_y):
+            return
+        if self.history is not None:
+            self.history.record(self.graph_data, self.picked_artist, index, old_x, old_y, new_x, new_y)
+        self.show_edit(index)
+
+    def show_edit(self, index):
+        """
+        Draws the graph again after the picked point or the selected points (index array) were moved
+        """
+        if self.picked_artist == "_line0":
+            self.draw_specifications()
+        else:
+            self.draw_measurements()
+        if np.ndim(index) == 0:
+            self.compliance.update(self.picked_artist, index)
+        else:
+            self.compliance.evaluate()
+        self.draw_violations()
+        self.draw_selection()
+        x, y = self.picked_vectors()
+        self.draw_label(x[self.picked_index], y[self.picked_index])
+        self.set_axes_limits()
+        self.redraw()
+        self.graph_changed.emit(self.graph_data)
+
+    def refresh(self):
+        """
+        Redraws the graph after its data was changed from outside the canvas, e.g. by undo/redo
+        """
+        self.draw_specifications()
+        self.draw_measurements()
+        self.compliance.grid_size = self.conf.compliance_grid_size
+        self.compliance.evaluate()
+        self.draw_violations()
+        self.draw_selection()
+        if self.picked_index != -1:
+            x, y = self.picked_vectors()
+            self.draw_label(x[self.picked_index], y[self.picked_index])
+        self.redraw()
+
+    def on_key(self, key):
+        if key == ' ':
+            self.set_view(self.axis_limits[0:2], self.axis_limits[2:4])
+            self.redraw()
+        elif key == "up" or key == "down" or key == "left" or key == "right":
+            if self.picked_index != -1:
+                self.adjust(key)
+        elif key == "w" or key == "s":
+            if self.picked_index != -1:
+                step = self.conf.selection_scale_step
+                self.scale_selection(1 + step if key == "w" else 1 - step)
+        else:
+            if self.picked_index != -1:
+                self.navigate(key)
+
+    def picked_vectors(self):
+        if self.picked_artist == "_line0":
+            return self.graph_data.frequencies, self.graph_data.specifications
+        return self.graph_data.measurements_x, self.graph_data.measurements_y
+
+    def navigate(self, key):
+        x, y = self.picked_vectors()
+        if key == "a":
+            if self.picked_index > 0:
+                self.picked_index -= 1
+        elif key == "d":
+            if self.picked_index < len(y) - 1:
+                self.picked_index += 1
+        self.selection = np.array([self.picked_index], dtype=np.int64)
+        self.draw_selection()
+        self.draw_label(x[self.picked_index], y[self.picked_index])
+        self.set_axes_limits()
+        # Show
+        self.redraw()
+
+    def set_axes_limits(self):
+        x, y = self.picked_vectors()
+        # Update view
+        cur_xlim, cur_ylim = self.get_view()
+        cur_xrange = (cur_xlim[1] - cur_xlim[0]) * .5
+        cur_yrange = (cur_ylim[1] - cur_ylim[0]) * .5
+        self.set_view([x[self.picked_index] - cur_xrange, x[self.picked_index] + cur_xrange],
+                      [y[self.picked_index] - cur_yrange, y[self.picked_index] + cur_yrange])
+
+
+def limit_shift(x, index, dx, spacing=0.1):
+    """
+    Limits a frequency shift of some points so that they keep their order, staying `spacing` away from the points
+    that are not moved, as when adjusting a single point
+    :param x: sorted frequencies
+    :param index: sorted indices of the moved points
+    :return: the largest shift towards dx that is allowed
+    """
+    moved = np.zeros(len(x), dtype=bool)
+    moved[index] = True
+    if dx > 0:
+        # moved points followed by a point that is not moved
+        blocked = index[index < len(x) - 1]
+        blocked = blocked[~moved[blocked + 1]]
+        if len(blocked) > 0:
+            dx = min(dx, max(np.min(x[blocked + 1] - x[blocked]) - spacing, 0))
+    elif dx < 0:
+        blocked = index[index > 0]
+        blocked = blocked[~moved[blocked - 1]]
+        if len(blocked) > 0:
+            dx = max(dx, -max(np.min(x[blocked] - x[blocked - 1]) - spacing, 0))
+    return dx
+
+
+def available_backend(backend):
+    """
+    :return: the backend to use for the configured one, matplotlib when pyqtgraph is not installed
+    """
+    if backend == 'pyqtgraph':
+        try:
+            import pyqtgraph_canvas
+        except ImportError as error:
+            print("pyqtgraph backend not available, using matplotlib: " + str(error))
+            return 'matplotlib'
+    return backend
+
+
+def warm_up(backend):
+    """
+    Runs what the first canvases would otherwise run for the first time: the scipy interpolation and, for the
+    matplotlib backend, the imports loading the fonts. Meant for a background thread while the input screen is shown,
+    it only imports and computes; the first drawing belongs to the GUI thread, see draw_first_figure.
+    """
+    x = np.linspace(0, 1, 16)
+    interpolation.Interpolator(x, x ** 2)(x)
+    if backend == 'matplotlib':
+        import matplotlib.backends.backend_agg
+        import matplotlib.figure
+
+
+def draw_first_figure(backend):
+    """
+    For the matplotlib backend, draws a figure like the response canvases off screen, which fills the text layout
+    caches. Runs in the GUI thread, once the input screen is shown.
+    """
+    if available_backend(backend) == 'matplotlib':
+        import response_canvas
+        response_canvas.warm_up()
+
+
+def make_canvases(backend, layout, graph_datas, confs, history=None):
+    """
+    Creates the canvases of the response graphs
+    :param backend: one of BACKENDS
+    :param layout: 'separate' for one figure per response, 'shared' for linked frequency axes.
+                   With matplotlib the shared responses are subplots of a single figure
+    :param graph_datas: the GraphData of each response
+    :param confs: the ResponseConfiguration of each response
+    :return: (widgets, editors) the widgets to show and the ResponseEditor of each response
+    """
+    backend = available_backend(backend)
+    if backend == 'pyqtgraph':
+        import pyqtgraph_canvas
+        canvases = [pyqtgraph_canvas.PyqtgraphResponseCanvas(graph_data, conf, history)
+                    for graph_data, conf in zip(graph_datas, confs)]
+        if layout == 'shared':
+            for canvas in canvases[1:]:
+                canvas.getPlotItem().setXLink(canvases[0].getPlotItem())
+        return canvases, canvases
+
+    import response_canvas
+    if layout == 'shared':
+        figure = response_canvas.SharedResponseFigure(graph_datas, confs, history)
+        return [figure], figure.responses
+    canvases = [response_canvas.ResponseCanvas(graph_data, conf, history)
+                for graph_data, conf in zip(graph_datas, confs)]
+    return canvases, canvases
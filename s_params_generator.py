@@ -1,7 +1,10 @@
+import argparse
 import sys
+import threading
+import configuration
+import response_editor
 import screens
-from PyQt5 import QtWidgets
-import configparser
+from PyQt5 import QtCore, QtWidgets
 
 
 class WindowController:
@@ -10,31 +13,63 @@ class WindowController:
     """
     def __init__(self, configurations):
         self.conf = configurations
-        pass
+        self.generate_screen = None
+        self.configuration_watcher = configuration.ConfigurationWatcher(self.conf)
+        self.configuration_watcher.changed.connect(self.apply_configuration)
+
+    def apply_configuration(self):
+        if self.generate_screen is not None:
+            self.generate_screen.apply_configuration()
 
     def show_input_screen(self):
         self.input_screen = screens.InputScreen()
         self.input_screen.switch_window.connect(self.show_generate_screen)
+        self.input_screen.restore_session.connect(self.show_restored_screen)
         self.input_screen.show()
+        # the first graphs are drawn without paying for the first use of matplotlib and scipy
+        threading.Thread(target=response_editor.warm_up, args=(self.conf.editor.backend,), daemon=True).start()
+        QtCore.QTimer.singleShot(0, lambda: response_editor.draw_first_figure(self.conf.editor.backend))
+        self.input_screen.offer_session_restore(self.conf.autosave.directory)
 
-    def show_generate_screen(self, input_data, measurements_text):
-        self.generate_screen = screens.GenerateScreen(input_data, measurements_text, self.conf)
-        self.generate_screen.switch_window.connect(self.show_save_screen)
-        self.input_screen.close()
+    def show_generate_screen(self, input_data, measurements_text, numerical_data=None):
+        try:
+            if self.generate_screen is not None and self.generate_screen.can_load():
+                self.generate_screen.load(input_data, measurements_text, numerical_data)
+            else:
+                self.generate_screen = screens.GenerateScreen(input_data, measurements_text, self.conf,
+                                                              numerical_data)
+                self.generate_screen.switch_window.connect(self.show_save_screen)
+        except ValueError as error:
+            QtWidgets.QMessageBox.warning(self.input_screen, "Input", str(error))
+            return
+        self.input_screen.hide()
         self.generate_screen.showMaximized()
 
+    def show_restored_screen(self, numerical_data):
+        self.show_generate_screen(None, [], numerical_data)
+
     def show_save_screen(self, numerical_data):
-        self.save_screen = screens.SaveScreen(numerical_data, self.conf['touchstone'])
-        self.save_screen.exit_signal.connect(exit_application)
+        self.save_screen = screens.SaveScreen(numerical_data, self.conf.touchstone, self.conf.sweep,
+                                              self.conf.montecarlo, self.conf.timedomain,
+                                              self.generate_screen.save_planner)
+        self.save_screen.exit_signal.connect(self.close_application)
         self.save_screen.restart_signal.connect(self.restart_application)
         self.save_screen.cancel_signal.connect(self.cancel_save)
         self.save_screen.exec()
 
+    def close_application(self):
+        self.generate_screen.journal.close(discard=True)
+        exit_application()
+
     def restart_application(self):
-        self.conf = read_configurations()
+        """
+        Goes back to the input screen for the next filter. The screens are hidden and kept, so the next filter is
+        shown on the same windows and canvases
+        """
+        self.generate_screen.journal.close(discard=True)
         self.save_screen.close()
-        self.generate_screen.close()
-        self.show_input_screen()
+        self.generate_screen.hide()
+        self.input_screen.clear_measurements()
         self.input_screen.show()
 
     def cancel_save(self):
@@ -45,15 +80,38 @@ def exit_application():
     QtWidgets.QApplication.quit()
 
 
-def read_configurations():
-    config = configparser.ConfigParser()
-    config.read('configurations.ini')
-    return config
+def parse_arguments(arguments):
+    parser = argparse.ArgumentParser(description="Generates S-parameters of two-port filters from their responses")
+    parser.add_argument('--serve', action='store_true',
+                        help="run the local HTTP/JSON generation service instead of the application")
+    parser.add_argument('--host', help="address the service listens on, see [service] in configurations.ini")
+    parser.add_argument('--port', type=int, help="port the service listens on, see [service] in configurations.ini")
+    parser.add_argument('--watch', nargs='?', const='', metavar='DIRECTORY',
+                        help="regenerate the touchstone files of a directory of specifications when they change, "
+                             "see [watcher] in configurations.ini")
+    parser.add_argument('--export', nargs='?', const='', metavar='DIRECTORY',
+                        help="render the response plots of a directory of specifications to image files, "
+                             "see [export] in configurations.ini")
+    parser.add_argument('--output', metavar='DIRECTORY', help="directory of the files written by --watch or --export")
+    return parser.parse_known_args(arguments)[0]
 
 
 def main():
+    arguments = parse_arguments(sys.argv[1:])
+    configurations = configuration.read_configuration()
+    if arguments.serve:
+        import service
+        service.serve(configurations, arguments.host, arguments.port)
+        return
+    if arguments.watch is not None:
+        import watcher
+        watcher.watch(configurations, arguments.watch, arguments.output)
+        return
+    if arguments.export is not None:
+        import export
+        export.export_directory(configurations, arguments.export, arguments.output)
+        return
     app = QtWidgets.QApplication(sys.argv)
-    configurations = read_configurations()
     controller = WindowController(configurations)
     controller.show_input_screen()
     sys.exit(app.exec_())
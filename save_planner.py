@@ -0,0 +1,96 @@
+import os
+import models
+
+RESPONSES = ('insertion_loss', 'group_delay', 'input_return_loss', 'output_return_loss')
+
+
+class SavePlanner:
+    """
+    Remembers what the previous saves of a design wrote, so saving it again only writes the outputs whose inputs
+    changed since. Inputs are identified by keys made of the versions of the graphs, see GraphData.changed, and of
+    the save settings; an output is also written again if its file was modified or removed meanwhile.
+    The responses evaluated over the frequency grid are kept as well, so the touchstone columns of a design are
+    recomputed only for the responses that changed.
+    """
+
+    def __init__(self):
+        self.written = {}  # location: (key, location of the written file, its modification time)
+        self.responses = {}  # response name: (key, values over the frequency grid)
+        self.phase = None  # (key, S21 phase over the frequency grid)
+
+    def needs_writing(self, location, key):
+        """
+        :return: False if the output at location was written from the same key and is untouched since
+        """
+        entry = self.written.get(location)
+        if entry is None or entry[0] != key:
+            return True
+        try:
+            return os.path.getmtime(entry[1]) != entry[2]
+        except OSError:
+            return True
+
+    def wrote(self, location, key, final_location=None):
+        """
+        Records an output written from key
+        :param final_location: location of the file actually written, if it is not location (e.g. compressed)
+        """
+        final_location = location if final_location is None else final_location
+        self.written[location] = (key, final_location, os.path.getmtime(final_location))
+
+    def columns(self, sparams_data):
+        """
+        Computes the same columns as SparamsData.compute_columns, evaluating only the responses whose measurements
+        or frequency grid changed since the previous call. The phase is integrated again only if the group delay
+        changed, and the save parameters are cheap to apply.
+        """
+        frequencies = sparams_data.frequency_grid()
+        grid = (frequencies[0], frequencies[-1], len(frequencies))
+        values = {}
+        for name in RESPONSES:
+            graph_data = getattr(sparams_data.numerical_data, name)
+            key = (graph_data.measurements_version, graph_data.interpolation_function, grid)
+            cached = self.responses.get(name)
+            if cached is None or cached[0] != key:
+                cached = (key, graph_data.interpolation_function(frequencies))
+                self.responses[name] = cached
+            values[name] = cached[1]
+
+        phase_key = (self.responses['group_delay'][0], sparams_data.conf.group_delay_scaling)
+        if self.phase is None or self.phase[0] != phase_key:
+            self.phase = (phase_key, models.transmission_phase(frequencies, values['group_delay'],
+                                                               sparams_data.conf.group_delay_scaling))
+        return models.place_columns(frequencies, values['insertion_loss'], self.phase[1],
+                                    values['input_return_loss'], values['output_return_loss'],
+                                    abs(sparams_data.absolute_losses), float(sparams_data.ang_s11),
+                                    float(sparams_data.ang_s22), sparams_data.mag_s12, sparams_data.ang_s12)
+
+
+def measurements_key(numerical_data):
+    """
+    :return: key of the measurements of the four responses, what the -real.txt file is written from
+    """
+    return tuple(getattr(numerical_data, name).measurements_version for name in RESPONSES)
+
+
+def specifications_key(numerical_data):
+    """
+    :return: key of the specifications of the four responses, what the -ideal.txt file is written from
+    """
+    return (numerical_data.center_frequency, numerical_data.bandwidth, numerical_data.loss_at_center) + \
+        tuple(getattr(numerical_data, name).specifications_version for name in RESPONSES)
+
+
+def sparams_key(sparams_data, filter_name):
+    """
+    :return: key of everything the touchstone file of a design is written from: the measurements and their
+             interpolations, the frequency grid spanned by the specifications, the save parameters and the touchstone
+             configuration
+    """
+    conf = sparams_data.conf
+    numerical_data = sparams_data.numerical_data
+    # the interpolations are fitted again when their kind is changed, without any new version of the measurements
+    interpolations = tuple(getattr(numerical_data, name).interpolation_function for name in RESPONSES)
+    return (measurements_key(numerical_data), specifications_key(numerical_data), interpolations,
+            sparams_data.absolute_losses, sparams_data.ang_s11, sparams_data.ang_s22, sparams_data.mag_s12,
+            sparams_data.ang_s12, filter_name) + tuple(getattr(conf, key) for key in conf.__slots__)
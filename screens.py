@@ -1,8 +1,20 @@
 from PyQt5 import QtCore, QtWidgets, QtGui
-from datetime import datetime
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+from matplotlib.figure import Figure
+import numpy as np
+import autofit
 import data_parser
-import response_canvas
+import edit_history
+import journal
+import response_editor
 import models
+import montecarlo
+import pipeline
+import save_planner
+import sweep
+import timedomain
+
+RESPONSE_NAMES = ['Insertion Loss', 'Group Delay', 'Input Return Loss', 'Output Return Loss']
 
 
 class InputScreen(QtWidgets.QWidget):
@@ -11,6 +23,7 @@ class InputScreen(QtWidgets.QWidget):
     Retrieves InputData and passes it to the next screen for processing
     """
     switch_window = QtCore.pyqtSignal(object, list)
+    restore_session = QtCore.pyqtSignal(object)
 
     def __init__(self):
         QtWidgets.QWidget.__init__(self)
@@ -24,10 +37,12 @@ class InputScreen(QtWidgets.QWidget):
         self.loss_at_center_line_edit = QtWidgets.QLineEdit()
         self.bandwidth_line_edit = QtWidgets.QLineEdit()
         self.center_frequency_line_edit = QtWidgets.QLineEdit()
+        self.previews = [MaskPreview(name) for name in RESPONSE_NAMES]
         self.setup_window()
 
         self.measurements_path = None
         self.measurements_label = None
+        self.make_preview_updates()
 
         layout = QtWidgets.QVBoxLayout()
         layout.addLayout(self.make_center_frequency_input())
@@ -59,9 +74,80 @@ class InputScreen(QtWidgets.QWidget):
         self.inputreturnloss_text_edit.setText(irl)
         self.outputreturnloss_text_edit.setText(irl)
 
+    def make_preview_updates(self):
+        # (response, text edit, kind of data, sign) of the data fields, see data_parser.check_text
+        self.fields = [(0, self.insertionloss_inband_text_edit, 'percent', -1),
+                       (0, self.insertionloss_outofband_text_edit, 'range', -1),
+                       (1, self.groupdelay_inband_text_edit, 'percent', 1),
+                       (1, self.groupdelay_outofband_text_edit, 'range', 1),
+                       (2, self.inputreturnloss_text_edit, 'range', -1),
+                       (3, self.outputreturnloss_text_edit, 'range', -1)]
+        self.field_values = {}  # text edit: (values, errors) of its text
+        self.changed_fields = set(text_edit for _, text_edit, _, _ in self.fields)
+        self.changed_responses = set(range(len(self.previews)))
+        for _, text_edit, _, _ in self.fields:
+            text_edit.textChanged.connect(lambda text_edit=text_edit: self.schedule_preview(text_edit))
+        for line_edit in [self.center_frequency_line_edit, self.bandwidth_line_edit, self.loss_at_center_line_edit]:
+            line_edit.textChanged.connect(lambda text: self.schedule_preview(None))
+
+        # keystrokes arriving together are shown with a single update
+        self.preview_timer = QtCore.QTimer()
+        self.preview_timer.setSingleShot(True)
+        self.preview_timer.setInterval(150)
+        self.preview_timer.timeout.connect(self.update_previews)
+        self.preview_timer.start()
+
+    def schedule_preview(self, text_edit):
+        """
+        :param text_edit: the data field that changed, None for the center frequency, bandwidth or loss
+        """
+        if text_edit is None:
+            self.changed_responses.update(range(len(self.previews)))
+        else:
+            self.changed_fields.add(text_edit)
+        self.preview_timer.start()
+
+    def update_previews(self):
+        """
+        Parses the fields changed since the last update, marks their incorrect lines and draws the masks of their
+        responses again. Lines are parsed once per text (see data_parser.parse_line), so only the edited lines of a
+        field are parsed again.
+        """
+        for response, text_edit, kind, negative in self.fields:
+            if text_edit in self.changed_fields:
+                self.field_values[text_edit] = data_parser.check_text(text_edit.toPlainText(), negative, kind)
+                mark_errors(text_edit, self.field_values[text_edit][1])
+                self.changed_responses.add(response)
+        self.changed_fields.clear()
+
+        try:
+            center_frequency = int(self.center_frequency_line_edit.text())
+            bandwidth = int(self.bandwidth_line_edit.text())
+            loss_at_center = float(self.loss_at_center_line_edit.text())
+        except ValueError:
+            for preview in self.previews:
+                preview.show_error("Incorrect center frequency, bandwidth or loss at center frequency")
+            return
+        for response in self.changed_responses:
+            values = [self.field_values[text_edit] for index, text_edit, _, _ in self.fields if index == response]
+            errors = ["Line " + str(number + 1) + ": " + message for field_values in values
+                      for number, message in field_values[1]]
+            try:
+                if response < 2:
+                    mask = data_parser.get_mask_insertionloss_groupdelay(
+                        center_frequency, bandwidth, values[0][0], values[1][0],
+                        loss_at_center if response == 0 else None)
+                else:
+                    mask = data_parser.get_mask_returnloss(center_frequency, bandwidth, values[0][0])
+            except (ValueError, IndexError):
+                self.previews[response].show_error("\n".join(errors) or "Incomplete specifications")
+                continue
+            self.previews[response].show_mask(mask, "\n".join(errors))
+        self.changed_responses.clear()
+
     def setup_window(self):
         self.setWindowTitle('Input')
-        self.resize(700, 800)
+        self.resize(1000, 800)
         center_point = QtWidgets.QDesktopWidget().availableGeometry().center()
         qt_rectangle = self.frameGeometry()
         qt_rectangle.moveCenter(center_point)
@@ -87,9 +173,12 @@ class InputScreen(QtWidgets.QWidget):
                 self.load_measurements_button.setText("Remove measurements file")
                 self.measurements_label.setText("Measurements: " + self.measurements_path)
         else:
-            self.load_measurements_button.setText("Load measurements file")
-            self.measurements_path = None
-            self.measurements_label.setText("Measurements: None")
+            self.clear_measurements()
+
+    def clear_measurements(self):
+        self.load_measurements_button.setText("Load measurements file")
+        self.measurements_path = None
+        self.measurements_label.setText("Measurements: None")
 
     def make_center_frequency_input(self):
         box = QtWidgets.QHBoxLayout()
@@ -148,6 +237,7 @@ class InputScreen(QtWidgets.QWidget):
         tab_columns_content = QtWidgets.QHBoxLayout()
         tab_columns_content.addLayout(self.make_insertionloss_inband_input())
         tab_columns_content.addLayout(self.make_insertionloss_outofband_input())
+        tab_columns_content.addWidget(self.previews[0])
         tab_content.addLayout(self.make_loss_at_center_input())
         tab_content.addLayout(tab_columns_content)
         tab.setLayout(tab_content)
@@ -158,26 +248,33 @@ class InputScreen(QtWidgets.QWidget):
         tab_content = QtWidgets.QHBoxLayout()
         tab_content.addLayout(self.make_groupdelay_inband_input())
         tab_content.addLayout(self.make_groupdelay_outofband_input())
+        tab_content.addWidget(self.previews[1])
         tab.setLayout(tab_content)
         return tab
 
     def make_input_return_loss_tab(self):
         tab = QtWidgets.QGroupBox()
-        tab_content = QtWidgets.QVBoxLayout()
-        tab_content.addWidget(QtWidgets.QLabel("Rejection (dB): "), 1, QtCore.Qt.AlignBottom)
+        tab_content = QtWidgets.QHBoxLayout()
+        text_content = QtWidgets.QVBoxLayout()
+        text_content.addWidget(QtWidgets.QLabel("Rejection (dB): "), 1, QtCore.Qt.AlignBottom)
         self.inputreturnloss_text_edit.setMinimumSize(200, 450)
-        tab_content.addWidget(self.inputreturnloss_text_edit, 9, QtCore.Qt.AlignTop)
-        tab_content.setContentsMargins(QtCore.QMargins(30, 0, 30, 0))
+        text_content.addWidget(self.inputreturnloss_text_edit, 9, QtCore.Qt.AlignTop)
+        text_content.setContentsMargins(QtCore.QMargins(30, 0, 30, 0))
+        tab_content.addLayout(text_content)
+        tab_content.addWidget(self.previews[2])
         tab.setLayout(tab_content)
         return tab
 
     def make_output_return_loss_tab(self):
         tab = QtWidgets.QGroupBox()
-        tab_content = QtWidgets.QVBoxLayout()
-        tab_content.addWidget(QtWidgets.QLabel("Rejection (dB): "), 1, QtCore.Qt.AlignBottom)
+        tab_content = QtWidgets.QHBoxLayout()
+        text_content = QtWidgets.QVBoxLayout()
+        text_content.addWidget(QtWidgets.QLabel("Rejection (dB): "), 1, QtCore.Qt.AlignBottom)
         self.outputreturnloss_text_edit.setMinimumSize(200, 450)
-        tab_content.addWidget(self.outputreturnloss_text_edit, 9, QtCore.Qt.AlignTop)
-        tab_content.setContentsMargins(QtCore.QMargins(30, 0, 30, 0))
+        text_content.addWidget(self.outputreturnloss_text_edit, 9, QtCore.Qt.AlignTop)
+        text_content.setContentsMargins(QtCore.QMargins(30, 0, 30, 0))
+        tab_content.addLayout(text_content)
+        tab_content.addWidget(self.previews[3])
         tab.setLayout(tab_content)
         return tab
 
@@ -196,6 +293,22 @@ class InputScreen(QtWidgets.QWidget):
         measurements_file.close()
         return text
 
+    def offer_session_restore(self, autosave_directory):
+        """
+        Offers to continue the session that was closed without saving, if there is one
+        """
+        if not journal.has_session(autosave_directory):
+            return
+        msg_box = QtWidgets.QMessageBox(self)
+        msg_box.setWindowTitle("Restore")
+        msg_box.setText("The previous session was closed without saving.")
+        msg_box.setInformativeText("Do you want to restore it?")
+        msg_box.setStandardButtons(QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No)
+        if msg_box.exec() == QtWidgets.QMessageBox.Yes:
+            self.restore_session.emit(journal.load_session(autosave_directory))
+        else:
+            journal.discard_session(autosave_directory)
+
     def finish(self):
         if self.measurements_path is None:
             measurements_text = []
@@ -220,19 +333,95 @@ class InputScreen(QtWidgets.QWidget):
         self.switch_window.emit(input_data, measurements_text)
 
 
+class MaskPreview(QtWidgets.QWidget):
+    """
+    Small plot of the specifications mask of one response, drawn from the texts of the input screen while they are
+    typed, with the messages of their incorrect lines below
+    """
+
+    def __init__(self, name):
+        QtWidgets.QWidget.__init__(self)
+        figure = Figure(figsize=(3, 3))
+        figure.subplots_adjust(left=0.2, bottom=0.12, right=0.95, top=0.9)
+        self.canvas = FigureCanvasQTAgg(figure)
+        self.axes = figure.add_subplot(111)
+        self.axes.set_title(name, fontsize=9)
+        self.axes.tick_params(labelsize=7)
+        self.line, = self.axes.plot([], [], 'b-')
+        self.message = QtWidgets.QLabel()
+        self.message.setStyleSheet("color: red;")
+        self.message.setWordWrap(True)
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.addWidget(self.canvas, 4)
+        layout.addWidget(self.message, 1, QtCore.Qt.AlignTop)
+        self.setLayout(layout)
+        self.setMinimumWidth(250)
+
+    def show_mask(self, mask, message=""):
+        """
+        :param mask: the spec_mask.SpecMask to draw
+        :param message: errors of the lines left out of the mask
+        """
+        frequencies, specifications = mask.plot()
+        self.line.set_data(frequencies, specifications)
+        self.axes.relim()
+        self.axes.autoscale_view()
+        self.canvas.draw_idle()
+        self.message.setText(message)
+
+    def show_error(self, message):
+        """
+        Shows why there is no mask, keeping the last one drawn
+        """
+        self.message.setText(message)
+
+
+def mark_errors(text_edit, errors):
+    """
+    Highlights the incorrect lines of a text edit
+    :param errors: list of (line number, message)
+    """
+    selections = []
+    for number, _ in errors:
+        selection = QtWidgets.QTextEdit.ExtraSelection()
+        selection.format.setBackground(QtGui.QColor(255, 200, 200))
+        selection.format.setProperty(QtGui.QTextFormat.FullWidthSelection, True)
+        selection.cursor = QtGui.QTextCursor(text_edit.document().findBlockByNumber(number))
+        selections.append(selection)
+    text_edit.setExtraSelections(selections)
+
+
 class GenerateScreen(QtWidgets.QWidget):
     """
     Screen for adjusting and visualizing the frequency response graphs
     """
     switch_window = QtCore.pyqtSignal(object)
 
-    def __init__(self, input_data, measurement_text, conf):
+    def __init__(self, input_data, measurement_text, conf, numerical_data=None):
         QtWidgets.QWidget.__init__(self)
         self.setWindowTitle('Generate S-parameters')
 
         # TODO handle empty inputs
-        if input_data is not None:
-            self.numerical_data = data_parser.make_plot_data(input_data, measurement_text)
+        self.conf = conf
+        self.time_domain_dialog = None
+        if numerical_data is None and input_data is not None:
+            numerical_data = data_parser.make_plot_data(input_data, measurement_text, self.conf.synthesis)
+        self.set_numerical_data(numerical_data)
+        self.make_canvases(conf)
+        self.make_shortcuts()
+
+        layout = QtWidgets.QHBoxLayout()
+        layout.addLayout(self.make_graphs_layout(), 4)
+        layout.addLayout(self.make_tabs_layout(), 1)
+        self.setLayout(layout)
+
+    def set_numerical_data(self, numerical_data):
+        """
+        Sets the design to edit, with its own edit history, journal and save planner
+        """
+        if numerical_data is not None:
+            self.numerical_data = numerical_data
             il = self.numerical_data.insertion_loss
             gd = self.numerical_data.group_delay
             irl = self.numerical_data.input_return_loss
@@ -245,36 +434,70 @@ class GenerateScreen(QtWidgets.QWidget):
             orl = models.GraphData("IL", "dB", [[1, 2, 3, 4], [1, 2, 3, 4]], None)
             self.graph_data_list = [il, gd, irl, orl]
 
-        self.make_canvases(conf)
-
-        layout = QtWidgets.QHBoxLayout()
-        layout.addLayout(self.make_graphs_layout(), 4)
-        layout.addLayout(self.make_tabs_layout(), 1)
-        self.setLayout(layout)
+        self.history = edit_history.EditHistory(self.conf.editor.undo_levels)
+        self.save_planner = save_planner.SavePlanner()
+        self.journal = None
+        if numerical_data is not None:
+            self.journal = journal.Journal(self.conf.autosave.directory, self.numerical_data,
+                                           self.conf.autosave.compaction_interval)
+            self.history.add_listener(self.journal.record)
+
+    def can_load(self):
+        """
+        :return: True if the canvases can show another design, False if the editor configuration changed since
+                 they were made
+        """
+        return self.canvas_settings == (self.conf.editor.backend, self.conf.editor.layout)
+
+    def load(self, input_data, measurement_text, numerical_data=None):
+        """
+        Shows another design on this screen, as a new GenerateScreen would: the canvases keep their figures and
+        widgets and only get the new graphs
+        :raises ValueError: if the input data cannot be parsed, the current design is then left as it was
+        """
+        if numerical_data is None:
+            numerical_data = data_parser.make_plot_data(input_data, measurement_text, self.conf.synthesis)
+        self.set_numerical_data(numerical_data)
+        for canvas, graph_data in zip(self.canvases, self.graph_data_list):
+            canvas.set_graph_data(graph_data, self.history)
+        self.active_tab_index = 0
+        for graph_data in self.graph_data_list:
+            self.update_tab(graph_data)
+        if self.time_domain_dialog is not None:
+            self.time_domain_dialog.numerical_data = self.numerical_data
+            if self.time_domain_dialog.isVisible():
+                self.time_domain_dialog.schedule_refresh()
 
     def make_canvases(self, conf):
-        self.insertion_loss_canvas = response_canvas.ResponseCanvas(self.graph_data_list[0], conf['insertion_loss'])
-        self.insertion_loss_canvas.graph_changed.connect(self.update_tab)
-        self.insertion_loss_canvas.active_tab.connect(self.activate_tab)
-        self.group_delay_canvas = response_canvas.ResponseCanvas(self.graph_data_list[1], conf['group_delay'])
-        self.group_delay_canvas.graph_changed.connect(self.update_tab)
-        self.group_delay_canvas.active_tab.connect(self.activate_tab)
-        self.input_return_loss_canvas = response_canvas.ResponseCanvas(self.graph_data_list[2],
-                                                                       conf['input_return_loss'])
-        self.input_return_loss_canvas.graph_changed.connect(self.update_tab)
-        self.input_return_loss_canvas.active_tab.connect(self.activate_tab)
-        self.output_return_loss_canvas = response_canvas.ResponseCanvas(self.graph_data_list[3],
-                                                                        conf['output_return_loss'])
-        self.output_return_loss_canvas.graph_changed.connect(self.update_tab)
-        self.output_return_loss_canvas.active_tab.connect(self.activate_tab)
+        self.canvas_settings = (conf.editor.backend, conf.editor.layout)
+        self.canvas_widgets, self.canvases = response_editor.make_canvases(
+            conf.editor.backend, conf.editor.layout, self.graph_data_list,
+            [conf.insertion_loss, conf.group_delay, conf.input_return_loss, conf.output_return_loss], self.history)
+        for canvas in self.canvases:
+            canvas.graph_changed.connect(self.update_tab)
+            canvas.active_tab.connect(self.activate_tab)
+        self.insertion_loss_canvas, self.group_delay_canvas, self.input_return_loss_canvas, \
+            self.output_return_loss_canvas = self.canvases
+
+    def make_shortcuts(self):
+        QtWidgets.QShortcut(QtGui.QKeySequence.Undo, self, self.undo)
+        QtWidgets.QShortcut(QtGui.QKeySequence.Redo, self, self.redo)
 
     def make_graphs_layout(self):
         graphs = QtWidgets.QGridLayout()
 
-        graphs.addLayout(self.make_graph(self.insertion_loss_canvas, self.graph_data_list[0].name), 0, 0)
-        graphs.addLayout(self.make_graph(self.group_delay_canvas, self.graph_data_list[1].name), 0, 1)
-        graphs.addLayout(self.make_graph(self.input_return_loss_canvas, self.graph_data_list[2].name), 1, 0)
-        graphs.addLayout(self.make_graph(self.output_return_loss_canvas, self.graph_data_list[3].name), 1, 1)
+        if len(self.canvas_widgets) == 1:
+            # all responses share one figure
+            figure = self.canvas_widgets[0]
+            figure.setFocusPolicy(QtCore.Qt.ClickFocus)
+            figure.setFocus()
+            graphs.addWidget(figure, 0, 0)
+            return graphs
+
+        graphs.addLayout(self.make_graph(self.canvas_widgets[0], self.graph_data_list[0].name), 0, 0)
+        graphs.addLayout(self.make_graph(self.canvas_widgets[1], self.graph_data_list[1].name), 0, 1)
+        graphs.addLayout(self.make_graph(self.canvas_widgets[2], self.graph_data_list[2].name), 1, 0)
+        graphs.addLayout(self.make_graph(self.canvas_widgets[3], self.graph_data_list[3].name), 1, 1)
 
         return graphs
 
@@ -293,6 +516,15 @@ class GenerateScreen(QtWidgets.QWidget):
         panel = QtWidgets.QVBoxLayout()
         button_generate = QtWidgets.QPushButton('Generate')
         button_generate.clicked.connect(self.generate)
+        fit_buttons = QtWidgets.QHBoxLayout()
+        button_fit = QtWidgets.QPushButton('Auto-fit')
+        button_fit.clicked.connect(self.auto_fit)
+        button_fit_all = QtWidgets.QPushButton('Auto-fit all')
+        button_fit_all.clicked.connect(self.auto_fit_all)
+        fit_buttons.addWidget(button_fit)
+        fit_buttons.addWidget(button_fit_all)
+        button_time_domain = QtWidgets.QPushButton('Time domain')
+        button_time_domain.clicked.connect(self.show_time_domain)
 
         self.tabs = QtWidgets.QTabWidget()
         for graph in self.graph_data_list:
@@ -300,6 +532,8 @@ class GenerateScreen(QtWidgets.QWidget):
         self.tabs.setMinimumWidth(510)
 
         panel.addWidget(self.tabs, 19, QtCore.Qt.AlignJustify)
+        panel.addLayout(fit_buttons, 1)
+        panel.addWidget(button_time_domain, 1)
         panel.addWidget(button_generate, 1, QtCore.Qt.AlignVCenter)
         return panel
 
@@ -327,24 +561,83 @@ class GenerateScreen(QtWidgets.QWidget):
         tab.setLayout(tables)
         return tab
 
+    def apply_configuration(self):
+        for canvas in self.canvases:
+            canvas.refresh()
+
     def update_tab(self, graph_data):
-        self.tabs.removeTab(self.active_tab_index)
-        self.tabs.insertTab(self.active_tab_index, self.make_tab(graph_data), graph_data.name)
+        index = self.graph_data_list.index(graph_data)
+        self.tabs.removeTab(index)
+        self.tabs.insertTab(index, self.make_tab(graph_data), graph_data.name)
         self.tabs.setCurrentIndex(self.active_tab_index)
+        if self.time_domain_dialog is not None and self.time_domain_dialog.isVisible():
+            self.time_domain_dialog.schedule_refresh()
+
+    def show_time_domain(self):
+        if self.time_domain_dialog is None:
+            self.time_domain_dialog = TimeDomainDialog(self.numerical_data, self.conf.touchstone,
+                                                       self.conf.timedomain, self)
+        self.time_domain_dialog.refresh()
+        self.time_domain_dialog.show()
+
+    def auto_fit(self):
+        self.apply_fits([self.graph_data_list[self.active_tab_index]])
+
+    def auto_fit_all(self):
+        self.apply_fits(self.graph_data_list)
+
+    def apply_fits(self, graph_datas):
+        """
+        Replaces the measurements of the graphs with the ones fitted to their specifications, as one undoable edit each
+        """
+        settings = []
+        for graph_data in graph_datas:
+            conf = self.canvases[self.graph_data_list.index(graph_data)].conf
+            settings.append((conf.autofit_margin, conf.autofit_smoothness, conf.autofit_frequencies,
+                             conf.compliance_grid_size))
+        fits = autofit.fit_graphs(graph_datas, settings)
+        for graph_data, (fitted_x, fitted_y) in zip(graph_datas, fits):
+            index = np.arange(len(fitted_x))
+            old_x, old_y = edit_history.point_values(graph_data, '_line1', index)
+            if not edit_history.move_points(graph_data, '_line1', index, fitted_x, fitted_y):
+                continue
+            self.history.record(graph_data, '_line1', index, old_x, old_y, fitted_x, fitted_y)
+            self.canvases[self.graph_data_list.index(graph_data)].refresh()
+            self.update_tab(graph_data)
+
+    def undo(self):
+        self.show_history_changes([self.history.undo()])
+
+    def redo(self):
+        self.show_history_changes([self.history.redo()])
+
+    def jump_to_revision(self, revision):
+        self.show_history_changes(self.history.jump_to(revision))
+
+    def show_history_changes(self, deltas):
+        changed = []
+        for delta in deltas:
+            if delta is not None and delta[0] not in changed:
+                changed.append(delta[0])
+        for graph_data in changed:
+            self.canvases[self.graph_data_list.index(graph_data)].refresh()
+            self.activate_tab(graph_data.name)
+            self.update_tab(graph_data)
 
     def activate_tab(self, name):
-        tabs_list = ["Insertion Loss", "Group Delay", "Input Return Loss", "Output Return Loss"]
-        self.active_tab_index = tabs_list.index(name)
+        self.active_tab_index = RESPONSE_NAMES.index(name)
         self.tabs.setCurrentIndex(self.active_tab_index)
 
     def closeEvent(self, event):
         msg_box = QtWidgets.QMessageBox()
         msg_box.setWindowTitle("Quit")
         msg_box.setText("Are you sure you want to quit application?")
-        msg_box.setInformativeText("Data will not be saved.")
+        msg_box.setInformativeText("Data will not be saved, but it can be restored at the next start.")
         msg_box.setStandardButtons(QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No)
         button_reply = msg_box.exec()
         if button_reply == QtWidgets.QMessageBox.Yes:
+            if self.journal is not None:
+                self.journal.close()
             event.accept()
         else:
             event.ignore()
@@ -358,6 +651,58 @@ class GenerateScreen(QtWidgets.QWidget):
         self.switch_window.emit(self.numerical_data)
 
 
+class TimeDomainDialog(QtWidgets.QDialog):
+    """
+    Live preview of the impulse and step responses of S21 and S11, computed from the graphs being edited
+    The losses and phases entered when saving only scale the responses and are left out of the preview.
+    """
+
+    def __init__(self, numerical_data, touchstone_conf, conf, parent=None):
+        super(TimeDomainDialog, self).__init__(parent)
+        self.setWindowTitle("Time domain")
+        self.numerical_data = numerical_data
+        self.touchstone_conf = touchstone_conf
+        self.conf = conf
+
+        figure = Figure()
+        self.canvas = FigureCanvasQTAgg(figure)
+        self.impulse_axes, self.step_axes = figure.subplots(2, 1, sharex=True)
+        self.impulse_axes.set_ylabel('Impulse')
+        self.step_axes.set_ylabel('Step')
+        self.step_axes.set_xlabel('Time(ns)')
+        self.s21_impulse, = self.impulse_axes.plot([], [], 'b-', label='S21')
+        self.s11_impulse, = self.impulse_axes.plot([], [], 'r-', label='S11')
+        self.s21_step, = self.step_axes.plot([], [], 'b-', label='S21')
+        self.s11_step, = self.step_axes.plot([], [], 'r-', label='S11')
+        self.impulse_axes.legend(loc='upper right')
+
+        # edits arriving together are shown with a single computation
+        self.timer = QtCore.QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.refresh)
+
+        layout = QtWidgets.QVBoxLayout()
+        layout.addWidget(self.canvas)
+        self.setLayout(layout)
+        self.resize(800, 600)
+
+    def schedule_refresh(self):
+        self.timer.start()
+
+    def refresh(self):
+        sparams_data = models.SparamsData(self.numerical_data, 0, 0, 0, "", "", self.touchstone_conf)
+        responses = timedomain.compute_time_domain(sparams_data.compute_columns(), self.conf.window_beta,
+                                                   self.conf.oversampling)
+        shown = responses[responses[:, 0] <= self.conf.time_span]
+        for line, column in [(self.s21_impulse, 1), (self.s21_step, 2), (self.s11_impulse, 3), (self.s11_step, 4)]:
+            line.set_data(shown[:, 0], shown[:, column])
+        for axes in [self.impulse_axes, self.step_axes]:
+            axes.relim()
+            axes.autoscale_view()
+        self.canvas.draw_idle()
+
+
 class SaveScreen(QtWidgets.QDialog):
     """
     Screen for generating the output and writing it to disk
@@ -367,11 +712,16 @@ class SaveScreen(QtWidgets.QDialog):
     restart_signal = QtCore.pyqtSignal()
     cancel_signal = QtCore.pyqtSignal()
 
-    def __init__(self, numerical_data, conf, parent=None):
+    def __init__(self, numerical_data, conf, sweep_conf, montecarlo_conf, timedomain_conf, planner=None, parent=None):
         super(SaveScreen, self).__init__(parent)
         self.setWindowTitle("Save S-parameters and response")
         self.numerical_data = numerical_data
+        # kept by the generate screen across saves, so unchanged outputs are not written again
+        self.planner = save_planner.SavePlanner() if planner is None else planner
         self.conf = conf
+        self.sweep_conf = sweep_conf
+        self.montecarlo_conf = montecarlo_conf
+        self.timedomain_conf = timedomain_conf
         layout = QtWidgets.QVBoxLayout()
 
         self.filter_name_line_edit = QtWidgets.QLineEdit()
@@ -386,12 +736,17 @@ class SaveScreen(QtWidgets.QDialog):
         self.save_and_reset_button = QtWidgets.QPushButton("Save and Reset")
         self.save_and_close_button = QtWidgets.QPushButton("Save and Close")
         self.save_and_continue_button = QtWidgets.QPushButton("Save and Continue")
+        self.save_sweep_button = QtWidgets.QPushButton("Save sweep")
+        self.save_montecarlo_button = QtWidgets.QPushButton("Save Monte-Carlo")
+        self.status = QtWidgets.QLabel()
+        self.status.setWordWrap(True)
 
         layout.addLayout(self.make_filter_name_layout(), 1)
         layout.addLayout(self.make_symmetry_layout(), 1)
         layout.addLayout(self.make_params_layout(), 1)
         layout.addLayout(self.make_path_layout(), 1)
         layout.addLayout(self.make_buttons_layout(), 1)
+        layout.addWidget(self.status, 1, QtCore.Qt.AlignCenter)
 
         self.set_debug_text()
         self.setLayout(layout)
@@ -493,6 +848,8 @@ class SaveScreen(QtWidgets.QDialog):
                 self.save_and_close_button.setDisabled(False)
                 self.save_and_reset_button.setDisabled(False)
                 self.save_and_continue_button.setDisabled(False)
+                self.save_sweep_button.setDisabled(False)
+                self.save_montecarlo_button.setDisabled(False)
 
     def make_buttons_layout(self):
         box = QtWidgets.QHBoxLayout()
@@ -503,12 +860,18 @@ class SaveScreen(QtWidgets.QDialog):
         self.save_and_reset_button.setDisabled(True)
         self.save_and_continue_button.clicked.connect(self.save_and_continue)
         self.save_and_continue_button.setDisabled(True)
+        self.save_sweep_button.clicked.connect(self.save_sweep)
+        self.save_sweep_button.setDisabled(True)
+        self.save_montecarlo_button.clicked.connect(self.save_montecarlo)
+        self.save_montecarlo_button.setDisabled(True)
         cancel = QtWidgets.QPushButton("Cancel")
         cancel.clicked.connect(self.cancel)
 
         box.addWidget(self.save_and_close_button, 1, QtCore.Qt.AlignCenter)
         box.addWidget(self.save_and_reset_button, 1, QtCore.Qt.AlignCenter)
         box.addWidget(self.save_and_continue_button, 1, QtCore.Qt.AlignCenter)
+        box.addWidget(self.save_sweep_button, 1, QtCore.Qt.AlignCenter)
+        box.addWidget(self.save_montecarlo_button, 1, QtCore.Qt.AlignCenter)
         box.addWidget(cancel, 1, QtCore.Qt.AlignCenter)
 
         return box
@@ -528,31 +891,84 @@ class SaveScreen(QtWidgets.QDialog):
     def cancel(self):
         self.cancel_signal.emit()
 
+    def save_sweep(self):
+        self.filter_name = self.filter_name_line_edit.text()
+        try:
+            variants = sweep.make_variants(**{name: getattr(self.sweep_conf, name) for name in sweep.PARAMETERS})
+        except ValueError as error:
+            QtWidgets.QMessageBox.warning(self, "Save sweep", str(error))
+            return
+        locations = sweep.save_sweep(self.make_sparams_data(), variants, self.path, self.filter_name,
+                                     self.sweep_conf.container, self.make_writer())
+        self.status.setText("Saved " + str(len(variants)) + " variants to " + ", ".join(locations[:3]) +
+                            (", ..." if len(locations) > 3 else ""))
+
+    def save_montecarlo(self):
+        self.filter_name = self.filter_name_line_edit.text()
+        conf = self.montecarlo_conf
+        distributions = {name: getattr(conf, name) for name in montecarlo.PERTURBATIONS}
+        try:
+            montecarlo.save_montecarlo(self.make_sparams_data(), self.path, self.filter_name, conf.samples, conf.seed,
+                                       distributions, conf.ripple_period, conf.percentiles, conf.batch_size,
+                                       writer=self.make_writer())
+        except ValueError as error:
+            QtWidgets.QMessageBox.warning(self, "Save Monte-Carlo", str(error))
+            return
+        self.status.setText("Saved " + str(conf.samples) + " Monte-Carlo samples and their statistics to " + self.path)
+
     def save_data(self):
         self.filter_name = self.filter_name_line_edit.text()
         self.save_responses()
 
+        sparams_data = self.make_sparams_data()
+        sparams_key = save_planner.sparams_key(sparams_data, self.filter_name)
+        s_params_location = self.path + "/" + self.filter_name + "-sparams.s2p"
+        time_location = self.path + "/" + self.filter_name + timedomain.FILE_SUFFIX
+        time_key = (sparams_key, self.timedomain_conf.window_beta, self.timedomain_conf.oversampling)
+        write_sparams = self.planner.needs_writing(s_params_location, sparams_key)
+        write_time = self.timedomain_conf.export and self.planner.needs_writing(time_location, time_key)
+        if not write_sparams and not write_time:
+            self.status.setText(self.filter_name + ": S-parameters unchanged, not written again")
+            return
+        columns = self.planner.columns(sparams_data)
+        if write_sparams:
+            checked_columns, report = pipeline.check_columns(columns, self.conf.passivity)
+            self.planner.wrote(s_params_location, sparams_key, self.save_sparams(checked_columns))
+            if report is not None:
+                self.status.setText(self.filter_name + ": " + report.describe())
+                # written as they are when only checked, which the user must see even if the screen closes
+                if self.conf.passivity == 'check' and not report.is_passive():
+                    QtWidgets.QMessageBox.warning(self, "Passivity", self.filter_name + ": " + report.describe())
+        if write_time:
+            timedomain.write_time_domain(columns, time_location, self.timedomain_conf.window_beta,
+                                         self.timedomain_conf.oversampling)
+            self.planner.wrote(time_location, time_key)
+
+    def make_sparams_data(self):
         absolute_losses = self.absolute_losses.text()
         ang_s11 = self.ang_s11_line_edit.text()
         ang_s22 = self.ang_s22_line_edit.text()
         mag_s12 = self.mag_s12_line_edit.text()
         ang_s12 = self.ang_s12_line_edit.text()
-        sparams_data = models.SparamsData(self.numerical_data, absolute_losses, ang_s11, ang_s22, mag_s12, ang_s12,
-                                          self.conf)
-        sparams_lines = sparams_data.compute_parameters()
-        self.save_sparams(sparams_lines)
+        return models.SparamsData(self.numerical_data, absolute_losses, ang_s11, ang_s22, mag_s12, ang_s12, self.conf)
 
     def save_responses(self):
         real_location = self.path + "/" + self.filter_name + "-real.txt"
-        real_file = open(real_location, "w")
-        self.write_real(real_file)
-        real_file.close()
+        real_key = save_planner.measurements_key(self.numerical_data)
+        if self.planner.needs_writing(real_location, real_key):
+            real_file = open(real_location, "w")
+            self.write_real(real_file)
+            real_file.close()
+            self.planner.wrote(real_location, real_key)
 
         ideal_location = self.path + "/" + self.filter_name + "-ideal.txt"
-        ideal_file = open(ideal_location, "w")
-        ideal_text_data = data_parser.make_text_data(self.numerical_data)
-        ideal_file.write("\n".join(ideal_text_data))
-        ideal_file.close()
+        ideal_key = save_planner.specifications_key(self.numerical_data)
+        if self.planner.needs_writing(ideal_location, ideal_key):
+            ideal_file = open(ideal_location, "w")
+            ideal_text_data = data_parser.make_text_data(self.numerical_data)
+            ideal_file.write("\n".join(ideal_text_data))
+            ideal_file.close()
+            self.planner.wrote(ideal_location, ideal_key)
 
     def write_real(self, real_file):
         real_file.write(" ".join([str(elem) for elem in self.numerical_data.insertion_loss.measurements_x]) + "\n")
@@ -564,14 +980,9 @@ class SaveScreen(QtWidgets.QDialog):
         real_file.write(" ".join([str(elem) for elem in self.numerical_data.output_return_loss.measurements_x]) + "\n")
         real_file.write(" ".join([str(elem) for elem in self.numerical_data.output_return_loss.measurements_y]) + "\n")
 
-    def save_sparams(self, lines):
+    def save_sparams(self, columns):
         s_params_location = self.path + "/" + self.filter_name + "-sparams.s2p"
-        s_params_file = open(s_params_location, "w")
-
-        s_params_file.write("! Date & Time: " + str(datetime.now()) + "\n")
-        s_params_file.write("! Filter name: " + self.filter_name + "\n")
-        s_params_file.write("# Mhz S DB R 50\n")
-        s_params_file.write("! Frequency dB(S11) ang(S11) dB(S21) ang(S21) dB(S12) ang(S12) dB(S22) ang(S22)\n")
-        s_params_file.write("\n".join(lines))
+        return self.make_writer().write(s_params_location, self.filter_name, columns)
 
-        s_params_file.close()
+    def make_writer(self):
+        return pipeline.make_writer(self.conf)
@@ -0,0 +1,282 @@
+import asyncio
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import io
+import json
+import os
+import time
+import pipeline
+
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+CLIENT_ERRORS = (ValueError, TypeError, IndexError)
+MIN_NUMBER_OF_LINES = 2  # as for number_of_lines in [touchstone]
+
+worker_conf = None
+worker_synthesis_conf = None
+worker_kinds = None
+
+
+def start_worker(conf, synthesis_conf=None, kinds=None):
+    """
+    Initializer of the worker processes: keeps the configuration and runs one small generation, so numpy, scipy
+    and the models are imported and warm before the first request arrives
+    :param conf: the TouchstoneConfiguration
+    :param synthesis_conf: the SynthesisConfiguration of the measurements generated for requests without any
+    :param kinds: interpolation of each response, see pipeline.prepare
+    """
+    global worker_conf, worker_synthesis_conf, worker_kinds
+    worker_conf = conf
+    worker_synthesis_conf = synthesis_conf
+    worker_kinds = kinds
+    out_of_band = "0.5 - 0.8 -40\n1.2 - 1.5 -40"
+    specification = {'center_frequency': 1000, 'bandwidth': 100, 'loss_at_center': -1,
+                     'insertion_loss_inband': "50% -1\n100% -3", 'insertion_loss_outofband': out_of_band,
+                     'group_delay_inband': "50% 2\n100% 6", 'group_delay_outofband': "0.5 - 0.8 10\n1.2 - 1.5 10",
+                     'input_return_loss': out_of_band, 'output_return_loss': out_of_band}
+    generate({'specification': specification})
+
+
+def generate(request):
+    """
+    Generates the S-parameters of one request, in a worker process
+    The response is encoded here, so the event loop only forwards bytes.
+    :param request: dictionary with
+        - specification: the texts of the input screen, see pipeline.SPECIFICATION_FIELDS
+        - measurements: optional lines of a measurements (-real.txt) file
+        - outputs: optional save screen values, see pipeline.OUTPUT_FIELDS
+        - number_of_lines: optional size of the frequency grid
+        - format: 'columns' (default) for the touchstone columns as numbers, 'touchstone' for the file text
+    :return: JSON encoded response body
+    """
+    conf = worker_conf
+    if 'number_of_lines' in request:
+        conf = copy_section(conf, number_of_lines=int(request['number_of_lines']))
+    numerical_data = pipeline.make_numerical_data(request['specification'], request.get('measurements', ()),
+                                                  worker_synthesis_conf, worker_kinds)
+    sparams_data = pipeline.make_sparams_data(numerical_data, conf, request.get('outputs'))
+    columns, report = pipeline.compute_columns(sparams_data, conf.passivity)
+    response = {'passivity': None if report is None else report.describe()}
+    if request.get('format', 'columns') == 'touchstone':
+        text = io.StringIO()
+        pipeline.make_writer(conf).write_stream(text, str(request.get('name', 'filter')), columns)
+        response['touchstone'] = text.getvalue()
+    else:
+        response['columns'] = columns.tolist()
+    return json.dumps(response).encode()
+
+
+def copy_section(section, **values):
+    """
+    :return: a copy of a configuration section with some values replaced
+    """
+    copy = object.__new__(type(section))
+    copy.update({key: getattr(section, key) for key in section.__slots__})
+    copy.update(values)
+    return copy
+
+
+class RequestMetrics:
+    """
+    Counts and times the requests of each route; latencies of the most recent requests give the percentiles
+    """
+
+    def __init__(self, window=1000):
+        self.window = window
+        self.routes = {}
+        self.deduplicated = 0
+        self.started = time.time()
+
+    def record(self, route, status, latency):
+        if route not in self.routes:
+            self.routes[route] = {'requests': 0, 'errors': 0, 'latencies': deque(maxlen=self.window)}
+        metrics = self.routes[route]
+        metrics['requests'] += 1
+        if status >= 400:
+            metrics['errors'] += 1
+        metrics['latencies'].append(latency)
+
+    def report(self, in_flight):
+        """
+        :return: dictionary of the metrics, latencies in ms
+        """
+        routes = {}
+        for route, metrics in self.routes.items():
+            latencies = sorted(metrics['latencies'])
+            routes[route] = {'requests': metrics['requests'], 'errors': metrics['errors'],
+                             'mean_ms': 1e3 * sum(latencies) / len(latencies),
+                             'p50_ms': 1e3 * latencies[len(latencies) // 2],
+                             'p95_ms': 1e3 * latencies[min(int(len(latencies) * 0.95), len(latencies) - 1)],
+                             'max_ms': 1e3 * latencies[-1]}
+        return {'uptime_s': time.time() - self.started, 'in_flight': in_flight, 'deduplicated': self.deduplicated,
+                'routes': routes}
+
+
+class GenerationService:
+    """
+    Local HTTP/JSON front end of the generation pipeline
+        - POST /generate: generates the S-parameters of a JSON request, see generate
+        - GET /metrics: request counts and latencies per route
+        - GET /health: answers as soon as the service accepts requests
+    The event loop only parses requests and forwards responses; generation runs in a pool of processes started
+    once and kept warm. Identical requests arriving while one of them is being generated share its result.
+    """
+
+    def __init__(self, conf, service_conf, synthesis_conf=None, kinds=None):
+        """
+        :param conf: the TouchstoneConfiguration
+        :param service_conf: the ServiceConfiguration
+        :param synthesis_conf: the SynthesisConfiguration of the measurements generated for requests without any
+        :param kinds: interpolation of each response, see pipeline.prepare
+        """
+        self.conf = conf
+        self.service_conf = service_conf
+        self.synthesis_conf = synthesis_conf
+        self.kinds = kinds
+        self.executor = None
+        self.server = None
+        self.in_flight = {}
+        self.connections = set()
+        self.metrics = RequestMetrics()
+
+    async def start(self, host=None, port=None):
+        """
+        Starts the workers and listens for connections
+        :param port: port to listen on, 0 for any free port. Defaults to the configured one
+        :return: the (host, port) the service listens on
+        """
+        workers = self.service_conf.workers or os.cpu_count()
+        self.executor = ProcessPoolExecutor(workers, initializer=start_worker,
+                                            initargs=(self.conf, self.synthesis_conf, self.kinds))
+        # start all workers now, not on the first requests
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.executor, time.sleep, 0) for _ in range(workers)])
+        self.server = await asyncio.start_server(self.handle_connection,
+                                                 self.service_conf.host if host is None else host,
+                                                 self.service_conf.port if port is None else port)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            # idle keep-alive connections would keep the server open
+            for writer in list(self.connections):
+                writer.close()
+            await self.server.wait_closed()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+    async def handle_connection(self, reader, writer):
+        """
+        Serves the requests of one connection until the client closes it or asks to
+        """
+        self.connections.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                started = time.perf_counter()
+                method, path = request_line.decode('latin-1').split()[:2]
+                length = int(headers.get('content-length', 0))
+                if length > self.service_conf.max_request_size:
+                    status, body = 413, error_body("Request larger than " + str(self.service_conf.max_request_size)
+                                                   + " bytes")
+                    keep_alive = False
+                else:
+                    status, body = await self.route(method, path, await reader.readexactly(length))
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+                self.metrics.record(method + " " + path, status, time.perf_counter() - started)
+                writer.write(("HTTP/1.1 " + str(status) + " " + REASONS[status] + "\r\n"
+                              "Content-Type: application/json\r\n"
+                              "Content-Length: " + str(len(body)) + "\r\n"
+                              "Connection: " + ("keep-alive" if keep_alive else "close") + "\r\n\r\n").encode())
+                writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    async def route(self, method, path, body):
+        """
+        :return: (status, response body)
+        """
+        if path == '/generate':
+            if method != 'POST':
+                return 405, error_body("Use POST")
+            try:
+                return 200, await self.generate(json.loads(body))
+            except KeyError as error:
+                return 400, error_body("Missing " + str(error))
+            except CLIENT_ERRORS as error:
+                return 400, error_body(str(error))
+            except Exception as error:
+                return 500, error_body(repr(error))
+        if path == '/metrics' or path == '/health':
+            if method != 'GET':
+                return 405, error_body("Use GET")
+            if path == '/health':
+                return 200, b'{"status": "ok"}'
+            return 200, json.dumps(self.metrics.report(len(self.in_flight))).encode()
+        return 404, error_body("Unknown path " + path)
+
+    async def generate(self, request):
+        """
+        Generates a request in a worker, or waits for the identical request already being generated
+        :return: JSON encoded response body
+        :raises ValueError: if the number of lines is out of the configured bounds
+        """
+        if 'number_of_lines' in request:
+            # checked here, so a bad value never reaches the workers
+            number_of_lines = int(request['number_of_lines'])
+            if not MIN_NUMBER_OF_LINES <= number_of_lines <= self.service_conf.max_number_of_lines:
+                raise ValueError("number_of_lines must be between " + str(MIN_NUMBER_OF_LINES) + " and " +
+                                 str(self.service_conf.max_number_of_lines))
+            request['number_of_lines'] = number_of_lines
+        key = hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+        future = self.in_flight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, generate, request)
+            self.in_flight[key] = future
+            future.add_done_callback(lambda done: self.in_flight.pop(key, None))
+        else:
+            self.metrics.deduplicated += 1
+        # a client going away does not cancel the generation shared with others
+        return await asyncio.shield(future)
+
+
+def error_body(message):
+    return json.dumps({'error': message}).encode()
+
+
+def serve(conf, host=None, port=None):
+    """
+    Runs the service until interrupted
+    :param conf: the Configuration
+    """
+    async def run():
+        service = GenerationService(conf.touchstone, conf.service, conf.synthesis,
+                                    pipeline.interpolation_kinds(conf))
+        address = await service.start(host, port)
+        print("Serving S-parameter generation on http://" + address[0] + ":" + str(address[1]))
+        try:
+            await service.server.serve_forever()
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
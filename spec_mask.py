@@ -0,0 +1,206 @@
+import numpy as np
+
+RANGE = 0  # out of band range, given in Ghz
+PERCENT = 1  # in band step, given in percents of the bandwidth
+CENTER = 2  # single point at the center frequency
+STEP = 0.001  # Mhz between the end of a step and the start of the next one
+SEGMENT_DTYPE = np.dtype([('f_start', np.float64), ('f_stop', np.float64), ('limit', np.float64), ('kind', np.int8)])
+
+
+class SpecMask:
+    """
+    Specifications of a response as a record array of constant segments sorted by frequency
+        - segments: records (f_start, f_stop, limit, kind), frequencies in Mhz
+        - points: number of plot points of each segment, 2 for a step and 1 for a single point
+        - center: index of the first segment at the center frequency or above it
+    The plot vectors edited by the canvases are derived from the segments. Every plot point belongs to a known
+    segment, so the segments are read back from edited vectors by indexing, without searching for frequencies.
+    Below the center a segment is read from its start point, above the center from its stop point, the points
+    that the text format keeps.
+    """
+
+    __slots__ = ('segments', 'points', 'center', 'center_frequency', 'bandwidth', 'loss_at_center')
+
+    def __init__(self, segments, points, center, center_frequency, bandwidth, loss_at_center=None):
+        self.segments = segments.view(np.recarray)
+        self.points = np.asarray(points, dtype=np.int64)
+        self.center = center
+        self.center_frequency = center_frequency
+        self.bandwidth = bandwidth
+        self.loss_at_center = loss_at_center
+
+    def point_indices(self):
+        """
+        :return: (starts, stops) index of the plot point at the start and at the stop of every segment
+        """
+        stops = np.cumsum(self.points) - 1
+        return stops - self.points + 1, stops
+
+    def plot(self):
+        """
+        :return: (frequencies, specifications) plot vectors of the mask
+        """
+        starts, stops = self.point_indices()
+        frequencies = np.empty(np.sum(self.points))
+        specifications = np.empty(len(frequencies))
+        frequencies[starts] = self.segments.f_start
+        frequencies[stops] = self.segments.f_stop
+        specifications[starts] = self.segments.limit
+        specifications[stops] = self.segments.limit
+        return frequencies, specifications
+
+    def read_plot(self, frequencies, specifications):
+        """
+        :return: the SpecMask of plot vectors derived from this mask and edited since
+        """
+        starts, stops = self.point_indices()
+        segments = self.segments.copy()
+        segments.f_start = frequencies[starts]
+        segments.f_stop = frequencies[stops]
+        segments.limit = np.where(np.arange(len(segments)) < self.center, specifications[starts],
+                                  specifications[stops])
+        return SpecMask(segments, self.points, self.center, self.center_frequency, self.bandwidth,
+                        self.loss_at_center)
+
+    def layout(self):
+        """
+        :return: what read_plot needs besides the plot vectors, as plain lists
+        """
+        return {'kinds': self.segments.kind.tolist(), 'points': self.points.tolist(), 'center': self.center}
+
+    def range_contents(self):
+        """
+        :return: list of ((start, stop), limit) out of band ranges, frequencies in Ghz, as in the input text
+        """
+        segments = self.segments
+        below = np.arange(len(segments)) < self.center
+        lower = segments[(segments.kind == RANGE) & below]
+        upper = segments[(segments.kind == RANGE) & ~below]
+        # ranges below the center keep their start and end at the next range, ranges above the center keep
+        # their end and start at the previous range
+        lower_start = to_ghz(lower.f_start)
+        lower_stop = np.append(lower_start[1:], (self.center_frequency - self.bandwidth) / 1000)
+        upper_stop = to_ghz(upper.f_stop)
+        upper_start = np.insert(upper_stop[:-1], 0, (self.center_frequency + self.bandwidth) / 1000)
+        starts = np.concatenate((lower_start, upper_start)).tolist()
+        stops = np.concatenate((lower_stop, upper_stop)).tolist()
+        limits = np.concatenate((lower.limit, upper.limit)).tolist()
+        return [((start, stop), limit) for start, stop, limit in zip(starts, stops, limits)]
+
+    def percent_contents(self):
+        """
+        :return: list of (percent, rejection) in band steps by increasing percent, as in the input text.
+                 The loss at center frequency is taken out of the rejections up to 100%
+        """
+        segments = self.segments
+        lower = segments[(segments.kind == PERCENT) & (np.arange(len(segments)) < self.center)][::-1]
+        percents = np.rint((self.center_frequency - lower.f_start) * 200 / self.bandwidth).astype(np.int64)
+        rejections = lower.limit
+        if self.loss_at_center is not None:
+            offsets = np.where(percents <= 100, self.loss_at_center, 0)
+            rejections = shortest_decimals(rejections, rejections - offsets, lambda rejection: rejection + offsets)
+        return list(zip(percents.tolist(), rejections.tolist()))
+
+
+def make_mask(center_frequency, bandwidth, ranges, range_limits, percents=None, percent_limits=None,
+              loss_at_center=None):
+    """
+    Builds the mask of a response from its parsed input text
+    :param ranges: array of (start, end) Mhz of the out of band ranges, in the order of the text. Only the start of
+                   the ranges starting below the center frequency is used, and only the end of the others and of
+                   the last range
+    :param range_limits: limit of each range
+    :param percents: in band percents of the bandwidth in increasing order, None for a mask without in band steps
+    :param percent_limits: rejection of each in band step
+    :param loss_at_center: added to the in band rejections up to 100%, None if there is none
+    """
+    ranges = np.asarray(ranges, dtype=np.float64).reshape(-1, 2)
+    range_limits = np.asarray(range_limits, dtype=np.float64)
+    below = np.zeros(len(ranges), dtype=bool)
+    below[:-1] = ranges[:-1, 0] < center_frequency
+    lower = np.flatnonzero(below)
+    upper = np.flatnonzero(~below)
+
+    parts = []
+    if percents is None:
+        inner_start = outer_stop = center_frequency
+    else:
+        percents = np.asarray(percents, dtype=np.float64)
+        rejections = np.array(percent_limits, dtype=np.float64)
+        center_limit = 0
+        if loss_at_center is not None:
+            center_limit = loss_at_center + rejections[0]
+            rejections[percents <= 100] += loss_at_center
+        plus = center_frequency + percents / 200 * bandwidth
+        minus = center_frequency - percents / 200 * bandwidth
+        inner_start, outer_stop = minus[-1], plus[-1]
+        # each side: a step per percent, the innermost ones being single points next to the center
+        parts.append(make_segments(minus[:0:-1], minus[-2::-1] - STEP, rejections[:0:-1], PERCENT))
+        parts.append(make_segments(minus[:1], minus[:1], rejections[:1], PERCENT, 1))
+        parts.append(make_segments([center_frequency], [center_frequency], [center_limit], CENTER, 1))
+        parts.append(make_segments(plus[:1], plus[:1], rejections[:1], PERCENT, 1))
+        parts.append(make_segments(plus[:-1] + STEP, plus[1:], rejections[1:], PERCENT))
+
+    # a range below the center ends just before the next range or the in band steps, a range above the center
+    # starts just after the previous range or the in band steps
+    lower_stop = np.append(ranges[lower[:-1] + 1, 0], inner_start)[:len(lower)] - STEP
+    parts.insert(0, make_segments(ranges[lower, 0], lower_stop, range_limits[lower], RANGE))
+    upper_start = np.insert(ranges[upper[:-1], 1], 0, outer_stop)[:len(upper)] + STEP
+    if percents is None:
+        upper_start[:1] = center_frequency
+    parts.append(make_segments(upper_start, ranges[upper, 1], range_limits[upper], RANGE))
+
+    segments = np.concatenate([segments for segments, points in parts])
+    points = np.concatenate([points for segments, points in parts])
+    center = len(lower) + (0 if percents is None else len(percents))
+    return SpecMask(segments, points, center, center_frequency, bandwidth, loss_at_center)
+
+
+def make_segments(starts, stops, limits, kind, points=2):
+    """
+    :return: (segments, points) records of segments of one kind and their numbers of plot points
+    """
+    segments = np.empty(len(limits), dtype=SEGMENT_DTYPE)
+    segments['f_start'] = starts
+    segments['f_stop'] = stops
+    segments['limit'] = limits
+    segments['kind'] = kind
+    return segments, np.full(len(limits), points, dtype=np.int64)
+
+
+def from_layout(frequencies, specifications, layout, center_frequency, bandwidth, loss_at_center=None):
+    """
+    Rebuilds the mask of plot vectors from its layout, see SpecMask.layout
+    """
+    segments = np.zeros(len(layout['kinds']), dtype=SEGMENT_DTYPE)
+    segments['kind'] = layout['kinds']
+    mask = SpecMask(segments, layout['points'], layout['center'], center_frequency, bandwidth, loss_at_center)
+    return mask.read_plot(np.asarray(frequencies, dtype=np.float64), np.asarray(specifications, dtype=np.float64))
+
+
+def to_ghz(frequencies):
+    """
+    :return: the frequencies in Ghz, with the fewest decimals that give back the same Mhz when parsed
+    """
+    return shortest_decimals(frequencies, frequencies / 1000, lambda ghz: ghz * 1000)
+
+
+def shortest_decimals(targets, estimates, restore):
+    """
+    Rounds every estimate to the fewest decimals for which restore gives back its target exactly, so values written
+    as text are read back identical. Estimates that no rounding restores are kept as they are.
+    :param targets: the values to get back
+    :param estimates: the values to write, approximately
+    :param restore: vectorized function computing the targets from values read
+    """
+    estimates = np.asarray(estimates, dtype=np.float64)
+    result = estimates.copy()
+    pending = np.ones(len(estimates), dtype=bool)
+    for decimals in range(17):
+        candidates = np.round(estimates, decimals)
+        found = pending & (restore(candidates) == targets)
+        result[found] = candidates[found]
+        pending &= ~found
+        if not pending.any():
+            break
+    return result
@@ -0,0 +1,91 @@
+import os
+import numpy as np
+import pipeline
+import touchstone
+
+PARAMETERS = ('center_shift', 'loss_offset', 's11_phase', 's22_phase', 'stretch')
+NOMINAL = {'center_shift': 0.0, 'loss_offset': 0.0, 's11_phase': 0.0, 's22_phase': 0.0, 'stretch': 1.0}
+INDEX_SUFFIX = '-sweep.txt'
+
+
+def make_variants(**ranges):
+    """
+    Builds every combination of the given parameter values
+    :param ranges: values of each parameter in PARAMETERS, missing parameters keep their nominal value
+        - center_shift: shift (Mhz) of the responses along the frequency axis
+        - loss_offset: losses (dB) added to the absolute losses
+        - s11_phase, s22_phase: offsets (°) added to the S11 and S22 phases
+        - stretch: factor stretching the responses around the shifted center frequency, e.g. temperature drift
+    :return: record array with one variant per element and one field per parameter
+    """
+    for name in ranges:
+        if name not in NOMINAL:
+            raise ValueError("Unknown sweep parameter " + name)
+    values = [np.atleast_1d(np.asarray(ranges.get(name, NOMINAL[name]), dtype=float)) for name in PARAMETERS]
+    if np.any(values[PARAMETERS.index('stretch')] <= 0):
+        raise ValueError("The stretch of the responses must be positive")
+    grids = np.meshgrid(*values, indexing='ij')
+    return np.rec.fromarrays([grid.ravel() for grid in grids], names=PARAMETERS)
+
+
+def compute_sweep(sparams_data, variants):
+    """
+    Computes the touchstone columns of all variants of a design in one vectorized pass
+    Variant v reads the responses of the design at cf + (f - cf - center_shift[v]) / stretch[v],
+    its group delay is divided by the stretch so the phase is stretched as well.
+    :param sparams_data: the nominal SparamsData
+    :param variants: record array from make_variants
+    :return: array of shape (variants, frequencies, 9), columns as in SparamsData.compute_columns
+    """
+    frequencies = sparams_data.frequency_grid()
+    center_frequency = sparams_data.numerical_data.center_frequency
+    stretch = variants.stretch[:, np.newaxis]
+    response_frequencies = center_frequency + (frequencies - center_frequency - variants.center_shift[:, np.newaxis]) \
+        / stretch
+    return sparams_data.evaluate_columns(frequencies, response_frequencies, 1 / stretch,
+                                         variants.loss_offset[:, np.newaxis], variants.s11_phase[:, np.newaxis],
+                                         variants.s22_phase[:, np.newaxis])
+
+
+def describe_variant(variant):
+    return ", ".join(name + " = " + str(variant[name]) for name in PARAMETERS)
+
+
+def save_sweep(sparams_data, variants, path, filter_name, container=False, writer=None):
+    """
+    Computes and writes all variants of a design
+    Their passivity is checked or enforced as the [touchstone] passivity setting of the design says, the result
+    written in the header of each .s2p file.
+    :param container: writes a single <filter_name>-sweep.npz holding the frequencies, the columns of all variants
+                      and the parameters (and whether each variant is passive, when checked), instead of one .s2p per
+                      variant
+    :param writer: the TouchstoneWriter of the .s2p files. Defaults to the original format
+    :return: list of the written files
+    """
+    if writer is None:
+        writer = touchstone.TouchstoneWriter()
+    columns, reports = pipeline.check_variants(compute_sweep(sparams_data, variants), sparams_data.conf.passivity)
+    if container:
+        location = os.path.join(path, filter_name + "-sweep.npz")
+        passive = {} if reports[0] is None else {'passive': np.array([report.is_passive() for report in reports])}
+        np.savez(location, frequencies=columns[0, :, 0], columns=columns[:, :, 1:],
+                 **{name: variants[name] for name in PARAMETERS}, **passive)
+        return [location]
+
+    digits = len(str(len(variants)))
+    locations = []
+    index_lines = ["Variant " + " ".join(PARAMETERS)]
+    for number, (variant, variant_columns, report) in enumerate(zip(variants, columns, reports), 1):
+        variant_name = filter_name + "-sparams-" + str(number).zfill(digits)
+        comments = ["Sweep variant " + str(number) + ": " + describe_variant(variant)]
+        if report is not None:
+            comments.append(report.describe())
+        location = writer.write(os.path.join(path, variant_name + ".s2p"), filter_name, variant_columns, comments)
+        locations.append(location)
+        index_lines.append(variant_name + " " + " ".join(str(variant[name]) for name in PARAMETERS))
+
+    index_location = os.path.join(path, filter_name + INDEX_SUFFIX)
+    index_file = open(index_location, "w")
+    index_file.write("\n".join(index_lines) + "\n")
+    index_file.close()
+    return locations + [index_location]
@@ -0,0 +1,161 @@
+import numpy as np
+from numpy.polynomial import polynomial
+
+MIN_MAGNITUDE = 1e-10  # -200 dB, floor of the responses at the transmission zeros
+PASSBAND_POINTS = 8  # measurement points per resonator over the band and its skirts
+
+
+def filtering_polynomial(order, transmission_zeros=()):
+    """
+    Numerator of the generalized Chebyshev filtering function C(w) = cosh(sum(arccosh(x_n(w)))), by the recursive
+    technique: its roots are the reflection zeros of the filter
+    :param transmission_zeros: finite transmission zeros, normalized frequencies outside [-1, 1]
+    :return: coefficients in increasing powers of the normalized frequency w
+    """
+    inverse_zeros = np.zeros(order)
+    inverse_zeros[:len(transmission_zeros)] = 1 / np.asarray(transmission_zeros, dtype=np.float64)
+    u = np.array([1.0])
+    v = np.array([0.0])  # the V polynomial of the recursion without its sqrt(w^2 - 1) factor
+    for inverse_zero in inverse_zeros:
+        root = np.sqrt(1 - inverse_zero ** 2)
+        u, v = (polynomial.polyadd(polynomial.polymul([-inverse_zero, 1], u), root * polynomial.polymul([-1, 0, 1], v)),
+                polynomial.polyadd(polynomial.polymul([-inverse_zero, 1], v), root * u))
+    return u
+
+
+def synthesize(order, return_loss, transmission_zeros=()):
+    """
+    Synthesizes the transversal coupling matrix of a Chebyshev filter, or of a generalized Chebyshev filter if it
+    has finite transmission zeros
+    The polynomials F (reflection), P (transmission) and E (common denominator) of the lowpass prototype give the
+    admittance parameters of the filter, whose poles and residues are the resonant frequencies of the resonators and
+    their couplings to the source and to the load.
+    :param order: number of resonators
+    :param return_loss: in band return loss (dB, positive)
+    :param transmission_zeros: finite transmission zeros, normalized frequencies outside [-1, 1], fewer than order
+    :return: symmetric coupling matrix of shape (order + 2, order + 2), source first and load last
+    :raises ValueError: for impossible filters
+    """
+    transmission_zeros = np.asarray(transmission_zeros, dtype=np.float64)
+    if order < 1 or return_loss <= 0:
+        raise ValueError("A filter needs an order of at least 1 and a positive return loss")
+    if len(transmission_zeros) >= order or np.any(np.abs(transmission_zeros) <= 1):
+        raise ValueError("Transmission zeros must be fewer than the order and outside the band [-1, 1]")
+    f_w = filtering_polynomial(order, transmission_zeros)
+    f_w = f_w / f_w[-1]
+    p_w = polynomial.polyfromroots(transmission_zeros) if len(transmission_zeros) else np.array([1.0])
+    # polynomials of s = jw, monic; P is multiplied by j for (order - number of zeros) even so that the
+    # S-parameters are unitary
+    f = polynomial.polyfromroots(1j * polynomial.polyroots(f_w))
+    p = polynomial.polyfromroots(1j * transmission_zeros) if len(transmission_zeros) else np.array([1.0 + 0j])
+    if (order - len(transmission_zeros)) % 2 == 0:
+        p = 1j * p
+    epsilon = abs(polynomial.polyval(1j, p) / polynomial.polyval(1j, f)) / np.sqrt(10 ** (return_loss / 10) - 1)
+    # |E|^2 = |F|^2 + |P|^2 / epsilon^2 on the frequency axis: the roots of F - jP / epsilon, reflected into the
+    # upper half plane of w (the left half plane of s)
+    roots = polynomial.polyroots(polynomial.polysub(f_w, 1j * p_w / epsilon))
+    e = polynomial.polyfromroots(1j * np.where(roots.imag > 0, roots, np.conj(roots)))
+
+    # y22 = n / m and y21 = P / (epsilon m) for an even order, n and m swapped for an odd one
+    total = e + np.pad(f, (0, len(e) - len(f)))
+    even_powers = np.arange(len(total)) % 2 == 0
+    m = np.where(even_powers, total.real, 1j * total.imag)
+    n = np.where(even_powers, 1j * total.imag, total.real)
+    numerator, denominator = (n, m) if order % 2 == 0 else (m, n)
+    poles = polynomial.polyroots(denominator)
+    derivative = polynomial.polyval(poles, polynomial.polyder(denominator))
+    r22 = (polynomial.polyval(poles, numerator) / derivative).real
+    r21 = (polynomial.polyval(poles, p / epsilon) / derivative).real
+
+    matrix = np.zeros((order + 2, order + 2))
+    resonators = np.arange(1, order + 1)
+    matrix[resonators, resonators] = -(poles / 1j).real
+    matrix[0, resonators] = matrix[resonators, 0] = np.sqrt(r22)
+    matrix[-1, resonators] = matrix[resonators, -1] = r21 / np.sqrt(r22)
+    return matrix
+
+
+def lowpass_frequencies(frequencies, center_frequency, bandwidth):
+    """
+    :return: normalized lowpass frequencies of bandpass frequencies, -1 and 1 at the band edges
+    """
+    return center_frequency / bandwidth * (frequencies / center_frequency - center_frequency / frequencies)
+
+
+def evaluate(matrix, frequencies, dissipation=0.0):
+    """
+    Evaluates a transversal coupling matrix at all normalized frequencies at once, with one batched linear solve
+    Eliminating the source and the load leaves A = w I + M - j (m_s m_s^T + m_l m_l^T + dissipation I) over the
+    resonators, with m_s and m_l their couplings to the source and to the load; then with x = A^-1 [m_s, m_l]
+        S21 = 2j m_l^T x_s, S11 = -1 - 2j m_s^T x_s, S22 = -1 - 2j m_l^T x_l, dS21/dw = -2j x_l^T x_s
+    :param matrix: coupling matrix from synthesize
+    :param frequencies: normalized lowpass frequencies
+    :param dissipation: losses of the resonators, their bandwidth relative to the filter bandwidth
+    :return: (S11, S21, S22, group delay), complex S-parameters and the delay in normalized time
+    """
+    source = matrix[0, 1:-1]
+    load = matrix[-1, 1:-1]
+    couplings = matrix[1:-1, 1:-1] - 1j * (np.outer(source, source) + np.outer(load, load) +
+                                           dissipation * np.eye(len(source)))
+    system = np.asarray(frequencies, dtype=np.float64)[:, None, None] * np.eye(len(source)) + couplings
+    ports = np.column_stack((source, load)).astype(complex)
+    x = np.linalg.solve(system, np.broadcast_to(ports, (len(system),) + ports.shape))
+    s21 = 2j * (x[:, :, 0] @ load)
+    s11 = -1 - 2j * (x[:, :, 0] @ source)
+    s22 = -1 - 2j * (x[:, :, 1] @ load)
+    s21_derivative = -2j * np.einsum('fk,fk->f', x[:, :, 1], x[:, :, 0])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        group_delay = np.nan_to_num(-(s21_derivative / s21).imag)
+    return s11, s21, s22, group_delay
+
+
+def dissipation_for_loss(matrix, loss):
+    """
+    :param loss: insertion loss (dB, negative) at the center of the band
+    :return: the dissipation for which the filter has this loss, see evaluate
+    """
+    if loss >= 0:
+        return 0.0
+    center = np.zeros(1)
+    # the loss is nearly proportional to the dissipation: a few secant steps
+    low, high = 0.0, 0.01
+    low_loss = 20 * np.log10(abs(evaluate(matrix, center)[1][0]))
+    for _ in range(20):
+        high_loss = 20 * np.log10(abs(evaluate(matrix, center, high)[1][0]))
+        if abs(high_loss - loss) < 1e-6 or high_loss == low_loss:
+            break
+        low, high, low_loss = high, high + (loss - high_loss) * (high - low) / (high_loss - low_loss), high_loss
+    return high
+
+
+def seed_measurements(center_frequency, bandwidth, loss_at_center, specification_frequencies, conf):
+    """
+    Measurements of the four responses taken from one synthesized filter, so they are consistent with each other
+    The filter is evaluated over a dense grid spanning the specifications; the measurement points are the frequencies
+    of the specifications, points over the band and its skirts and the extremes of the responses (reflection zeros,
+    ripple peaks and transmission zeros), all taken on the grid.
+    :param loss_at_center: insertion loss (dB) at the center frequency, reached with lossy resonators
+    :param specification_frequencies: frequencies of the specifications of each response, in the order
+                                      insertion loss, group delay, input return loss, output return loss
+    :param conf: the SynthesisConfiguration
+    :return: list of (frequencies, values) measurements of the four responses
+    :raises ValueError: for impossible filters
+    """
+    matrix = synthesize(conf.order, conf.return_loss, conf.transmission_zeros)
+    start = min(frequencies[0] for frequencies in specification_frequencies)
+    stop = max(frequencies[-1] for frequencies in specification_frequencies)
+    grid = np.linspace(start, stop, conf.grid_size)
+    lowpass = lowpass_frequencies(grid, center_frequency, bandwidth)
+    s11, s21, s22, group_delay = evaluate(matrix, lowpass, dissipation_for_loss(matrix, loss_at_center))
+    # normalized delay / (2 pi) * dw/df, in ns for frequencies in Mhz
+    group_delay = group_delay * (1 + (center_frequency / grid) ** 2) / bandwidth * 1e3 / (2 * np.pi)
+    responses = [20 * np.log10(np.maximum(np.abs(parameter), MIN_MAGNITUDE)) for parameter in (s21, s11, s22)]
+
+    points = np.linspace(center_frequency - bandwidth, center_frequency + bandwidth, PASSBAND_POINTS * conf.order + 1)
+    extremes = np.flatnonzero(np.diff(np.sign(np.diff(responses[0] + responses[1]))) != 0) + 1
+    shared = np.concatenate((grid[extremes], points))
+    measurements = []
+    for frequencies, values in zip(specification_frequencies, [responses[0], group_delay] + responses[1:]):
+        index = np.unique(np.searchsorted(grid, np.concatenate((np.round(frequencies), shared))).clip(0, len(grid) - 1))
+        measurements.append((grid[index], values[index]))
+    return measurements
@@ -0,0 +1,30 @@
+import os
+import pytest
+import autofit
+import data_parser
+import pipeline
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'texts',
+                       'input_format_example.txt')
+RESPONSES = ('insertion_loss', 'group_delay', 'input_return_loss', 'output_return_loss')
+
+
+def example_data():
+    with open(EXAMPLE) as file:
+        return pipeline.make_numerical_data(data_parser.parse_specification_file(file.readlines()))
+
+
+@pytest.mark.parametrize('response', RESPONSES)
+@pytest.mark.parametrize('margin, fit_x', [(1.0, False), (3.0, False), (1.0, True)])
+def test_fit_holds_margin(response, margin, fit_x):
+    graph_data = getattr(example_data(), response)
+    x, y = autofit.fit_graph(graph_data, margin, 0.01, fit_x)
+    assert autofit.worst_margin(graph_data, x, y) >= margin - autofit.MARGIN_TOLERANCE
+
+
+@pytest.mark.parametrize('response', RESPONSES)
+def test_fit_never_worse(response):
+    graph_data = getattr(example_data(), response)
+    before = autofit.worst_margin(graph_data, graph_data.measurements_x, graph_data.measurements_y)
+    x, y = autofit.fit_graph(graph_data, -1000.0, 0.01)
+    assert autofit.worst_margin(graph_data, x, y) >= before
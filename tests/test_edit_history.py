@@ -0,0 +1,105 @@
+import os
+import numpy as np
+import pytest
+import data_parser
+import edit_history
+import pipeline
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'texts',
+                       'input_format_example.txt')
+
+
+def example_graph():
+    with open(EXAMPLE) as file:
+        return pipeline.make_numerical_data(data_parser.parse_specification_file(file.readlines())).insertion_loss
+
+
+def edit(history, graph, index, x, y, artist='_line1'):
+    """
+    Moves points of a graph and records it, as the response canvases do
+    """
+    old_x, old_y = edit_history.point_values(graph, artist, index)
+    edit_history.move_points(graph, artist, index, x, y)
+    history.record(graph, artist, index, old_x, old_y, x, y)
+
+
+def measurements(graph):
+    return np.copy(graph.measurements_x), np.copy(graph.measurements_y)
+
+
+def test_undo_redo_restore_values():
+    graph = example_graph()
+    history = edit_history.EditHistory()
+    original = measurements(graph)
+    edit(history, graph, 1, graph.measurements_x[1] + 0.5, -7.0)
+    edit(history, graph, np.array([2, 3]), graph.measurements_x[[2, 3]], np.array([-8.0, -9.0]))
+    edited = measurements(graph)
+    history.undo()
+    history.undo()
+    assert all(np.array_equal(a, b) for a, b in zip(measurements(graph), original))
+    history.redo()
+    history.redo()
+    assert all(np.array_equal(a, b) for a, b in zip(measurements(graph), edited))
+    assert history.undo() is not None and history.redo() is not None and history.redo() is None
+
+
+def test_no_op_edit_not_recorded():
+    graph = example_graph()
+    history = edit_history.EditHistory()
+    version = graph.measurements_version
+    edit(history, graph, 1, graph.measurements_x[1], graph.measurements_y[1])
+    assert history.revision == 0 and not history.can_undo()
+    assert graph.measurements_version == version
+
+
+def test_nudges_of_one_point_coalesce():
+    graph = example_graph()
+    history = edit_history.EditHistory()
+    original_y = graph.measurements_y[1]
+    for step in range(1, 6):
+        edit(history, graph, 1, graph.measurements_x[1], original_y - step)
+    edit(history, graph, 2, graph.measurements_x[2], -20.0)
+    assert history.revision == 2
+    history.undo()
+    history.undo()
+    assert graph.measurements_y[1] == original_y
+
+
+def test_capacity_keeps_last_edits():
+    graph = example_graph()
+    history = edit_history.EditHistory(capacity=3)
+    for step in range(5):
+        edit(history, graph, step % 2, graph.measurements_x[step % 2], -10.0 - step)
+    assert history.revision == 5 and history.dropped == 2 and len(history.deltas) == 3
+    while history.can_undo():
+        history.undo()
+    assert history.revision == 2
+    # the two oldest edits are forgotten, the points keep their values after them
+    assert graph.measurements_y[0] == -10.0 and graph.measurements_y[1] == -11.0
+
+
+def test_jump_to():
+    graph = example_graph()
+    history = edit_history.EditHistory()
+    values = [graph.measurements_y[1]]
+    for index in range(1, 5):
+        edit(history, graph, index, graph.measurements_x[index], -30.0 - index)
+        values.append(graph.measurements_y[1:5].copy())
+    assert len(history.jump_to(1)) == 3
+    assert history.revision == 1 and np.array_equal(graph.measurements_y[1:5], values[1])
+    assert len(history.jump_to(4)) == 3
+    assert np.array_equal(graph.measurements_y[1:5], values[4])
+    with pytest.raises(ValueError):
+        history.jump_to(5)
+
+
+def test_listeners_get_new_values():
+    graph = example_graph()
+    history = edit_history.EditHistory()
+    calls = []
+    history.add_listener(lambda graph, artist, index, x, y: calls.append((index, float(y))))
+    original_y = float(graph.measurements_y[1])
+    edit(history, graph, 1, graph.measurements_x[1], -5.0)
+    history.undo()
+    history.redo()
+    assert calls == [(1, -5.0), (1, original_y), (1, -5.0)]
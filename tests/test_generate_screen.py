@@ -0,0 +1,47 @@
+import os
+import numpy as np
+import pytest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from PyQt5 import QtWidgets
+import configuration
+import data_parser
+import models
+import pipeline
+import screens
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APPLICATION = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+@pytest.fixture
+def conf(tmp_path):
+    conf = configuration.read_configuration(os.path.join(ROOT, configuration.CONFIGURATION_FILE))
+    conf.autosave.directory = str(tmp_path)
+    return conf
+
+
+def input_data(**values):
+    with open(os.path.join(ROOT, 'texts', 'input_format_example.txt')) as file:
+        specification = data_parser.parse_specification_file(file.readlines())
+    specification.update(values)
+    return models.InputData(*[specification[field] for field in pipeline.SPECIFICATION_FIELDS])
+
+
+@pytest.mark.parametrize('layout', ['separate', 'shared'])
+def test_load_next_filter(conf, layout):
+    conf.editor.update({'backend': 'matplotlib', 'layout': layout})
+    screen = screens.GenerateScreen(input_data(), [], conf)
+    # matplotlib only prints the errors of its callbacks while a GUI is running
+    errors = []
+    for canvas in screen.canvases:
+        canvas.axes.callbacks.exception_handler = errors.append
+    canvases = list(screen.canvases)
+    assert screen.can_load()
+    screen.load(input_data(center_frequency='20000', bandwidth='600'), [])
+    assert errors == [] and screen.canvases == canvases
+    for canvas, graph_data in zip(screen.canvases, screen.graph_data_list):
+        assert canvas.graph_data is graph_data
+        x, y = canvas.mes_curve.get_data()
+        assert len(x) > 0 and np.allclose(y, graph_data.interpolation_function(x))
+    screen.journal.close(discard=True)
@@ -0,0 +1,38 @@
+import os
+import numpy as np
+import configuration
+import data_parser
+import pipeline
+import save_planner
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def save(planner, sparams_data, location):
+    """
+    Writes the touchstone file of a design if its inputs changed, as the save screen does
+    :return: True if the file was written
+    """
+    key = save_planner.sparams_key(sparams_data, 'filter')
+    if not planner.needs_writing(location, key):
+        return False
+    planner.wrote(location, key, pipeline.make_writer(sparams_data.conf).write(location, 'filter',
+                                                                               planner.columns(sparams_data)))
+    return True
+
+
+def test_interpolation_change_writes_again(tmp_path):
+    conf = configuration.read_configuration(os.path.join(ROOT, configuration.CONFIGURATION_FILE))
+    with open(os.path.join(ROOT, 'texts', 'input_format_example.txt')) as file:
+        numerical_data = pipeline.make_numerical_data(data_parser.parse_specification_file(file.readlines()))
+    sparams_data = pipeline.make_sparams_data(numerical_data, conf.touchstone)
+    planner = save_planner.SavePlanner()
+    location = str(tmp_path / 'filter-sparams.s2p')
+    assert save(planner, sparams_data, location)
+    first = planner.columns(sparams_data)
+    assert not save(planner, sparams_data, location)
+
+    pipeline.prepare(numerical_data, ['pchip'] * 4)
+    assert save(planner, sparams_data, location)
+    assert not np.array_equal(planner.columns(sparams_data), first)
+    assert not save(planner, sparams_data, location)
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import os
+import configuration
+import data_parser
+import pipeline
+import service
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def example_request(**values):
+    with open(os.path.join(ROOT, 'texts', 'input_format_example.txt')) as file:
+        request = {'specification': data_parser.parse_specification_file(file.readlines()), 'number_of_lines': 201}
+    request.update(values)
+    return request
+
+
+async def post(port, path, body, method='POST', length=None):
+    """
+    :param length: announced length of the body, defaults to its actual length
+    :return: (status, decoded JSON response)
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    length = len(body) if length is None else length
+    writer.write((method + " " + path + " HTTP/1.1\r\nContent-Length: " + str(length) +
+                  "\r\nConnection: close\r\n\r\n").encode() + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(content)
+
+
+def read_configuration():
+    conf = configuration.read_configuration(os.path.join(ROOT, configuration.CONFIGURATION_FILE))
+    conf.service.update({'workers': 1, 'max_request_size': 100000})
+    return conf
+
+
+def run_service(scenario, conf=None):
+    """
+    Runs a scenario against a service started on a free local port with one worker
+    """
+    conf = read_configuration() if conf is None else conf
+
+    async def run():
+        generation_service = service.GenerationService(conf.touchstone, conf.service, conf.synthesis,
+                                                       pipeline.interpolation_kinds(conf))
+        _, port = await generation_service.start('127.0.0.1', 0)
+        try:
+            return await scenario(generation_service, port)
+        finally:
+            await generation_service.close()
+
+    return asyncio.run(run())
+
+
+def test_generate():
+    async def scenario(generation_service, port):
+        request = json.dumps(example_request()).encode()
+        first, second = await asyncio.gather(post(port, '/generate', request), post(port, '/generate', request))
+        touchstone = await post(port, '/generate', json.dumps(example_request(format='touchstone')).encode())
+        return first, second, touchstone, generation_service.metrics.deduplicated
+
+    first, second, touchstone, deduplicated = run_service(scenario)
+    assert first[0] == 200 and len(first[1]['columns']) == 201
+    assert second == first
+    assert deduplicated == 1
+    assert touchstone[0] == 200 and touchstone[1]['touchstone'].count('\n') > 201
+
+
+def test_errors():
+    async def scenario(generation_service, port):
+        return [(await post(port, '/generate', b'{not json'))[0],
+                (await post(port, '/generate', json.dumps({'measurements': []}).encode()))[0],
+                (await post(port, '/generate', json.dumps(example_request(number_of_lines=0)).encode()))[0],
+                (await post(port, '/generate', json.dumps(example_request(number_of_lines=10 ** 9)).encode()))[0],
+                (await post(port, '/generate', json.dumps(example_request(number_of_lines='many')).encode()))[0],
+                (await post(port, '/generate', b'', method='GET'))[0],
+                (await post(port, '/unknown', b'{}'))[0],
+                (await post(port, '/generate', b'', length=100001))[0]]
+
+    assert run_service(scenario) == [400, 400, 400, 400, 400, 405, 404, 413]
+
+
+def test_configured_generation():
+    conf = read_configuration()
+    conf.synthesis.measurements = 'synthesis'
+    conf.insertion_loss.interpolation = 'pchip'
+    conf.group_delay.interpolation = 'linear'
+    conf.touchstone.number_of_lines = 201
+
+    async def scenario(generation_service, port):
+        return await post(port, '/generate', json.dumps(example_request()).encode())
+
+    status, response = run_service(scenario, conf)
+    numerical_data = pipeline.make_numerical_data(example_request()['specification'], (), conf.synthesis,
+                                                  pipeline.interpolation_kinds(conf))
+    columns, _ = pipeline.compute_columns(pipeline.make_sparams_data(numerical_data, conf.touchstone))
+    assert status == 200 and response['columns'] == columns.tolist()
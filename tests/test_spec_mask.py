@@ -0,0 +1,48 @@
+import json
+import os
+import numpy as np
+import data_parser
+import models
+import pipeline
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESPONSES = ('insertion_loss', 'group_delay', 'input_return_loss', 'output_return_loss')
+
+
+def read_specification():
+    with open(os.path.join(ROOT, 'texts', 'input_format_example.txt')) as file:
+        return data_parser.parse_specification_file(file.readlines())
+
+
+def make_plot_data(specification):
+    return data_parser.make_plot_data(
+        models.InputData(*[specification[field] for field in pipeline.SPECIFICATION_FIELDS]), [])
+
+
+def test_masks_and_text_match_baseline():
+    # masks and texts of the example given by the point list implementation the spec masks replaced
+    with open(os.path.join(ROOT, 'tests', 'data', 'input_format_example_masks.json')) as file:
+        expected = json.load(file)
+    numerical_data = make_plot_data(read_specification())
+    for response in RESPONSES:
+        graph_data = getattr(numerical_data, response)
+        assert np.array_equal(graph_data.frequencies, expected[response]['frequencies'])
+        assert np.array_equal(graph_data.specifications, expected[response]['specifications'])
+    assert data_parser.make_text_data(numerical_data) == expected['text']
+
+
+def test_saved_text_round_trip():
+    numerical_data = make_plot_data(read_specification())
+    text = "\n".join(data_parser.make_text_data(numerical_data))
+    reloaded = make_plot_data(data_parser.parse_specification_file(text.splitlines(True)))
+    assert data_parser.make_text_data(reloaded) == data_parser.make_text_data(numerical_data)
+    for response in RESPONSES:
+        assert np.array_equal(getattr(reloaded, response).specifications,
+                              getattr(numerical_data, response).specifications)
+
+
+def test_check_text_reports_every_incorrect_line():
+    values, errors = data_parser.check_text("50%  -0.2\nwrong\n\n2.5 - 8.4  -120\n100%  -1 -2", kind='percent')
+    assert values == [(50, -0.2)]
+    assert [number for number, _ in errors] == [1, 3, 4]
+    assert data_parser.check_text("2.5 - 8.4  60", negative=1, kind='range') == ([((2.5, 8.4), 60.0)], [])
@@ -0,0 +1,36 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+import configuration
+import watcher
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_watcher(directory):
+    conf = configuration.read_configuration(os.path.join(ROOT, configuration.CONFIGURATION_FILE))
+    conf.watcher.debounce = 0
+    os.makedirs(os.path.join(directory, 'in'))
+    os.makedirs(os.path.join(directory, 'out'))
+    shutil.copy(os.path.join(ROOT, 'texts', 'input_format_example.txt'), os.path.join(directory, 'in', 'a.txt'))
+    return watcher.FolderWatcher(conf.touchstone, conf.watcher, os.path.join(directory, 'in'),
+                                 os.path.join(directory, 'out'))
+
+
+def test_unwritable_output_is_retried(tmp_path):
+    folder_watcher = make_watcher(str(tmp_path))
+    output = os.path.join(folder_watcher.output_directory, 'a-sparams.s2p')
+    os.makedirs(output)
+    with ThreadPoolExecutor(1) as executor:
+        assert folder_watcher.regenerate(folder_watcher.poll(), executor) == 1
+        assert 'a' not in folder_watcher.manifest and 'a' in folder_watcher.pending
+        os.rmdir(output)
+        assert folder_watcher.regenerate(folder_watcher.poll(), executor) == 1
+    assert folder_watcher.manifest['a']['output'] == output and os.path.isfile(output)
+
+
+def test_application_outputs_are_not_designs():
+    for file_name in ['a-timedomain.txt', 'a-sweep.txt', 'a-montecarlo.txt', 'a-montecarlo-index.txt']:
+        assert watcher.design_of(file_name) is None
+    assert watcher.design_of('a.txt') == ('a', 'specifications')
+    assert watcher.design_of('a-real.txt') == ('a', 'measurements')
@@ -0,0 +1,97 @@
+from functools import lru_cache
+import numpy as np
+from scipy import fft
+from scipy.signal import windows
+import network
+
+FILE_SUFFIX = '-timedomain.txt'  # the time-domain responses saved next to a touchstone file
+
+
+@lru_cache(maxsize=16)
+def lowpass_window(size, beta):
+    """
+    Right half of a symmetric Kaiser window, one weight per low-pass harmonic starting at DC
+    Windows are cached per grid size, so refreshing the same grid does not build them again. They are read-only.
+    :param size: number of harmonics, DC included
+    :param beta: Kaiser beta, 0 for no window, larger for lower side lobes and wider pulses
+    """
+    window = windows.kaiser(2 * size - 1, beta)[size - 1:]
+    window.flags.writeable = False
+    return window
+
+
+def to_lowpass(frequencies, values):
+    """
+    Band-pass to low-pass conversion: puts a parameter on the harmonic grid 0, step, 2 * step... up to the last
+    frequency, as a low-pass time-domain measurement does, so the responses are the real responses of the filter
+        - harmonics inside the band are interpolated in magnitude and unwrapped phase
+        - below the band the magnitude of the first frequency is held and the phase goes on with the slope of the
+          first two frequencies (their group delay)
+        - the DC value keeps its real part, as for a real signal
+    :param frequencies: evenly spaced frequencies (Mhz)
+    :param values: complex parameter at these frequencies
+    :return: (frequency step, values at 0, step, 2 * step...)
+    """
+    step = (frequencies[-1] - frequencies[0]) / (len(frequencies) - 1)
+    harmonics = np.arange(int(np.floor(frequencies[-1] / step + 1e-9)) + 1) * step
+    magnitude = np.abs(values)
+    phase = np.unwrap(np.angle(values))
+    below = harmonics < frequencies[0]
+    extrapolated_phase = phase[0] + (phase[1] - phase[0]) / step * (harmonics - frequencies[0])
+    spectrum = np.where(below, magnitude[0], np.interp(harmonics, frequencies, magnitude)) * \
+        np.exp(1j * np.where(below, extrapolated_phase, np.interp(harmonics, frequencies, phase)))
+    spectrum[0] = spectrum[0].real
+    return step, spectrum
+
+
+def time_response(frequencies, values, beta=6.0, oversampling=4):
+    """
+    Computes the low-pass impulse and step responses of a parameter with a windowed inverse real FFT
+    The FFT length is padded to a fast size, at least `oversampling` times the length of the data, which
+    interpolates the responses in time. scipy keeps the FFT plans of recent sizes.
+    :param frequencies: evenly spaced frequencies (Mhz)
+    :param values: complex parameter at these frequencies, e.g. S21
+    :param beta: Kaiser window beta
+    :param oversampling: interpolation factor in time
+    :return: (time in ns, impulse, step); impulse is scaled to not depend on the oversampling and the step
+             settles to the DC value
+    """
+    step, spectrum = to_lowpass(np.asarray(frequencies, dtype=float), np.asarray(values, dtype=complex))
+    length = 2 * (len(spectrum) - 1)
+    size = fft.next_fast_len(length * max(int(oversampling), 1), real=True)
+    samples = fft.irfft(spectrum * lowpass_window(len(spectrum), beta), size, workers=-1)
+    time = np.arange(size) / (size * step) * 1e3
+    return time, samples * (size / length), np.cumsum(samples)
+
+
+def compute_time_domain(columns, beta=6.0, oversampling=4):
+    """
+    Computes the time-domain responses of S21 and S11 from touchstone columns, see SparamsData.compute_columns
+    :return: array with one row per time: time (ns), impulse(S21), step(S21), impulse(S11), step(S11)
+    """
+    frequencies = columns[:, 0]
+    time, s21_impulse, s21_step = time_response(frequencies, network.db_deg_to_complex(columns[:, 3], columns[:, 4]),
+                                                beta, oversampling)
+    time, s11_impulse, s11_step = time_response(frequencies, network.db_deg_to_complex(columns[:, 1], columns[:, 2]),
+                                                beta, oversampling)
+    return np.column_stack((time, s21_impulse, s21_step, s11_impulse, s11_step))
+
+
+def export_time_domain(sparams_data, location, beta=6.0, oversampling=4):
+    """
+    Writes the time-domain responses of a design to a text file, without any user interface
+    :param sparams_data: the SparamsData of the design
+    :param location: location of the text file
+    """
+    write_time_domain(sparams_data.compute_columns(), location, beta, oversampling)
+
+
+def write_time_domain(columns, location, beta=6.0, oversampling=4):
+    """
+    Writes the time-domain responses of touchstone columns to a text file, see export_time_domain
+    """
+    responses = compute_time_domain(columns, beta, oversampling)
+    time_file = open(location, "w")
+    time_file.write("! Time(ns) impulse(S21) step(S21) impulse(S11) step(S11)\n")
+    np.savetxt(time_file, responses, fmt="%.6g", delimiter="\t")
+    time_file.close()
@@ -0,0 +1,220 @@
+from datetime import datetime
+import gzip
+import numpy as np
+import network
+
+FREQUENCY_UNITS = {'HZ': 1e-6, 'KHZ': 1e-3, 'MHZ': 1, 'GHZ': 1e3}
+UNIT_NAMES = {'HZ': 'Hz', 'KHZ': 'Khz', 'MHZ': 'Mhz', 'GHZ': 'Ghz'}
+DATA_FORMATS = {'DB': ('dB', 'ang'), 'MA': ('mag', 'ang'), 'RI': ('re', 'im')}
+REFERENCES_COMMENT = '! Reference impedances:'
+
+
+def read_touchstone(path, name=None):
+    """
+    Reads a two-port touchstone file (version 1.0 or 2.0, DB/MA/RI formats) into a Network
+    :param path: location of the .s2p file, gzip compressed if it ends with .gz
+    :param name: name of the network. Defaults to the file location
+    :return: Network with frequencies in Mhz
+    """
+    with open_text(path, "r") as touchstone_file:
+        return parse_touchstone(touchstone_file, path if name is None else name)
+
+
+def parse_touchstone(lines, name=""):
+    """
+    Parses the lines of a two-port touchstone file into a Network
+    The S-parameters are renormalized to the reference impedance of the application, network.MODEL_IMPEDANCE, from
+    the references of the header, or from the exact ones of the comment TouchstoneWriter adds when the header
+    cannot hold them
+    """
+    unit = 'GHZ'
+    data_format = 'MA'
+    order = '21_12'
+    references = network.MODEL_IMPEDANCE
+    recorded_references = None
+    values = []
+    for line in lines:
+        if line.startswith(REFERENCES_COMMENT):
+            recorded_references = [complex(value.replace(' ', ''))
+                                   for value in line[len(REFERENCES_COMMENT):].replace('Ohm', '').split(',')]
+        line = line.split('!')[0].strip()
+        if not line:
+            continue
+        if line.startswith('#'):
+            options = line[1:].upper().split()
+            for option in options:
+                if option in FREQUENCY_UNITS:
+                    unit = option
+                elif option in ('DB', 'MA', 'RI'):
+                    data_format = option
+            if 'S' not in options:
+                raise ValueError("Only S-parameter touchstone files are supported: " + line)
+            if 'R' in options[:-1]:
+                references = float(options[options.index('R') + 1])
+        elif line.startswith('['):
+            keyword, _, argument = line[1:].partition(']')
+            if keyword.strip().upper() == 'TWO-PORT DATA ORDER':
+                order = argument.strip()
+            elif keyword.strip().upper() == 'NUMBER OF PORTS' and int(argument) != 2:
+                raise ValueError("Only two-port touchstone files are supported: " + line)
+            elif keyword.strip().upper() == 'REFERENCE':
+                references = [float(value) for value in argument.split()]
+        else:
+            values.extend(line.split())
+
+    data = np.array(values, dtype=float)
+    if len(data) % 9 != 0:
+        raise ValueError("Touchstone data of " + name + " is not a multiple of 9 columns")
+    data = data.reshape(-1, 9)
+
+    first = data[:, 1::2]
+    second = data[:, 2::2]
+    if data_format == 'DB':
+        parameters = network.db_deg_to_complex(first, second)
+    elif data_format == 'MA':
+        parameters = first * np.exp(1j * np.deg2rad(second))
+    else:
+        parameters = first + 1j * second
+
+    s = np.empty((len(data), 2, 2), dtype=complex)
+    s[:, 0, 0] = parameters[:, 0]
+    s[:, 1, 1] = parameters[:, 3]
+    if order == '12_21':
+        s[:, 0, 1], s[:, 1, 0] = parameters[:, 1], parameters[:, 2]
+    else:
+        s[:, 1, 0], s[:, 0, 1] = parameters[:, 1], parameters[:, 2]
+    if recorded_references is not None:
+        references = recorded_references
+    s = network.renormalize(s, references, network.MODEL_IMPEDANCE)
+    return network.Network(data[:, 0] * FREQUENCY_UNITS[unit], s, name)
+
+
+def format_lines(columns):
+    """
+    Formats touchstone columns as tab separated lines, values rounded to 2 decimals
+    :param columns: array with one row per frequency
+    :return: list of lines
+    """
+    return ["\t".join(map(str, row)) for row in np.round(columns, 2).tolist()]
+
+
+def format_impedance(impedance):
+    """
+    :return: text of a reference impedance, e.g. 50 or 75+10j
+    """
+    if impedance.imag == 0:
+        return "%g" % impedance.real
+    return "%g%+gj" % (impedance.real, impedance.imag)
+
+
+def open_text(location, mode):
+    """
+    Opens a text file, gzip compressed if its name ends with .gz
+    """
+    if location.endswith('.gz'):
+        return gzip.open(location, mode + "t", compresslevel=6)
+    return open(location, mode)
+
+
+class TouchstoneWriter:
+    """
+    Writes two-port touchstone files from touchstone columns (frequency in Mhz, then dB and degrees for S11, S21,
+    S12, S22), converting and formatting them `chunk_size` rows at a time so the text of the whole file never
+    exists in memory
+        - data_format: one of DATA_FORMATS. DB is written with 2 decimals, MA and RI with 6 significant digits
+        - unit: one of FREQUENCY_UNITS
+        - version: 1 or 2, the latter adding the Touchstone 2.0 keywords
+        - reference: the reference impedance (Ohm) of both ports, or one per port, possibly complex. The columns,
+          referenced to network.MODEL_IMPEDANCE, are renormalized to it
+        - compress: writes a gzip file, adding .gz to its name
+    The default settings give the original Mhz / DB / 50 Ohm format of the application.
+    Touchstone files only have real references, one for both ports in version 1: references the header cannot
+    hold are written exactly in a comment, their real parts in the option line or [Reference] keyword.
+    """
+
+    def __init__(self, data_format='DB', unit='MHZ', version=1, reference=50.0, compress=False, chunk_size=10000):
+        if data_format not in DATA_FORMATS:
+            raise ValueError("Unknown touchstone format " + data_format)
+        if unit not in FREQUENCY_UNITS:
+            raise ValueError("Unknown frequency unit " + unit)
+        if version not in (1, 2):
+            raise ValueError("Unknown touchstone version " + str(version))
+        self.data_format = data_format
+        self.unit = unit
+        self.version = version
+        self.references = network.port_impedances(reference)
+        self.compress = compress
+        self.chunk_size = chunk_size
+
+    def write(self, location, filter_name, columns, comments=()):
+        """
+        :param location: location of the .s2p file
+        :param filter_name: name written in the header
+        :param columns: touchstone columns, one row per frequency
+        :param comments: additional header lines, written as comments
+        :return: the location written, with .gz added when compressed
+        """
+        if self.compress and not location.endswith('.gz'):
+            location += '.gz'
+        s_params_file = open_text(location, "w")
+        self.write_stream(s_params_file, filter_name, columns, comments)
+        s_params_file.close()
+        return location
+
+    def write_stream(self, stream, filter_name, columns, comments=()):
+        """
+        Writes the touchstone text to an open text stream, see write
+        """
+        stream.write("! Date & Time: " + str(datetime.now()) + "\n")
+        stream.write("! Filter name: " + filter_name + "\n")
+        for comment in comments:
+            stream.write("! " + comment + "\n")
+        per_port = self.references[0] != self.references[1]
+        if np.any(self.references.imag != 0) or (per_port and self.version == 1):
+            stream.write(REFERENCES_COMMENT + " " + ", ".join(map(format_impedance, self.references)) + " Ohm\n")
+        if self.version == 2:
+            stream.write("[Version] 2.0\n")
+        stream.write("# " + UNIT_NAMES[self.unit] + " S " + self.data_format + " R " + "%g" % self.references[0].real
+                     + "\n")
+        if self.version == 2:
+            stream.write("[Number of Ports] 2\n")
+            if per_port:
+                stream.write("[Reference] " + " ".join("%g" % reference for reference in self.references.real) + "\n")
+            stream.write("[Two-Port Data Order] 21_12\n")
+            stream.write("[Number of Frequencies] " + str(len(columns)) + "\n")
+            stream.write("[Network Data]\n")
+        first, second = DATA_FORMATS[self.data_format]
+        stream.write("! Frequency " + " ".join(first + "(" + name + ") " + second + "(" + name + ")"
+                                               for name in ["S11", "S21", "S12", "S22"]) + "\n")
+        for start in range(0, len(columns), self.chunk_size):
+            if start > 0:
+                stream.write("\n")
+            stream.write("\n".join(self.format_chunk(columns[start:start + self.chunk_size])))
+        if self.version == 2:
+            stream.write("\n[End]\n")
+
+    def format_chunk(self, columns):
+        """
+        :return: the data lines of some rows of touchstone columns
+        """
+        if np.any(self.references != network.MODEL_IMPEDANCE):
+            s = network.renormalize(network.Network.from_columns(columns).s, network.MODEL_IMPEDANCE, self.references)
+            columns = network.Network(columns[:, 0], s).to_columns()
+        if self.data_format == 'DB' and self.unit == 'MHZ':
+            return format_lines(columns)
+        values = np.empty_like(columns)
+        values[:, 0] = np.round(columns[:, 0], 2) / FREQUENCY_UNITS[self.unit]
+        if self.data_format == 'DB':
+            values[:, 1:] = columns[:, 1:]
+            line_format = "%.12g" + "\t%.2f" * 8
+        else:
+            parameters = network.db_deg_to_complex(columns[:, 1::2], columns[:, 2::2])
+            if self.data_format == 'MA':
+                values[:, 1::2] = np.abs(parameters)
+                values[:, 2::2] = columns[:, 2::2]
+                line_format = "%.12g" + "\t%.6g\t%.2f" * 4
+            else:
+                values[:, 1::2] = parameters.real
+                values[:, 2::2] = parameters.imag
+                line_format = "%.12g" + "\t%.6g" * 8
+        return [line_format % row for row in map(tuple, values.tolist())]
@@ -0,0 +1,239 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+import time
+import data_parser
+import montecarlo
+import pipeline
+import sweep
+import timedomain
+
+MANIFEST = '.watcher-manifest.json'
+MEASUREMENTS_SUFFIX = '-real.txt'
+SPECIFICATIONS_SUFFIX = '-ideal.txt'
+# text files the application writes next to the designs, which are not specifications
+OUTPUT_SUFFIXES = (timedomain.FILE_SUFFIX, sweep.INDEX_SUFFIX, montecarlo.INDEX_SUFFIX, montecarlo.STATISTICS_SUFFIX)
+GENERATION_ERRORS = (ValueError, TypeError, IndexError)
+
+
+def design_of(file_name):
+    """
+    :return: (design name, 'measurements' or 'specifications') of a file of the watched directory, None if the file
+             is not an input. Specifications are <name>.txt or <name>-ideal.txt, measurements <name>-real.txt
+    """
+    if not file_name.endswith('.txt') or file_name.startswith('.') or file_name.endswith(OUTPUT_SUFFIXES):
+        return None
+    if file_name.endswith(MEASUREMENTS_SUFFIX):
+        return file_name[:-len(MEASUREMENTS_SUFFIX)], 'measurements'
+    if file_name.endswith(SPECIFICATIONS_SUFFIX):
+        return file_name[:-len(SPECIFICATIONS_SUFFIX)], 'specifications'
+    return file_name[:-len('.txt')], 'specifications'
+
+
+def file_hash(location):
+    """
+    :return: sha256 of the content of a file, None if there is no file
+    """
+    if location is None:
+        return None
+    with open(location, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def read_lines(location):
+    with open(location) as file:
+        return file.readlines()
+
+
+def regenerate(name, specifications_location, measurements_location, output_location, conf, synthesis_conf=None,
+               kinds=None):
+    """
+    Generates the touchstone file of one design from its files, in a worker process
+    :param measurements_location: location of the -real.txt file, None to generate the measurements
+    :param conf: the TouchstoneConfiguration
+    :param synthesis_conf: the SynthesisConfiguration of the generated measurements
+    :param kinds: interpolation of each response, see pipeline.prepare
+    :return: (location of the written file, passivity summary or None)
+    """
+    specification = data_parser.parse_specification_file(read_lines(specifications_location))
+    measurement_text = [] if measurements_location is None else read_lines(measurements_location)
+    numerical_data = pipeline.make_numerical_data(specification, measurement_text, synthesis_conf, kinds)
+    columns, report = pipeline.compute_columns(pipeline.make_sparams_data(numerical_data, conf), conf.passivity)
+    location = pipeline.make_writer(conf).write(output_location, name, columns)
+    return location, None if report is None else report.describe()
+
+
+class FolderWatcher:
+    """
+    Keeps the touchstone files of a directory of specifications up to date, without any user interface
+    The directory is polled, which works the same on local and shared directories. A design is regenerated once
+    its files were left unchanged for the debounce time, so a burst of writes gives a single regeneration, and
+    only if the content of its files or the generation settings differ from the last generation. The content
+    hashes are kept in a manifest next to the outputs, so a restart only regenerates what changed meanwhile.
+    """
+
+    def __init__(self, conf, watcher_conf, directory=None, output_directory=None, synthesis_conf=None, kinds=None):
+        """
+        :param conf: the TouchstoneConfiguration
+        :param watcher_conf: the WatcherConfiguration
+        :param directory: directory to watch, defaults to the configured one
+        :param output_directory: directory of the touchstone files, defaults to the configured one
+        :param synthesis_conf: the SynthesisConfiguration of the measurements generated for designs without any
+        :param kinds: interpolation of each response, see pipeline.prepare
+        """
+        self.conf = conf
+        self.watcher_conf = watcher_conf
+        self.synthesis_conf = synthesis_conf
+        self.kinds = kinds
+        self.directory = directory or watcher_conf.directory
+        self.output_directory = output_directory or watcher_conf.output_directory or self.directory
+        self.manifest_location = os.path.join(self.output_directory, MANIFEST)
+        self.manifest = self.load_manifest()
+        # a change of any setting the generation depends on regenerates every design
+        self.settings = repr([getattr(section, key) for section in (conf, synthesis_conf) if section is not None
+                              for key in section.__slots__] + list(kinds or ()))
+        self.snapshot = {}  # file name: (modification time, size)
+        self.pending = {}  # design name: time of the last change of its files
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_location) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def save_manifest(self):
+        # written aside and renamed, so an interruption never leaves a partial manifest
+        temporary = self.manifest_location + '.tmp'
+        with open(temporary, 'w') as file:
+            json.dump(self.manifest, file, indent=1, sort_keys=True)
+        os.replace(temporary, self.manifest_location)
+
+    def scan(self):
+        """
+        :return: dictionary of the input files of the directory: file name: (modification time, size)
+        """
+        snapshot = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if design_of(entry.name) is not None and entry.is_file():
+                    stat = entry.stat()
+                    snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def poll(self):
+        """
+        Compares the directory with the previous poll
+        :return: names of the designs whose files changed and were left unchanged for the debounce time since
+        """
+        snapshot = self.scan()
+        now = time.monotonic()
+        for file_name in set(snapshot) | set(self.snapshot):
+            if snapshot.get(file_name) != self.snapshot.get(file_name):
+                self.pending[design_of(file_name)[0]] = now
+        self.snapshot = snapshot
+        ready = [name for name, changed in self.pending.items() if now - changed >= self.watcher_conf.debounce]
+        for name in ready:
+            del self.pending[name]
+        return sorted(ready)
+
+    def input_locations(self, name):
+        """
+        :return: (specifications location, measurements location) of a design, None for missing files.
+                 <name>.txt is preferred to <name>-ideal.txt
+        """
+        specifications = None
+        for file_name in [name + SPECIFICATIONS_SUFFIX, name + '.txt']:
+            if file_name in self.snapshot:
+                specifications = os.path.join(self.directory, file_name)
+        measurements = None
+        if name + MEASUREMENTS_SUFFIX in self.snapshot:
+            measurements = os.path.join(self.directory, name + MEASUREMENTS_SUFFIX)
+        return specifications, measurements
+
+    def plan(self, names):
+        """
+        :return: list of (name, specifications location, measurements location, manifest entry) of the designs
+                 to regenerate among the given ones
+        """
+        jobs = []
+        for name in names:
+            specifications, measurements = self.input_locations(name)
+            if specifications is None:
+                self.manifest.pop(name, None)
+                continue
+            try:
+                entry = {'specifications': file_hash(specifications), 'measurements': file_hash(measurements),
+                         'settings': self.settings}
+            except OSError:
+                # removed or renamed since the scan, the next poll sees it
+                continue
+            previous = self.manifest.get(name, {})
+            if all(previous.get(key) == value for key, value in entry.items()) and \
+                    ('error' in previous or os.path.exists(previous.get('output', ''))):
+                continue
+            jobs.append((name, specifications, measurements, entry))
+        return jobs
+
+    def regenerate(self, names, executor):
+        """
+        Regenerates the designs among names whose inputs changed, in parallel, and records them in the manifest
+        :return: number of regenerated designs
+        """
+        jobs = self.plan(names)
+        futures = []
+        for name, specifications, measurements, entry in jobs:
+            output = os.path.join(self.output_directory, name + "-sparams.s2p")
+            futures.append(executor.submit(regenerate, name, specifications, measurements, output, self.conf,
+                                           self.synthesis_conf, self.kinds))
+        for (name, specifications, measurements, entry), future in zip(jobs, futures):
+            try:
+                entry['output'], summary = future.result()
+                print(name + ": wrote " + entry['output'] + ("" if summary is None else ", " + summary))
+            except GENERATION_ERRORS as error:
+                # not retried until the files change
+                entry['error'] = str(error)
+                print(name + ": cannot generate from " + specifications + ": " + str(error))
+            except OSError as error:
+                # a file removed meanwhile or an output that cannot be written: left out of the manifest and
+                # retried after the debounce time
+                self.pending[name] = time.monotonic()
+                print(name + ": cannot generate, retrying: " + str(error))
+                continue
+            self.manifest[name] = entry
+        try:
+            self.save_manifest()
+        except OSError as error:
+            print("Cannot save the manifest " + self.manifest_location + ": " + str(error))
+        return len(jobs)
+
+    def run(self):
+        """
+        Watches the directory until interrupted
+        """
+        os.makedirs(self.output_directory, exist_ok=True)
+        print("Watching " + os.path.abspath(self.directory) + " for specifications, writing to " +
+              os.path.abspath(self.output_directory))
+        with ProcessPoolExecutor(self.watcher_conf.workers or os.cpu_count()) as executor:
+            while True:
+                ready = self.poll()
+                if ready:
+                    self.regenerate(ready, executor)
+                time.sleep(self.watcher_conf.poll_interval)
+
+
+def watch(conf, directory=None, output_directory=None):
+    """
+    Runs the watch folder mode until interrupted
+    :param conf: the Configuration
+    """
+    folder_watcher = FolderWatcher(conf.touchstone, conf.watcher, directory, output_directory, conf.synthesis,
+                                   pipeline.interpolation_kinds(conf))
+    if not os.path.isdir(folder_watcher.directory):
+        print("No directory " + folder_watcher.directory + " to watch")
+        return
+    try:
+        folder_watcher.run()
+    except KeyboardInterrupt:
+        pass